@@ -7,12 +7,13 @@ import pandas as pd  # Добавляем библиотеку pandas для р
 import threading
 import secrets
 import os
-import shutil
+import tempfile
 import hashlib
 import re
 import uuid
+import atexit
 
-from flask import Flask, jsonify, render_template, request, session, redirect, url_for, flash, send_file
+from flask import Flask, jsonify, render_template, request, session, redirect, url_for, flash, send_file, Response
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
@@ -20,17 +21,65 @@ from flask_limiter.util import get_remote_address
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 
+from backup_manager import BackupManager, BackupWorker, BackupIntegrityError
+from event_stream import EventBroker
+from goods_catalog import (
+    CatalogCache, CatalogSnapshot, GoodsRepository, GoodsConflictError, GoodsNotFoundError, write_excel_atomic,
+)
+from goods_importer import GoodsImport, GoodsImportError, IMPORT_EXTENSIONS, iter_import_chunks
+from task_archive import TaskArchive
+from task_store import (
+    TaskStore, TaskBatchError, RetentionScheduler, create_task_backend, file_lock, task_key, write_json_atomic,
+)
+
 BASE_DIR = Path(__file__).parent
 DATA_FILE = BASE_DIR / "logs" / "tasks.json"  # JSON‑файл з усіма прямокутниками
 GOODS_FILE = BASE_DIR / "goods.xlsx"  # Excel-файл зі списком товарів
 USERS_FILE = BASE_DIR / "users.json"  # JSON-файл з користувачами
 BACKUP_DIR = BASE_DIR / "backups"  # Папка для бекапів
 SECURITY_LOG_FILE = BASE_DIR / "logs" / "security.log"  # Лог безпеки
+TASKS_DB_FILE = BASE_DIR / "logs" / "tasks.sqlite3"  # SQLite-база прямокутників (TASKS_BACKEND=sqlite)
+GOODS_CATALOG_SIDECAR = BASE_DIR / "logs" / "goods_catalog.pkl"  # Розібраний goods.xlsx для швидкого старту
+GOODS_LOCK_FILE = BASE_DIR / "logs" / "goods.xlsx.lock"  # Блокування відкладених записів товарів між воркерами
+
+# Бекенд зберігання прямокутників: "json" (tasks.json), "sqlite" (WAL, один рядок на прямокутник)
+# або "journal" (знімок tasks.json + журнал мутацій tasks.journal.jsonl з фоновою компакцією)
+TASKS_BACKEND = os.environ.get('TASKS_BACKEND', 'json').lower()
+TASKS_JOURNAL_MAX_ENTRIES = int(os.environ.get('TASKS_JOURNAL_MAX_ENTRIES', 500))
+TASKS_JOURNAL_MAX_BYTES = int(os.environ.get('TASKS_JOURNAL_MAX_BYTES', 1024 * 1024))
+# Довговічність записів: "sync" (запис до відповіді), "group" (спільний запис раз на інтервал,
+# відповідь після нього) або "async" (відповідь одразу, запис у фоні не пізніше ніж через інтервал)
+TASKS_DURABILITY = os.environ.get('TASKS_DURABILITY', 'sync').lower()
+TASKS_FLUSH_INTERVAL_MS = int(os.environ.get('TASKS_FLUSH_INTERVAL_MS', 200))
+# Зберігання прямокутників: фоновий планувальник переносить в архів ті, що закінчились понад TASKS_RETENTION_DAYS днів тому
+TASKS_RETENTION_DAYS = int(os.environ.get('TASKS_RETENTION_DAYS', 90))
+TASKS_RETENTION_INTERVAL_SECONDS = int(os.environ.get('TASKS_RETENTION_INTERVAL_SECONDS', 3600))
+# Холодний архів: прострочені прямокутники переносяться в помісячні gzip-сегменти
+# (GET /api/archive/tasks), а не видаляються; кеш розпакованих місяців — у штуках
+TASKS_ARCHIVE_ENABLED = os.environ.get('TASKS_ARCHIVE_ENABLED', 'true').lower() == 'true'
+TASKS_ARCHIVE_DIR = BASE_DIR / "logs" / "archive"
+TASKS_ARCHIVE_CACHE_MONTHS = int(os.environ.get('TASKS_ARCHIVE_CACHE_MONTHS', 6))
+# Server-Sent Events (/api/stream): скільки подій пам'ятати для перепідключень, інтервал
+# keep-alive і максимальна тривалість одного з'єднання (клієнт перепідключається сам)
+SSE_BUFFER_SIZE = int(os.environ.get('SSE_BUFFER_SIZE', 1000))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+# Пакет змін, більший за цей поріг, транслюється як "reset" — клієнт дочитає його через ?since=
+SSE_MAX_TASKS_PER_EVENT = 500
+# Бекапи із запитів (вхід, збереження задач) виконує фоновий потік; запити, що надійшли
+# протягом BACKUP_COALESCE_SECONDS після першого, об'єднуються в один бекап
+BACKUP_COALESCE_SECONDS = float(os.environ.get('BACKUP_COALESCE_SECONDS', 5))
+# Правки товарів з адмінки записуються в goods.xlsx у фоні: серія правок протягом
+# GOODS_FLUSH_DELAY_SECONDS після першої — один запис файлу
+GOODS_FLUSH_DELAY_SECONDS = float(os.environ.get('GOODS_FLUSH_DELAY_SECONDS', 1))
 
 # Створюємо необхідні папки
 BACKUP_DIR.mkdir(exist_ok=True)
 (BASE_DIR / "logs").mkdir(exist_ok=True)
 
+# Бекапи: незмінені файли зберігаються один раз (blobs/ за SHA-256), кожен бекап — маніфест
+backup_manager = BackupManager(BACKUP_DIR, keep=10)
+
 # ---------------------------------------------------------------------------
 # 👉  Flask app: мінімальний бекенд‑API — фронт зберігає/читає JSON через fetch
 # ---------------------------------------------------------------------------
@@ -112,8 +161,10 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Будь ласка, увійдіть в систему для доступу до цієї сторінки.'
 login_manager.login_message_category = 'info'
 
-# Lock для синхронізації доступу до файлу логів
+# Lock для синхронізації доступу до файлу логів у межах процесу;
+# між воркерами gunicorn — файлове блокування CHANGES_LOG_LOCK_FILE (fcntl)
 log_file_lock = threading.Lock()
+CHANGES_LOG_LOCK_FILE = BASE_DIR / "logs" / "changes_log.json.lock"
 
 # Клас користувача
 class User(UserMixin):
@@ -149,43 +200,44 @@ def log_security_event(event_type, username, details="", ip_address=""):
     except Exception as e:
         print(f"Помилка запису в лог безпеки: {e}")
 
+# Файли, з яких складається бекап (tasks.json — знімок TaskStore)
+BACKUP_FILE_NAMES = ("users.json", "changes_log.json", "goods.xlsx", "tasks.json")
+
+def run_backup():
+    """Створює бекап всіх важливих файлів і повертає його ім'я (помилки не перехоплює)."""
+    files_to_backup = [
+        ("users.json", USERS_FILE),
+        ("changes_log.json", BASE_DIR / "logs" / "changes_log.json"),
+        ("goods.xlsx", GOODS_FILE)
+    ]
+    
+    # Прямокутники беремо з бекенду (tasks.json або SQLite) у форматі tasks.json;
+    # ротація (залишаємо останні 10) виконується разом зі створенням
+    backup_name = backup_manager.create(
+        files_to_backup, exporters={"tasks.json": task_store.export_snapshot}
+    )
+    
+    if backup_name:
+        print(f"Бекап створено: {backup_name}")
+    return backup_name
+
 def create_backup():
-    """Створення бекапу всіх важливих файлів."""
+    """Синхронне створення бекапу (незмінені файли не копіюються повторно)."""
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_folder = BACKUP_DIR / f"backup_{timestamp}"
-        backup_folder.mkdir(exist_ok=True)
-        
-        # Бекап файлів
-        files_to_backup = [
-            ("users.json", USERS_FILE),
-            ("tasks.json", DATA_FILE),
-            ("changes_log.json", BASE_DIR / "logs" / "changes_log.json"),
-            ("goods.xlsx", GOODS_FILE)
-        ]
-        
-        for backup_name, source_file in files_to_backup:
-            if source_file.exists():
-                shutil.copy2(source_file, backup_folder / backup_name)
-        
-        # Видаляємо старі бекапи (залишаємо останні 10)
-        cleanup_old_backups()
-        
-        print(f"Бекап створено: {backup_folder}")
+        run_backup()
         return True
     except Exception as e:
         print(f"Помилка створення бекапу: {e}")
         return False
 
+def request_backup(reason):
+    """Ставить бекап у фонову чергу й одразу повертає id задачі — запит не чекає на диск."""
+    return backup_worker.submit(reason)
+
 def cleanup_old_backups():
-    """Видаляємо старі бекапи, залишаємо останні 10."""
+    """Видаляємо старі бекапи, залишаємо останні 10, і блоби, на які ніхто не посилається."""
     try:
-        backup_folders = sorted([d for d in BACKUP_DIR.iterdir() if d.is_dir() and d.name.startswith("backup_")])
-        
-        if len(backup_folders) > 10:
-            for old_backup in backup_folders[:-10]:
-                shutil.rmtree(old_backup)
-                print(f"Видалено старий бекап: {old_backup}")
+        backup_manager.cleanup()
     except Exception as e:
         print(f"Помилка очищення старих бекапів: {e}")
 
@@ -219,13 +271,24 @@ def load_users():
     save_users(default_users)
     return default_users
 
-def save_users(users_data):
-    """Записуємо користувачів у users.json з бекапом."""
-    # Створюємо бекап перед збереженням
-    create_backup()
+def save_users(users_data, backup_first=True):
+    """Записуємо користувачів у users.json з бекапом.
+
+    Зміни облікових записів (додавання, видалення, паролі) спершу чекають на бекап поточного
+    users.json, як і раніше. Оновлення часу входу (backup_first=False) вхід не затримує:
+    бекап ставиться у фонову чергу після запису — попередній last_login зберігати не варто.
+    """
+    if backup_first and USERS_FILE.exists():
+        job = backup_worker.wait(backup_worker.submit("users", delay=0), timeout=120)
+        if not job or job['state'] != 'done':
+            print("Не вдалося створити бекап перед збереженням користувачів")
     
     with USERS_FILE.open("w", encoding="utf-8") as f:
         json.dump(users_data, f, ensure_ascii=False, indent=2)
+    
+    if not backup_first:
+        # Бекап — у фоні: вхід користувача не чекає на дискові операції
+        request_backup("users")
 
 def role_required(required_role):
     """Декоратор для перевірки ролі користувача."""
@@ -251,117 +314,110 @@ def role_required(required_role):
 
 
 def load_tasks():
-    """Читаємо tasks.json або повертаємо пустий словник, якщо файл відсутній."""
-    if DATA_FILE.exists():
-        with DATA_FILE.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    """Повертаємо знімок прямокутників з кешу TaskStore (файл перечитується лише при зміні)."""
+    return task_store.all()
 
 
-def load_goods():
-    """Читаємо goods.xlsx і повертаємо товари, згруповані за категоріями."""
+def read_catalog_file(goods_file, signature):
+    """Читаємо goods.xlsx один раз і будуємо знімок: товари за категоріями і склади."""
     try:
-        if GOODS_FILE.exists():
-            print(f"Файл goods.xlsx найден по пути: {GOODS_FILE}")
+        if goods_file.exists():
             # Читаємо Excel-файл повністю, щоб уникнути помилок з індексами
-            df = pd.read_excel(GOODS_FILE, header=0)
-            
-            # Отримаємо назви колонок
-            print(f"Доступні колонки в файлі: {list(df.columns)}")
-            
-            # Перевіряємо, які колонки доступні
-            required_columns = ['Категорія', 'Назва товару', 'Вага (кг)', 'Коефіцієнт паллети']
-            available_columns = [col for col in required_columns if col in df.columns]
-            
-            if len(available_columns) < 2:  # Мінімум потрібні категорія та назва
-                print(f"Недостатньо колонок для читання товарів. Доступні: {available_columns}")
-                return {}
+            df = pd.read_excel(goods_file, header=0)
             
-            category_column = available_columns[0]  # Категорія
-            product_column = available_columns[1]   # Назва товару
-            weight_column = available_columns[2] if len(available_columns) > 2 else None
-            pallet_coef_column = available_columns[3] if len(available_columns) > 3 else None
-            
-            print(f"Використовуємо колонки: {category_column}, {product_column}, {weight_column}, {pallet_coef_column}")
-            print(f"Загальна кількість рядків: {len(df)}")
-            
-            # Видаляємо рядки з відсутніми товарами
-            df = df.dropna(subset=[product_column])
-            print(f"Після видалення рядків з пустими товарами: {len(df)}")
-            
-            # Якщо категорія відсутня, встановлюємо "Інше" як значення за замовчуванням
-            df[category_column] = df[category_column].fillna("Інше")
-            
-            # Групуємо товари по категоріях
-            categorized_goods = {}
-            for _, row in df.iterrows():
-                category = str(row[category_column]).strip()
-                product = str(row[product_column]).strip()
-                
-                # Безпечно отримуємо вагу та коефіцієнт
-                weight = float(row[weight_column]) if weight_column and pd.notna(row[weight_column]) else 1.0
-                pallet_coef = float(row[pallet_coef_column]) if pallet_coef_column and pd.notna(row[pallet_coef_column]) else 1.0
-                
-                if category not in categorized_goods:
-                    categorized_goods[category] = []
-                    
-                categorized_goods[category].append({
-                    "name": product,
-                    "weight": weight,
-                    "pallet_coef": pallet_coef
-                })
-            
-            print(f"Загружено категорій: {len(categorized_goods)}")
-            for cat, items in categorized_goods.items():
-                print(f"  - {cat}: {len(items)} товарів")
+            missing_columns = [col for col in ('Категорія', 'Назва товару') if col not in df.columns]
+            if missing_columns:
+                print(f"Недостатньо колонок для читання товарів. Відсутні: {missing_columns}")
+            if 'Склади' not in df.columns:
+                print("Колонка 'Склади' не знайдена в Excel файлі")
             
-            return categorized_goods
+            # Каталог будується по колонках (див. goods_catalog.build_goods_catalog)
+            snapshot = CatalogSnapshot.from_frame(df, signature)
+            total_items = sum(len(items) for items in snapshot.goods.values())
+            print(f"Загружено категорій: {len(snapshot.goods)}, товарів: {total_items}, "
+                  f"складів: {len(snapshot.warehouses)} (рядків у файлі: {len(df)})")
+            return snapshot
         else:
-            print(f"Файл goods.xlsx не найден по пути: {GOODS_FILE}")
+            print(f"Файл goods.xlsx не найден по пути: {goods_file}")
             # Повертаємо пусту структуру
-            return {}
+            return CatalogSnapshot.empty(signature)
     except Exception as e:
         print(f"Помилка при читанні файлу goods.xlsx: {e}")
         # Повертаємо пусту структуру при помилці
-        return {}
+        return CatalogSnapshot.empty(signature)
+
+
+# Розібраний goods.xlsx на процес: Excel читається лише при зміні файлу, а при старті
+# знімок береться з файлу-супутника, якщо він зроблений з поточної версії goods.xlsx
+goods_cache = CatalogCache(GOODS_FILE, read_catalog_file, sidecar_path=GOODS_CATALOG_SIDECAR)
+goods_cache.warm_up()
+
+
+def load_goods():
+    """Товари, згруповані за категоріями (копія зі знімка — її можна змінювати)."""
+    return {category: [dict(item) for item in items] for category, items in goods_cache.get().goods.items()}
 
 
 def load_warehouses():
-    """Читаємо goods.xlsx і повертаємо список складів з колонки 'Склади'."""
-    try:
-        if GOODS_FILE.exists():
-            # Читаємо Excel-файл повністю
-            df = pd.read_excel(GOODS_FILE)
-            
-            # Перевіряємо, чи є колонка 'Склади'
-            if 'Склади' in df.columns:
-                # Видаляємо рядки з відсутніми назвами складів та перетворюємо на список
-                warehouses = df['Склади'].dropna().tolist()
-                # Видаляємо пусті рядки
-                warehouses = [w for w in warehouses if str(w).strip() != '']
-                print(f"Завантажено {len(warehouses)} складів з Excel: {warehouses}")
-                return warehouses
-            else:
-                print("Колонка 'Склади' не знайдена в Excel файлі")
-                return []
-        else:
-            # Якщо файл не знайдено, повертаємо пустий список
-            print("Файл Excel не знайдено, повертаємо пустий список складів")
-            return []
-    except Exception as e:
-        print(f"Помилка при читанні складів з файлу goods.xlsx: {e}")
-        # Якщо сталася помилка, повертаємо пустий список
-        return []
+    """Список складів (копія зі знімка — її можна змінювати)."""
+    return list(goods_cache.get().warehouses)
 
 
-def save_tasks(data: dict):
-    """Записуємо словник у tasks.json, pretty‑print для зручності з бекапом."""
-    # Створюємо бекап перед збереженням важливих змін
+def backup_before_tasks_save(data: dict):
+    """Хук TaskStore: ставимо бекап у чергу перед збереженням важливих змін."""
     if len(data) % 10 == 0:  # Створюємо бекап кожні 10 операцій
-        create_backup()
-    
-    with DATA_FILE.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        request_backup("tasks")
+
+
+def save_tasks(data: dict):
+    """Повністю замінюємо вміст tasks.json через TaskStore (кеш оновлюється разом з файлом)."""
+    task_store.replace_all(data)
+
+
+# Єдине сховище прямокутників на процес: читає дані один раз і тримає їх у пам'яті
+task_store = TaskStore(
+    create_task_backend(
+        TASKS_BACKEND, DATA_FILE, TASKS_DB_FILE,
+        journal_max_entries=TASKS_JOURNAL_MAX_ENTRIES,
+        journal_max_bytes=TASKS_JOURNAL_MAX_BYTES,
+    ),
+    before_save=backup_before_tasks_save,
+    durability=TASKS_DURABILITY,
+    flush_interval_ms=TASKS_FLUSH_INTERVAL_MS,
+)
+# При зупинці процесу примусово дописуємо все, що ще в пам'яті
+atexit.register(task_store.close)
+
+# Фоновий потік бекапів; при зупинці спершу виконує вже запланований бекап
+# (atexit викликає функції у зворотному порядку — до task_store.close)
+backup_worker = BackupWorker(run_backup, coalesce_seconds=BACKUP_COALESCE_SECONDS)
+atexit.register(backup_worker.stop)
+
+# Очищення старих прямокутників (з перенесенням в архів) — у фоновому потоці, GET /api/tasks лише читає
+task_archive = (
+    TaskArchive(TASKS_ARCHIVE_DIR, cache_months=TASKS_ARCHIVE_CACHE_MONTHS)
+    if TASKS_ARCHIVE_ENABLED else None
+)
+
+retention_scheduler = RetentionScheduler(
+    task_store,
+    retention_days=TASKS_RETENTION_DAYS,
+    interval_seconds=TASKS_RETENTION_INTERVAL_SECONDS,
+    archive=task_archive,
+).start()
+
+# Трансляція змін прямокутників і логу всім відкритим дошкам (SSE)
+event_broker = EventBroker(buffer_size=SSE_BUFFER_SIZE)
+
+
+def publish_task_changes(revision, tasks, deleted):
+    if len(tasks) + len(deleted) > SSE_MAX_TASKS_PER_EVENT:
+        event_broker.publish("reset", {"revision": revision})
+    else:
+        event_broker.publish("tasks", {"revision": revision, "tasks": tasks, "deleted": deleted})
+
+
+task_store.add_listener(publish_task_changes)
 
 
 @app.route("/")
@@ -403,12 +459,12 @@ def login():
                     # Оновлюємо пароль до захешованого формату
                     users[username]["password"] = generate_password_hash(password)
                     users[username]["last_login"] = datetime.now().isoformat()
-                    save_users(users)
+                    save_users(users, backup_first=False)
             
             if password_valid:
                 # Оновлюємо час останнього входу
                 users[username]["last_login"] = datetime.now().isoformat()
-                save_users(users)
+                save_users(users, backup_first=False)
                 
                 user = User(username, users[username]["role"])
                 login_user(user)
@@ -526,42 +582,82 @@ def delete_user(username):
     return redirect(url_for('admin_panel'))
 
 
+def conditional_json(etag, build):
+    """JSON-відповідь з ETag: 304 без побудови тіла, якщо копія клієнта актуальна.
+
+    build викликається лише коли тіло справді потрібне і може повернути вже закодований
+    JSON (bytes). ``no-cache`` змушує браузер
+    щоразу перепитувати сервер, але з If-None-Match, тож незмінні дані не пересилаються.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        body = build()
+        # Готовий JSON (наприклад, зі знімка каталогу) віддаємо без повторної серіалізації
+        response = app.response_class(body, mimetype="application/json") if isinstance(body, bytes) else jsonify(body)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def catalog_etag(kind, snapshot):
+    """ETag даних зі знімка goods.xlsx за сигнатурою файлу (inode, mtime, розмір)."""
+    if snapshot.signature is None:
+        return f"{kind}-missing"
+    ino, mtime_ns, size = snapshot.signature
+    return f"{kind}-{ino:x}-{mtime_ns:x}-{size:x}"
+
+
+def parse_date_window():
+    """Параметри ?from=&to= (YYYY-MM-DD, межі включні). Повертає (from, to, помилка)."""
+    try:
+        date_from = date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        date_to = date.fromisoformat(request.args["to"]) if request.args.get("to") else None
+    except ValueError:
+        return None, None, "Дати from/to мають бути у форматі YYYY-MM-DD"
+    if date_from and date_to and date_from > date_to:
+        return None, None, "Дата from не може бути пізніше за to"
+    return date_from, date_to, None
+
+
 @app.route("/api/tasks", methods=["GET", "POST", "PUT", "DELETE"])
 @login_required
 @csrf.exempt  # Исключаем API из CSRF проверки
 def tasks():
-    db = load_tasks()
-    
-    if request.method == "GET":  # 🔹 отримати всі прямокутники
-        # Здесь фильтруем задачи, удаляя те, которые старше 90 дней
-        today = date.today()
-        cutoff_date = today - timedelta(days=90)
-        tasks_to_delete = []
-        
-        for task_id, task_data in db.items():
-            try:
-                # Получаем дату начала задачи из строки ISO
-                task_date_str = task_data.get("start", "")
-                if task_date_str:
-                    # Преобразуем ISO строку в объект date (берем только дату, без времени)
-                    task_date = date.fromisoformat(task_date_str.split("T")[0])
-                    # Если задача старше 90 дней, добавляем в список на удаление
-                    if task_date < cutoff_date:
-                        tasks_to_delete.append(task_id)
-            except Exception as e:
-                print(f"Ошибка при проверке даты задачи {task_id}: {e}")
-        
-        # Удаляем старые задачи из базы данных
-        if tasks_to_delete:
-            for task_id in tasks_to_delete:
-                db.pop(task_id, None)
-                print(f"Задача {task_id} удалена, так как она старше 90 дней")
-            
-            # Сохраняем обновленную базу данных
-            save_tasks(db)
-            print(f"Удалено {len(tasks_to_delete)} устаревших задач")
-            
-        return jsonify(db)
+    if request.method == "GET":  # 🔹 отримати всі прямокутники (або лише ті, що у вікні дат)
+        # Старі задачі прибирає retention_scheduler у фоні — тут лише читання з кешу
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+        since = request.args.get("since")
+        if since is not None:
+            # ?since=<ревізія> — лише змінені прямокутники + id видалених (дельта-синхронізація)
+            if date_from or date_to:
+                return jsonify(error="Параметр since не поєднується з from/to"), 400
+            changes = task_store.changes_since(since)
+            # Дельта залежить від токена; повний стан (чужий чи застарілий токен) — лише від ревізії
+            etag = f"tasks-{changes['revision']}-" + ("full" if changes["full"] else f"since-{since}")
+            response = conditional_json(etag, lambda: changes)
+            response.headers["X-Tasks-Revision"] = changes["revision"]
+            return response
+
+        # Ревізію беремо до читання: дані можуть бути лише новішими за неї, тож
+        # наступний ?since= у гіршому разі повторить зміну, але не пропустить її
+        revision = task_store.revision()
+        if not date_from and not date_to:
+            response = conditional_json(f"tasks-{revision}", task_store.all)
+            response.headers["X-Tasks-Revision"] = revision
+            return response
+
+        # ?from=YYYY-MM-DD&to=YYYY-MM-DD — прямокутники, що перетинають вікно (межі включні)
+        date_from, date_to, error = parse_date_window()
+        if error:
+            return jsonify(error=error), 400
+        response = conditional_json(
+            f"tasks-{revision}-{date_from or ''}-{date_to or ''}",
+            lambda: task_store.query_window(date_from, date_to),
+        )
+        response.headers["X-Tasks-Revision"] = revision
+        return response
 
     # Перевіряємо права для модифікації даних
     if current_user.role == 'viewer':
@@ -571,32 +667,114 @@ def tasks():
     rect_id = payload.get("id")
 
     if request.method == "POST":  # 🔸 створити новий прямокутник
-        db[rect_id] = payload  # frontend присвоює id через Date.now()
-        save_tasks(db)
+        task_store.put(rect_id, payload)  # frontend присвоює id через Date.now()
         return jsonify(status="created")
 
     if request.method == "PUT":  # 🟠 оновити існуючий прямокутник
-        if rect_id not in db:
+        if not task_store.update(rect_id, payload):
             return jsonify(error="not found"), 404
-        db[rect_id].update(payload)
-        save_tasks(db)
         return jsonify(status="updated")
 
     if request.method == "DELETE":  # ❌ видалити прямокутник
-        db.pop(rect_id, None)
-        save_tasks(db)
+        task_store.delete(rect_id)
         return jsonify(status="deleted")
 
     return jsonify(error="bad request"), 400
 
 
+TASKS_BATCH_MAX_OPS = 1000  # верхня межа операцій в одному пакеті
+
+
+@app.route("/api/tasks/batch", methods=["POST"])
+@login_required
+@csrf.exempt  # Исключаем API из CSRF проверки
+def tasks_batch():
+    """📦 Пакет змін прямокутників: все або нічого, один запис у сховище на весь пакет."""
+    if current_user.role == 'viewer':
+        return jsonify(error="Недостатньо прав для виконання цієї операції"), 403
+
+    payload = request.get_json(force=True, silent=True)
+    ops = payload.get("ops") if isinstance(payload, dict) else payload
+    if not isinstance(ops, list):
+        return jsonify(error="Очікується список операцій (ops)"), 400
+    if len(ops) > TASKS_BATCH_MAX_OPS:
+        return jsonify(error=f"Не більше {TASKS_BATCH_MAX_OPS} операцій за раз"), 400
+
+    try:
+        results = task_store.apply_batch(ops)
+    except TaskBatchError as e:
+        # Жодна операція пакета не застосована
+        return jsonify(error=str(e), index=e.index), (404 if e.not_found else 400)
+    return jsonify(status="applied", results=results)
+
+
+@app.route("/api/tasks/<rect_id>", methods=["PATCH"])
+@login_required
+@csrf.exempt  # Исключаем API из CSRF проверки
+def patch_task(rect_id):
+    """🟡 Часткове оновлення прямокутника: JSON Merge Patch (RFC 7396), лише змінені поля."""
+    if current_user.role == 'viewer':
+        return jsonify(error="Недостатньо прав для виконання цієї операції"), 403
+
+    # force=True — приймаємо і application/merge-patch+json, і application/json
+    patch = request.get_json(force=True, silent=True)
+    if not isinstance(patch, dict):
+        return jsonify(error="Тіло запиту має бути JSON-об'єктом (merge patch)"), 400
+    # id з тіла може бути числом ({"id": 5}) — порівнюємо так само нормалізованим, як у TaskStore
+    if "id" in patch and task_key(patch["id"]) != task_key(rect_id):
+        return jsonify(error="Не можна змінювати id прямокутника"), 400
+
+    if task_store.patch(rect_id, patch) is None:
+        return jsonify(error="not found"), 404
+    return jsonify(status="patched")
+
+
+@app.route("/api/archive/tasks")
+@login_required
+@csrf.exempt  # Исключаем API из CSRF проверки
+def archived_tasks():
+    """🗄️ Архівні прямокутники (старші за вікно зберігання), що перетинають ?from=&to=."""
+    if task_archive is None:
+        return jsonify(error="Архів задач вимкнено (TASKS_ARCHIVE_ENABLED=false)"), 404
+    date_from, date_to, error = parse_date_window()
+    if error:
+        return jsonify(error=error), 400
+    etag = f"archive-{task_archive.version()}-{date_from or ''}-{date_to or ''}"
+    return conditional_json(etag, lambda: task_archive.query_window(date_from, date_to))
+
+
+@app.route("/api/stream")
+@login_required
+@limiter.exempt  # EventSource перепідключається сам (щонайменше раз на SSE_MAX_STREAM_SECONDS)
+def stream():
+    """📡 Server-Sent Events: зміни прямокутників (tasks), нові записи логу (log) і reset.
+
+    Пропущене після Last-Event-ID дочитується з буфера брокера; якщо id застарів або належить
+    іншому воркеру — приходить reset, і клієнт синхронізується через GET /api/tasks?since=.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    subscription = event_broker.subscribe(last_event_id)
+    response = Response(
+        event_broker.stream(
+            subscription,
+            keepalive=SSE_KEEPALIVE_SECONDS,
+            max_duration=SSE_MAX_STREAM_SECONDS,
+            on_idle=task_store.revision,  # помічаємо зміни інших воркерів на диску
+        ),
+        mimetype="text/event-stream",
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx не повинен буферизувати стрім
+    return response
+
+
 @app.route("/api/goods")
 @login_required
 @csrf.exempt  # Исключаем API из CSRF проверки
 def goods():
     """Передаємо список товарів з Excel-файлу для форми замовлення."""
-    goods_list = load_goods()
-    return jsonify(goods_list)
+    etag, body = goods_repository.goods_json()
+    return conditional_json(etag, lambda: body)
 
 
 @app.route("/api/warehouses")
@@ -604,8 +782,8 @@ def goods():
 @csrf.exempt  # Исключаем API из CSRF проверки
 def warehouses():
     """Передаємо список складів з Excel-файлу."""
-    warehouse_list = load_warehouses()
-    return jsonify(warehouse_list)
+    snapshot = goods_cache.get()
+    return conditional_json(catalog_etag("warehouses", snapshot), lambda: snapshot.warehouses_json)
 
 
 @app.route("/api/log_event", methods=["POST"])
@@ -615,6 +793,8 @@ def log_event():
     """Сохраняем события лога изменений (только последние 100 записей)."""
     try:
         log_data = request.json
+        # Ідентифікатор вкладки-відправника: не зберігаємо, лише щоб вона не отримала власний запис по SSE
+        client_id = log_data.pop("clientId", None)
         
         # Проверяем, является ли это просмотром
         if (log_data.get("type") == "view" or 
@@ -626,7 +806,7 @@ def log_event():
             
         log_file = BASE_DIR / "logs" / "changes_log.json"
         
-        with log_file_lock:  # Блокируем доступ к файлу
+        with log_file_lock, file_lock(CHANGES_LOG_LOCK_FILE):  # Блокируем доступ к файлу (и для других воркеров)
             # Загружаем существующие логи или создаем пустой список
             if log_file.exists():
                 try:
@@ -662,14 +842,15 @@ def log_event():
             if len(logs) > 100:
                 logs = logs[:100]
             
-            # Сохраняем обновленный лог
+            # Сохраняем обновленный лог (атомарно: читатели не увидят полузаписанный файл)
             try:
-                with log_file.open("w", encoding="utf-8") as f:
-                    json.dump(logs, f, ensure_ascii=False, indent=2)
+                write_json_atomic(log_file, logs, indent=2)
                 print(f"Successfully saved {len(logs)} logs to {log_file}")
             except Exception as write_error:
                 print(f"Error writing log file: {write_error}")
                 raise write_error
+
+        event_broker.publish("log", {"entry": log_data, "origin": client_id})
             
         return jsonify({"status": "ok"})
     except Exception as e:
@@ -861,7 +1042,9 @@ def manual_backup():
     """Ручне створення бекапу."""
     ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
     
-    if create_backup():
+    # Через ту саму чергу, що й фонові бекапи (без вікна об'єднання): адміністратор чекає результату
+    job = backup_worker.wait(backup_worker.submit("manual", delay=0), timeout=120)
+    if job and job['state'] == 'done':
         log_security_event("MANUAL_BACKUP_CREATED", current_user.username, "Manual backup created successfully", ip_address)
         flash('Бекап успішно створено', 'success')
     else:
@@ -870,33 +1053,105 @@ def manual_backup():
     
     return redirect(url_for('security_panel'))
 
-@app.route("/admin/restore_backup/<backup_name>", methods=["POST"])
+@app.route("/admin/backup_jobs")
+@app.route("/admin/backup_jobs/<job_id>")
 @login_required
 @role_required('super_admin')
-def restore_backup(backup_name):
-    """Відновлення з бекапу."""
-    ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+def backup_jobs(job_id=None):
+    """Статус фонових задач бекапу (усіх останніх або однієї)."""
+    if job_id is None:
+        return jsonify({'jobs': backup_worker.jobs(), 'stats': backup_worker.stats()})
+    job = backup_worker.status(job_id)
+    if job is None:
+        return jsonify({"error": "Задачу не знайдено"}), 404
+    return jsonify(job)
+
+def apply_backup(backup_name):
+    """Відновлює дані з бекапу; False — бекапу не існує.
     
-    try:
-        backup_folder = BACKUP_DIR / backup_name
-        if not backup_folder.exists():
-            flash('Бекап не знайдено', 'error')
-            return redirect(url_for('security_panel'))
+    Спершу всі файли розпаковуються в тимчасову папку з перевіркою хешів — пошкоджений бекап
+    відхиляється до того, як змінено хоч один робочий файл. Потім кожен файл замінюється
+    атомарно (os.replace), а прямокутники — через TaskStore.
+    """
+    if not backup_manager.exists(backup_name):
+        return False
+    
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIR, prefix=".restore.") as tmp:
+        backup_files = backup_manager.extract(backup_name, tmp)
         
-        # Створюємо бекап поточного стану перед відновленням
-        create_backup()
+        # Створюємо бекап поточного стану перед відновленням; без нього не відновлюємо
+        job = backup_worker.wait(backup_worker.submit("restore", delay=0), timeout=120)
+        if not job or job['state'] != 'done':
+            raise RuntimeError("не вдалося створити бекап поточного стану")
         
         # Відновлюємо файли з бекапу
         files_to_restore = [
             ("users.json", USERS_FILE),
-            ("tasks.json", DATA_FILE),
             ("changes_log.json", BASE_DIR / "logs" / "changes_log.json")
         ]
         
         for backup_file, target_file in files_to_restore:
-            backup_path = backup_folder / backup_file
-            if backup_path.exists():
-                shutil.copy2(backup_path, target_file)
+            if backup_file in backup_files:
+                os.replace(backup_files[backup_file], target_file)
+        
+        # Прямокутники відновлюємо через бекенд, щоб кеш TaskStore теж оновився
+        if "tasks.json" in backup_files:
+            task_store.import_snapshot(backup_files["tasks.json"])
+    return True
+
+@app.route("/admin/backups/<backup_name>/download")
+@login_required
+@role_required('super_admin')
+def download_backup(backup_name):
+    """Вивантаження бекапу одним архівом tar.gz (формується потоково)."""
+    ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+    
+    archive = backup_manager.stream_archive(backup_name)
+    if archive is None:
+        return jsonify({"error": "Бекап не знайдено"}), 404
+    
+    log_security_event("BACKUP_DOWNLOADED", current_user.username, f"Downloaded backup: {backup_name}", ip_address)
+    return Response(archive, mimetype="application/gzip", headers={
+        "Content-Disposition": f'attachment; filename="{backup_name}.tar.gz"',
+    })
+
+@app.route("/admin/restore_backup_upload", methods=["POST"])
+@login_required
+@role_required('super_admin')
+def restore_backup_upload():
+    """Відновлення із завантаженого архіву tar.gz: імпорт як нового бекапу, потім відновлення."""
+    ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+    
+    archive = request.files.get('archive')
+    if archive is None or not archive.filename:
+        flash('Файл архіву не вибрано', 'error')
+        return redirect(url_for('security_panel'))
+    
+    try:
+        backup_name = backup_manager.import_archive(archive.stream, BACKUP_FILE_NAMES)
+        apply_backup(backup_name)
+        log_security_event("BACKUP_RESTORED", current_user.username, f"Restored from uploaded archive {archive.filename} (imported as {backup_name})", ip_address)
+        flash(f'Дані успішно відновлено з архіву {archive.filename}', 'success')
+    except BackupIntegrityError as e:
+        log_security_event("BACKUP_RESTORE_FAILED", current_user.username, f"Rejected uploaded archive {archive.filename}: {str(e)}", ip_address)
+        flash(f'Архів не пройшов перевірку: {e}', 'error')
+    except Exception as e:
+        log_security_event("BACKUP_RESTORE_FAILED", current_user.username, f"Failed to restore uploaded archive {archive.filename}: {str(e)}", ip_address)
+        flash(f'Помилка відновлення бекапу: {e}', 'error')
+    
+    return redirect(url_for('security_panel'))
+
+@app.route("/admin/restore_backup/<backup_name>", methods=["POST"])
+@login_required
+@role_required('super_admin')
+def restore_backup(backup_name):
+    """Відновлення з бекапу."""
+    ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+    
+    try:
+        if not apply_backup(backup_name):
+            flash('Бекап не знайдено', 'error')
+            return redirect(url_for('security_panel'))
         
         log_security_event("BACKUP_RESTORED", current_user.username, f"Restored from backup: {backup_name}", ip_address)
         flash(f'Дані успішно відновлено з бекапу {backup_name}', 'success')
@@ -908,31 +1163,22 @@ def restore_backup(backup_name):
     return redirect(url_for('security_panel'))
 
 def get_backup_stats():
-    """Отримання статистики бекапів."""
+    """Отримання статистики бекапів (лише з каталогу — без обходу папки бекапів)."""
     try:
-        backup_folders = [d for d in BACKUP_DIR.iterdir() if d.is_dir() and d.name.startswith("backup_")]
+        backups = backup_manager.list_backups()
         
         stats = {
-            'total_backups': len(backup_folders),
+            'total_backups': len(backups),
             'backups': []
         }
         
-        for backup_folder in sorted(backup_folders, reverse=True)[:10]:  # Останні 10
-            try:
-                # Отримуємо дату з назви папки
-                date_str = backup_folder.name.replace("backup_", "")
-                backup_date = datetime.strptime(date_str, "%Y%m%d_%H%M%S")
-                
-                # Розмір бекапу
-                total_size = sum(f.stat().st_size for f in backup_folder.rglob('*') if f.is_file())
-                
-                stats['backups'].append({
-                    'name': backup_folder.name,
-                    'date': backup_date.strftime("%Y-%m-%d %H:%M:%S"),
-                    'size': f"{total_size / 1024:.1f} KB"
-                })
-            except Exception as e:
-                print(f"Помилка обробки бекапу {backup_folder}: {e}")
+        for backup in backups[:10]:  # Останні 10
+            stats['backups'].append({
+                'name': backup['name'],
+                'date': backup['created_at'].strftime("%Y-%m-%d %H:%M:%S"),
+                'size': f"{backup['size'] / 1024:.1f} KB",
+                'status': backup['status']
+            })
         
         return stats
     except Exception as e:
@@ -943,18 +1189,14 @@ def get_backup_stats():
 def save_goods(goods_data):
     """Зберігає товари в файл goods.xlsx, зберігаючи існуючі колонки"""
     try:
-        # Спочатку читаємо існуючий файл щоб зберегти інші колонки (наприклад, склади)
+        # Інші колонки (наприклад, склади) беремо з уже прочитаного знімка, а не з файлу
         existing_columns = {}
-        if GOODS_FILE.exists():
-            try:
-                existing_df = pd.read_excel(GOODS_FILE)
-                # Зберігаємо всі колонки крім основних товарних
-                main_columns = ['Категорія', 'Назва товару', 'Вага (кг)', 'Коефіцієнт паллети']
-                for col in existing_df.columns:
-                    if col not in main_columns:
-                        existing_columns[col] = existing_df[col].tolist()
-            except Exception as e:
-                print(f"Помилка читання існуючого файлу: {e}")
+        existing_df = goods_cache.get().frame
+        # Зберігаємо всі колонки крім основних товарних
+        main_columns = ['Категорія', 'Назва товару', 'Вага (кг)', 'Коефіцієнт паллети']
+        for col in existing_df.columns:
+            if col not in main_columns:
+                existing_columns[col] = existing_df[col].tolist()
         
         # Створюємо нові рядки з товарами
         rows = []
@@ -979,7 +1221,8 @@ def save_goods(goods_data):
             else:
                 df[col_name] = col_data
         
-        df.to_excel(GOODS_FILE, index=False)
+        write_excel_atomic(df, GOODS_FILE)
+        goods_cache.invalidate()
         print(f"Товари збережено в {GOODS_FILE} (збережено {len(df)} рядків)")
         return True
     except Exception as e:
@@ -989,10 +1232,11 @@ def save_goods(goods_data):
 # Функція для збереження складів в Excel файл
 def save_warehouses(warehouses_list):
     """Зберігає склади в файл goods.xlsx (колонка 'Склади'), зберігаючи існуючі товари"""
-    try:
-        # Спочатку читаємо існуючі дані товарів
-        if GOODS_FILE.exists():
-            df = pd.read_excel(GOODS_FILE)
+    def write():
+        # Існуючі дані товарів — з уже прочитаного знімка (копія: знімок спільний)
+        snapshot = goods_cache.get()
+        if snapshot.signature is not None:
+            df = snapshot.frame.copy()
         else:
             # Якщо файлу немає, створюємо базову структуру
             df = pd.DataFrame({
@@ -1025,15 +1269,30 @@ def save_warehouses(warehouses_list):
         
         # Додаємо або оновлюємо колонку складів
         df['Склади'] = warehouses_padded
-        
-        df.to_excel(GOODS_FILE, index=False)
+        write_excel_atomic(df, GOODS_FILE)
+        return True
+
+    try:
+        # Через репозиторій товарів: спершу дописуються відкладені правки товарів, і весь
+        # запис іде під тим самим блокуванням GOODS_LOCK_FILE, тож ні фоновий запис цього
+        # процесу, ні інший воркер не перезапише файл між читанням знімка і записом складів
+        if not goods_repository.write_file(write):
+            return False
+        goods_cache.invalidate()
         print(f"Склади збережено в {GOODS_FILE} ({len(warehouses_list)} складів)")
         return True
     except Exception as e:
         print(f"Помилка збереження складів: {e}")
         return False
-        print(f"Помилка збереження складів: {e}")
-        return False
+
+
+# Індексований репозиторій товарів для адмінки: правки одразу видно в API цього
+# процесу, а goods.xlsx переписується у фоні одним записом на серію правок
+goods_repository = GoodsRepository(
+    goods_cache, save_goods, flush_delay=GOODS_FLUSH_DELAY_SECONDS,
+    lock_path=GOODS_LOCK_FILE,
+)
+atexit.register(goods_repository.flush)
 
 # 🔍 HEALTH CHECK ENDPOINT для моніторингу
 @app.route('/health')
@@ -1057,6 +1316,13 @@ def health_check():
                 'goods_xlsx': goods_exists,
                 'logs_directory': logs_accessible
             },
+            'task_store': task_store.stats(),
+            'retention': retention_scheduler.stats(),
+            'event_stream': event_broker.stats(),
+            'archive': task_archive.stats() if task_archive is not None else None,
+            'backups': backup_worker.stats(),
+            'goods_cache': goods_cache.stats(),
+            'goods_repository': goods_repository.stats(),
             'csrf_enabled': hasattr(app, 'csrf') or 'csrf' in str(app.before_request_funcs),
             'rate_limiting': 'limiter' in globals()
         }
@@ -1083,9 +1349,9 @@ def goods_management():
     """Управління товарами - тільки для супер адміна"""
     
     if request.method == "GET":
-        # Отримання списку товарів
-        goods_list = load_goods()
-        return jsonify(goods_list)
+        # Отримання списку товарів (разом із ще не записаними в Excel правками)
+        _, body = goods_repository.goods_json()
+        return app.response_class(body, mimetype="application/json")
     
     elif request.method == "POST":
         # Додавання нового товару
@@ -1099,30 +1365,12 @@ def goods_management():
             if not category or not name:
                 return jsonify({'error': 'Категорія та назва товару обов\'язкові'}), 400
             
-            # Завантажуємо поточні товари
-            goods_data = load_goods()
-            
-            # Перевіряємо, чи товар вже існує
-            if category in goods_data:
-                for item in goods_data[category]:
-                    if item['name'].lower() == name.lower():
-                        return jsonify({'error': 'Товар з такою назвою вже існує в цій категорії'}), 400
-            else:
-                goods_data[category] = []
-            
-            # Додаємо новий товар
-            goods_data[category].append({
-                'name': name,
-                'weight': weight,
-                'pallet_coef': pallet_coef
-            })
-            
-            # Зберігаємо в Excel
-            if save_goods(goods_data):
-                return jsonify({'success': True, 'message': 'Товар успішно додано'})
-            else:
-                return jsonify({'error': 'Помилка збереження товару'}), 500
+            # Перевірка дубліката й додавання — за індексом; Excel запишеться у фоні
+            goods_repository.add(category, name, weight, pallet_coef)
+            return jsonify({'success': True, 'message': 'Товар успішно додано'})
                 
+        except GoodsConflictError:
+            return jsonify({'error': 'Товар з такою назвою вже існує в цій категорії'}), 400
         except Exception as e:
             return jsonify({'error': f'Помилка: {str(e)}'}), 500
     
@@ -1140,46 +1388,13 @@ def goods_management():
             if not old_category or not old_name or not new_category or not new_name:
                 return jsonify({'error': 'Всі поля обов\'язкові'}), 400
             
-            # Завантажуємо поточні товари
-            goods_data = load_goods()
-            
-            # Знаходимо та видаляємо старий товар
-            found = False
-            if old_category in goods_data:
-                for i, item in enumerate(goods_data[old_category]):
-                    if item['name'].lower() == old_name.lower():
-                        del goods_data[old_category][i]
-                        found = True
-                        break
-                        
-                # Видаляємо порожню категорію
-                if not goods_data[old_category]:
-                    del goods_data[old_category]
-            
-            if not found:
-                return jsonify({'error': 'Товар не знайдено'}), 404
-            
-            # Перевіряємо, чи новий товар не дублюється
-            if new_category in goods_data:
-                for item in goods_data[new_category]:
-                    if item['name'].lower() == new_name.lower():
-                        return jsonify({'error': 'Товар з такою назвою вже існує в цій категорії'}), 400
-            else:
-                goods_data[new_category] = []
-            
-            # Додаємо оновлений товар
-            goods_data[new_category].append({
-                'name': new_name,
-                'weight': weight,
-                'pallet_coef': pallet_coef
-            })
-            
-            # Зберігаємо в Excel
-            if save_goods(goods_data):
-                return jsonify({'success': True, 'message': 'Товар успішно оновлено'})
-            else:
-                return jsonify({'error': 'Помилка збереження товару'}), 500
+            goods_repository.update(old_category, old_name, new_category, new_name, weight, pallet_coef)
+            return jsonify({'success': True, 'message': 'Товар успішно оновлено'})
                 
+        except GoodsNotFoundError:
+            return jsonify({'error': 'Товар не знайдено'}), 404
+        except GoodsConflictError:
+            return jsonify({'error': 'Товар з такою назвою вже існує в цій категорії'}), 400
         except Exception as e:
             return jsonify({'error': f'Помилка: {str(e)}'}), 500
     
@@ -1193,35 +1408,14 @@ def goods_management():
             if not category or not name:
                 return jsonify({'error': 'Категорія та назва товару обов\'язкові'}), 400
             
-            # Завантажуємо поточні товари
-            goods_data = load_goods()
-            
-            # Знаходимо та видаляємо товар
-            found = False
-            if category in goods_data:
-                for i, item in enumerate(goods_data[category]):
-                    if item['name'].lower() == name.lower():
-                        del goods_data[category][i]
-                        found = True
-                        break
-                        
-                # Видаляємо порожню категорію
-                if not goods_data[category]:
-                    del goods_data[category]
-            
-            if not found:
-                return jsonify({'error': 'Товар не знайдено'}), 404
-            
-            # Зберігаємо в Excel
-            if save_goods(goods_data):
-                return jsonify({'success': True, 'message': 'Товар успішно видалено'})
-            else:
-                return jsonify({'error': 'Помилка збереження після видалення'}), 500
+            goods_repository.delete(category, name)
+            return jsonify({'success': True, 'message': 'Товар успішно видалено'})
                 
+        except GoodsNotFoundError:
+            return jsonify({'error': 'Товар не знайдено'}), 404
         except Exception as e:
             return jsonify({'error': f'Помилка: {str(e)}'}), 500
 
-
 # API для експорту товарів в Excel
 @app.route("/api/goods_export")
 @login_required
@@ -1229,6 +1423,8 @@ def goods_management():
 def goods_export():
     """Експорт товарів в Excel файл"""
     try:
+        # Експорт має містити й ще не записані правки
+        goods_repository.flush()
         if not GOODS_FILE.exists():
             return jsonify({'error': 'Файл товарів не знайдено'}), 404
         
@@ -1247,7 +1443,11 @@ def goods_export():
 @login_required
 @role_required('super_admin')
 def goods_import():
-    """Імпорт товарів з Excel файлу"""
+    """Імпорт товарів з Excel/CSV файлу: потоковий розбір і застосування лише різниці.
+
+    Поля форми: file; mode=replace (типово — файл є повним каталогом, відсутні товари
+    видаляються) або merge (лише додати й оновити); dry_run=1 — тільки звіт без змін.
+    """
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'Файл не надано'}), 400
@@ -1256,28 +1456,52 @@ def goods_import():
         if file.filename == '':
             return jsonify({'error': 'Файл не вибрано'}), 400
         
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            return jsonify({'error': 'Підтримуються тільки Excel файли (.xlsx, .xls)'}), 400
+        if not file.filename.lower().endswith(IMPORT_EXTENSIONS):
+            return jsonify({'error': 'Підтримуються тільки файли .xlsx, .xls та .csv'}), 400
+        
+        replace = request.form.get('mode', 'replace') != 'merge'
+        dry_run = request.form.get('dry_run') in ('1', 'true')
         
-        # Читаємо завантажений файл
-        df = pd.read_excel(file)
+        # Різниця рахується відносно каталогу разом із ще не записаними правками з адмінки
+        version, current = goods_repository.items()
+        importer = GoodsImport(current, replace=replace)
+        for first_row, chunk in iter_import_chunks(file.stream, file.filename):
+            importer.feed(first_row, chunk)
+        report = importer.report()
         
-        # Перевіряємо, чи є потрібні колонки
-        required_columns = ['Категорія', 'Назва товару', 'Вага (кг)', 'Коефіцієнт паллети']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        if importer.error_count:
+            shown = '; '.join(f"рядок {e['row']}: {e['error']}" for e in importer.errors[:5])
+            return jsonify({
+                'error': f'Файл містить помилки в {importer.error_count} рядках, імпорт скасовано. {shown}',
+                'report': report,
+            }), 400
         
-        if missing_columns:
-            return jsonify({'error': f'Відсутні колонки: {", ".join(missing_columns)}'}), 400
+        if replace and report['rows'] == 0:
+            # Файл без жодного товару в режимі заміни видалив би весь каталог
+            return jsonify({'error': 'Файл не містить жодного товару, каталог не змінено', 'report': report}), 400
         
-        # Зберігаємо файл як новий goods.xlsx
-        df.to_excel(GOODS_FILE, index=False)
+        if dry_run:
+            return jsonify({'success': True, 'message': 'Перевірку завершено, зміни не застосовано', 'report': report})
         
-        return jsonify({'success': True, 'message': 'Товари успішно імпортовано'})
+        # goods.xlsx перепише фоновий запис репозиторію — воркер не чекає на запис Excel
+        goods_repository.apply_changes(version, importer.added, importer.updated, importer.removed())
+        print(f"Імпорт товарів ({file.filename}): {report['rows']} рядків, додано {report['added']}, "
+              f"оновлено {report['updated']}, видалено {report['removed']}")
         
+        return jsonify({
+            'success': True,
+            'message': (f"Товари успішно імпортовано: додано {report['added']}, "
+                        f"оновлено {report['updated']}, видалено {report['removed']}"),
+            'report': report,
+        })
+        
+    except GoodsImportError as e:
+        return jsonify({'error': str(e)}), 400
+    except GoodsConflictError:
+        return jsonify({'error': 'Каталог змінився під час імпорту, спробуйте ще раз'}), 409
     except Exception as e:
         return jsonify({'error': f'Помилка імпорту: {str(e)}'}), 500
 
-
 # Сторінка управління товарами
 @app.route("/goods_management")
 @login_required
@@ -1298,8 +1522,7 @@ def warehouses_management():
     
     if request.method == "GET":
         # Отримання списку складів
-        warehouses_list = load_warehouses()
-        return jsonify(warehouses_list)
+        return app.response_class(goods_cache.get().warehouses_json, mimetype="application/json")
     
     elif request.method == "POST":
         # Додавання нового складу
@@ -1446,19 +1669,16 @@ def test_goods_api():
             
         # Тест 4: Додавання тестового товару
         try:
-            test_goods = goods.copy() if 'goods' in locals() else {}
-            if "Тест" not in test_goods:
-                test_goods["Тест"] = []
-            
             test_item = {
                 "name": f"Тестовий товар {datetime.now().strftime('%H:%M:%S')}",
                 "weight": 1.0,
                 "pallet_coef": 1.0
             }
-            test_goods["Тест"].append(test_item)
             
-            # Спробуємо зберегти
-            if save_goods(test_goods):
+            # Через репозиторій, як і правки з адмінки: відкладені правки не перетираються,
+            # а flush() одразу записує все разом у goods.xlsx
+            goods_repository.add("Тест", test_item["name"], test_item["weight"], test_item["pallet_coef"])
+            if goods_repository.flush():
                 result["tests"].append({
                     "name": "Збереження товару", 
                     "status": "✅", 
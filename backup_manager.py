@@ -0,0 +1,667 @@
+"""Інкрементальні бекапи з адресацією за вмістом.
+
+Кожен файл зберігається один раз у сховищі ``blobs/`` — стиснутим gzip під іменем SHA-256
+свого (нестиснутого) вмісту, а бекап — це маленький маніфест ``backup_YYYYmmdd_HHMMSS.json``
+з переліком «ім'я файлу → хеш». Незмінений файл не копіюється повторно, тож бекап при кожному
+вході користувача коштує одне читання файлів і запис маніфесту. Старі бекапи видаляються
+разом з маніфестом, а блоби, на які більше не посилається жоден маніфест, прибирає збирач сміття.
+
+Для винесення за межі сервера бекап віддається одним архівом tar.gz, який формується потоково
+(маніфест + файли), і так само потоково імпортується назад з перевіркою хешів. Відновлення
+спершу розпаковує і перевіряє всі файли, і лише потім замінює робочі.
+
+Бекапи старого формату (папки ``backup_YYYYmmdd_HHMMSS/`` з повними копіями) і далі
+показуються, відновлюються і враховуються в ротації.
+
+Каталог ``catalog.json`` (ім'я, час, розміри, хеші файлів, статус кожного бекапу) оновлюється
+при створенні, імпорті та ротації; список бекапів, ротація і збирач сміття читають лише його,
+а не обходять папку бекапів. Якщо каталогу немає, він один раз відновлюється скануванням.
+
+Бекапи, що запитуються із запитів (вхід, збереження задач), виконує ``BackupWorker`` —
+один фоновий потік, який об'єднує запити в межах вікна, тож запит користувача не чекає
+на дискові операції бекапу.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+from task_store import file_lock, write_json_atomic
+
+HASH_CHUNK = 1024 * 1024
+ARCHIVE_MANIFEST = "manifest.json"
+
+
+def file_sha256(path):
+    """(SHA-256, розмір у байтах) вмісту файлу."""
+    digest = hashlib.sha256()
+    size = 0
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class BackupIntegrityError(ValueError):
+    """Бекап або завантажений архів не пройшов перевірку (хеш, розмір, склад файлів)."""
+
+
+class BackupManager:
+    """Сховище блобів + маніфести бекапів у backup_dir; ротація зберігає keep останніх."""
+
+    PREFIX = "backup_"
+
+    def __init__(self, backup_dir, keep=10, blob_grace_seconds=3600):
+        self.backup_dir = Path(backup_dir)
+        self.blobs_dir = self.backup_dir / "blobs"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.lock_path = self.backup_dir / "backups.lock"
+        self.catalog_path = self.backup_dir / "catalog.json"
+        self.keep = keep
+        # Блоб, якого торкались нещодавно, не видаляємо: на нього може посилатись бекап,
+        # чий маніфест інший воркер ще не встиг записати
+        self.blob_grace_seconds = blob_grace_seconds
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------
+    # Сховище блобів
+    # ------------------------------------------------------------------
+    def blob_path(self, digest):
+        return self.blobs_dir / digest[:2] / f"{digest}.gz"
+
+    def _existing_blob(self, digest):
+        """Шлях до блоба або None; блоби без стиснення (перші версії сховища) теж читаються."""
+        for path in (self.blob_path(digest), self.blobs_dir / digest[:2] / digest):
+            if path.exists():
+                return path
+        return None
+
+    def open_blob(self, digest):
+        """Потік нестиснутого вмісту блоба."""
+        path = self._existing_blob(digest)
+        if path is None:
+            raise BackupIntegrityError(f"блоб {digest} відсутній у сховищі")
+        return gzip.open(path, "rb") if path.suffix == ".gz" else path.open("rb")
+
+    def _store_file(self, source):
+        """Кладе файл у сховище (якщо такого вмісту ще немає). Повертає (хеш, розмір)."""
+        digest, size = file_sha256(source)
+        existing = self._existing_blob(digest)
+        if existing is not None:
+            os.utime(existing)  # позначка «використовується» для збирача сміття
+            return digest, size
+        # Якщо файл змінився між читаннями, блоб отримає ім'я за тим вмістом, який реально стиснуто
+        with Path(source).open("rb") as f:
+            return self._store_stream(f)
+
+    def _store_stream(self, stream, max_bytes=None):
+        """Стискає потік у сховище, рахуючи хеш на льоту. Повертає (хеш, розмір)."""
+        fd, tmp_name = tempfile.mkstemp(prefix=".blob.", dir=str(self.blobs_dir))
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, "wb") as raw:
+                # mtime=0 — однаковий вміст дає однаковий стиснутий файл
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as gz:
+                    for chunk in iter(lambda: stream.read(HASH_CHUNK), b""):
+                        size += len(chunk)
+                        if max_bytes is not None and size > max_bytes:
+                            raise BackupIntegrityError(f"файл більший за {max_bytes} байт")
+                        digest.update(chunk)
+                        gz.write(chunk)
+                raw.flush()
+                os.fsync(raw.fileno())
+            digest = digest.hexdigest()
+            if self._existing_blob(digest) is not None:
+                os.unlink(tmp_name)
+                os.utime(self._existing_blob(digest))
+            else:
+                target = self.blob_path(digest)
+                target.parent.mkdir(exist_ok=True)
+                os.replace(tmp_name, target)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+        return digest, size
+
+    # ------------------------------------------------------------------
+    # Створення, ротація, відновлення
+    # ------------------------------------------------------------------
+    @classmethod
+    def _order_key(cls, name):
+        """Хронологічний порядок імен backup_<дата>_<час>[_<n>] (n — кілька бекапів за секунду)."""
+        parts = name[len(cls.PREFIX):].split(".")[0].split("_")
+        suffix = parts[2] if len(parts) > 2 else "1"
+        return "_".join(parts[:2]), int(suffix) if suffix.isdigit() else 0
+
+    def _manifests(self):
+        return sorted(self.backup_dir.glob(f"{self.PREFIX}*.json"), key=lambda path: self._order_key(path.name))
+
+    def _legacy_folders(self):
+        return sorted(
+            (d for d in self.backup_dir.iterdir() if d.is_dir() and d.name.startswith(self.PREFIX)),
+            key=lambda path: self._order_key(path.name),
+        )
+
+    def _read_manifest(self, path):
+        with Path(path).open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def create(self, files, exporters=None):
+        """Створює бекап. files — [(ім'я в бекапі, шлях)], exporters — {ім'я: fn(target)}.
+
+        Повертає ім'я бекапу; якщо вміст не змінився з останнього бекапу, новий не створюється
+        і повертається ім'я останнього. Вкладений виклик з того самого потоку (хук бекапу
+        всередині експорту задач) нічого не робить — зовнішній бекап і так знімає стан.
+        """
+        if getattr(self._local, "active", False):
+            return None
+        self._local.active = True
+        try:
+            entries = {}
+            for name, source in files:
+                if Path(source).exists():
+                    digest, size = self._store_file(source)
+                    entries[name] = {"sha256": digest, "size": size}
+            for name, export in (exporters or {}).items():
+                fd, tmp_name = tempfile.mkstemp(prefix=".export.", dir=str(self.blobs_dir))
+                os.close(fd)
+                try:
+                    export(tmp_name)
+                    if Path(tmp_name).stat().st_size:
+                        digest, size = self._store_file(tmp_name)
+                        entries[name] = {"sha256": digest, "size": size}
+                finally:
+                    Path(tmp_name).unlink(missing_ok=True)
+
+            # Лише запис маніфесту і ротація — під міжпроцесним блокуванням (експорт задач
+            # вище бере блокування сховища задач, тож тримати наше під час нього не можна)
+            with file_lock(self.lock_path):
+                backups = self._sorted_backups(self._catalog_locked())
+                if backups and backups[-1].get("files") == self._hashes({"files": entries}):
+                    return backups[-1]["name"]
+
+                return self._write_manifest_locked(entries)
+        finally:
+            self._local.active = False
+
+    @staticmethod
+    def _hashes(manifest):
+        return {file_name: entry["sha256"] for file_name, entry in manifest["files"].items()}
+
+    def _write_manifest_locked(self, entries, status="ok", **extra):
+        """Записує маніфест нового бекапу, додає його в каталог і запускає ротацію.
+
+        Викликати під self.lock_path.
+        """
+        created = datetime.now()
+        stamp = created.strftime('%Y%m%d_%H%M%S')
+        catalog = self._catalog_locked()
+        # Суфікс більший за всі наявні в цю секунду: ім'я, звільнене ротацією, не
+        # перевикористовується — інакше новий бекап сортувався б як найстаріший і одразу видалявся
+        taken = [
+            self._order_key(existing)[1]
+            for existing in [*catalog["backups"], *(path.name for path in self.backup_dir.iterdir())]
+            if self._order_key(existing)[0] == stamp
+        ]
+        suffix = max(taken, default=0) + 1
+        name = f"{self.PREFIX}{stamp}" if suffix == 1 else f"{self.PREFIX}{stamp}_{suffix}"
+        manifest = {"name": name, "created_at": created.isoformat(timespec="seconds"), "files": entries, **extra}
+        write_json_atomic(self.backup_dir / f"{name}.json", manifest, indent=2)
+
+        catalog["backups"][name] = self._catalog_entry(manifest, status)
+        self._cleanup_locked(catalog)
+        return name
+
+    def cleanup(self):
+        """Залишає keep останніх бекапів (обох форматів) і прибирає непотрібні блоби."""
+        with file_lock(self.lock_path):
+            return self._cleanup_locked(self._catalog_locked())
+
+    def _cleanup_locked(self, catalog):
+        backups = self._sorted_backups(catalog)
+        removed = []
+        for backup in backups[:-self.keep] if len(backups) > self.keep else []:
+            name = backup["name"]
+            folder = self.backup_dir / name
+            if folder.is_dir():
+                shutil.rmtree(folder)
+            (self.backup_dir / f"{name}.json").unlink(missing_ok=True)
+            del catalog["backups"][name]
+            removed.append(name)
+            print(f"Видалено старий бекап: {name}")
+        self._write_catalog_locked(catalog)
+        self._collect_garbage(catalog)
+        return removed
+
+    def _collect_garbage(self, catalog):
+        referenced = set()
+        for backup in catalog["backups"].values():
+            referenced.update((backup.get("files") or {}).values())
+        threshold = time.time() - self.blob_grace_seconds
+        for blob in self.blobs_dir.glob("*/*"):
+            if blob.name.split(".")[0] not in referenced and blob.stat().st_mtime < threshold:
+                blob.unlink(missing_ok=True)
+
+    # ------------------------------------------------------------------
+    # Каталог бекапів
+    # ------------------------------------------------------------------
+    def _read_catalog(self):
+        try:
+            with self.catalog_path.open("r", encoding="utf-8") as f:
+                catalog = json.load(f)
+            return catalog if isinstance(catalog.get("backups"), dict) else None
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"Пошкоджений каталог бекапів, буде відновлено: {e}")
+            return None
+
+    def _write_catalog_locked(self, catalog):
+        write_json_atomic(self.catalog_path, catalog, indent=2)
+
+    def _catalog_locked(self):
+        """Каталог з диску; якщо його немає чи він пошкоджений — відновлюється скануванням."""
+        catalog = self._read_catalog()
+        if catalog is None:
+            catalog = self._scan_catalog()
+            self._write_catalog_locked(catalog)
+        return catalog
+
+    def _catalog_entry(self, manifest, status):
+        stored = 0
+        for entry in manifest["files"].values():
+            blob = self._existing_blob(entry["sha256"])
+            stored += blob.stat().st_size if blob is not None else 0
+        return {
+            "name": manifest["name"],
+            "created_at": manifest["created_at"],
+            "size": sum(entry["size"] for entry in manifest["files"].values()),
+            "stored": stored,
+            "files": self._hashes(manifest),
+            "status": status,
+        }
+
+    def _scan_catalog(self):
+        """Повне сканування папки бекапів (лише коли каталогу ще немає)."""
+        backups = {}
+        for path in self._manifests():
+            try:
+                manifest = self._read_manifest(path)
+                status = "imported" if manifest.get("imported_from") else "ok"
+                backups[manifest["name"]] = self._catalog_entry(manifest, status)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Помилка обробки бекапу {path.name}: {e}")
+        for folder in self._legacy_folders():
+            try:
+                created = datetime.strptime(folder.name[len(self.PREFIX):], "%Y%m%d_%H%M%S")
+                size = sum(f.stat().st_size for f in folder.rglob('*') if f.is_file())
+                backups[folder.name] = {
+                    "name": folder.name,
+                    "created_at": created.isoformat(timespec="seconds"),
+                    "size": size,
+                    "stored": size,
+                    "files": None,
+                    "status": "legacy",
+                }
+            except (OSError, ValueError) as e:
+                print(f"Помилка обробки бекапу {folder}: {e}")
+        return {"version": 1, "backups": backups}
+
+    def _sorted_backups(self, catalog):
+        return sorted(catalog["backups"].values(), key=lambda backup: self._order_key(backup["name"]))
+
+    def mark_status(self, name, status):
+        """Оновлює статус бекапу в каталозі (наприклад, "corrupt" після невдалої перевірки)."""
+        with file_lock(self.lock_path):
+            catalog = self._catalog_locked()
+            backup = catalog["backups"].get(name)
+            if backup is not None and backup["status"] != status:
+                backup["status"] = status
+                self._write_catalog_locked(catalog)
+
+    def rebuild_catalog(self):
+        """Пересканувати папку бекапів (після ручного копіювання бекапів на сервер)."""
+        with file_lock(self.lock_path):
+            previous = self._read_catalog() or {"backups": {}}
+            catalog = self._scan_catalog()
+            for name, backup in catalog["backups"].items():
+                # Статус із перевірок (наприклад, "corrupt") сканування не відновить — зберігаємо
+                if name in previous["backups"]:
+                    backup["status"] = previous["backups"][name]["status"]
+            self._write_catalog_locked(catalog)
+            return len(catalog["backups"])
+
+    def _entries(self, name):
+        """[(ім'я файлу, розмір, sha256 або None, відкривач потоку)] бекапу або None, якщо його немає."""
+        if "/" in name or "\\" in name or not name.startswith(self.PREFIX):
+            return None
+        manifest_path = self.backup_dir / f"{name}.json"
+        if manifest_path.exists():
+            manifest = self._read_manifest(manifest_path)
+            return [
+                (file_name, entry["size"], entry["sha256"], partial(self.open_blob, entry["sha256"]))
+                for file_name, entry in sorted(manifest["files"].items())
+            ]
+        folder = self.backup_dir / name
+        if folder.is_dir():
+            return [
+                (path.name, path.stat().st_size, None, partial(path.open, "rb"))
+                for path in sorted(folder.iterdir()) if path.is_file()
+            ]
+        return None
+
+    @staticmethod
+    def _stream_sha256(opener):
+        digest = hashlib.sha256()
+        with opener() as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def exists(self, name):
+        return self._entries(name) is not None
+
+    def extract(self, name, directory):
+        """Розпаковує бекап у directory з перевіркою хешів і розмірів; JSON-файли мають парситись.
+
+        Повертає {ім'я файлу: шлях} або None, якщо бекапу немає. При будь-якій невідповідності
+        кидає BackupIntegrityError — до заміни робочих файлів справа не доходить.
+        """
+        entries = self._entries(name)
+        if entries is None:
+            return None
+        try:
+            return self._extract_entries(name, entries, directory)
+        except BackupIntegrityError:
+            self.mark_status(name, "corrupt")
+            raise
+
+    @staticmethod
+    def _extract_entries(name, entries, directory):
+        extracted = {}
+        for file_name, size, expected, opener in entries:
+            target = Path(directory) / file_name
+            digest = hashlib.sha256()
+            written = 0
+            with opener() as src, target.open("wb") as out:
+                for chunk in iter(lambda: src.read(HASH_CHUNK), b""):
+                    digest.update(chunk)
+                    written += len(chunk)
+                    out.write(chunk)
+            if written != size or (expected is not None and digest.hexdigest() != expected):
+                raise BackupIntegrityError(f"{name}/{file_name}: вміст не відповідає маніфесту")
+            if file_name.endswith(".json"):
+                try:
+                    with target.open("r", encoding="utf-8") as f:
+                        json.load(f)
+                except ValueError as e:
+                    raise BackupIntegrityError(f"{name}/{file_name}: некоректний JSON ({e})")
+            extracted[file_name] = target
+        return extracted
+
+    def stream_archive(self, name):
+        """Генератор байтів tar.gz бекапу: спершу manifest.json з хешами, потім файли.
+
+        Архів не збирається ні в пам'яті, ні на диску — кожен блок стискається і віддається
+        одразу, тож вивантаження бекапу — одне послідовне читання блобів.
+        """
+        entries = self._entries(name)
+        if entries is None:
+            return None
+        # Для бекапів старого формату хешів немає — рахуємо їх заздалегідь (маніфест іде першим)
+        entries = [
+            (file_name, size, expected or self._stream_sha256(opener), opener)
+            for file_name, size, expected, opener in entries
+        ]
+        manifest = json.dumps({
+            "name": name,
+            "files": {file_name: {"sha256": digest, "size": size} for file_name, size, digest, _ in entries},
+        }, ensure_ascii=False, indent=2).encode("utf-8")
+        mtime = int(time.time())
+
+        def generate():
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 — формат gzip
+            written = 0
+
+            def emit(data):
+                nonlocal written
+                written += len(data)
+                return compressor.compress(data)
+
+            def header(file_name, size):
+                info = tarfile.TarInfo(f"{name}/{file_name}")
+                info.size, info.mtime, info.mode = size, mtime, 0o644
+                return info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8")
+
+            def padding(size):
+                return b"\0" * (-size % tarfile.BLOCKSIZE)
+
+            yield emit(header(ARCHIVE_MANIFEST, len(manifest)) + manifest + padding(len(manifest)))
+            for file_name, size, _, opener in entries:
+                yield emit(header(file_name, size))
+                sent = 0
+                with opener() as src:
+                    for chunk in iter(lambda: src.read(HASH_CHUNK), b""):
+                        sent += len(chunk)
+                        yield emit(chunk)
+                if sent != size:
+                    raise BackupIntegrityError(f"{name}/{file_name}: розмір змінився під час вивантаження")
+                yield emit(padding(size))
+            end = b"\0" * (tarfile.BLOCKSIZE * 2)
+            yield emit(end + b"\0" * (-(written + len(end)) % tarfile.RECORDSIZE))
+            yield compressor.flush()
+
+        return generate()
+
+    def import_archive(self, stream, allowed_files, max_file_bytes=512 * 1024 * 1024):
+        """Потоково імпортує tar.gz (формат stream_archive) як новий бекап і повертає його ім'я.
+
+        Приймаються лише звичайні файли з allowed_files і manifest.json; кожен файл стискається
+        у сховище на льоту, а бекап з'являється лише якщо склад, розміри і хеші збіглися з маніфестом.
+        """
+        manifest = None
+        stored = {}
+        try:
+            with tarfile.open(fileobj=stream, mode="r|gz") as archive:
+                for member in archive:
+                    file_name = member.name.rsplit("/", 1)[-1]
+                    if not member.isfile() or member.name.count("/") > 1:
+                        raise BackupIntegrityError(f"неприпустимий елемент архіву: {member.name}")
+                    if file_name == ARCHIVE_MANIFEST:
+                        if member.size > HASH_CHUNK:
+                            raise BackupIntegrityError("завеликий manifest.json")
+                        manifest = json.load(archive.extractfile(member))
+                    elif file_name in allowed_files and file_name not in stored:
+                        stored[file_name] = self._store_stream(archive.extractfile(member), max_file_bytes)
+                    else:
+                        raise BackupIntegrityError(f"неочікуваний файл в архіві: {member.name}")
+        except (tarfile.TarError, EOFError, zlib.error, OSError, ValueError) as e:
+            if isinstance(e, BackupIntegrityError):
+                raise
+            raise BackupIntegrityError(f"пошкоджений архів: {e}")
+
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+            raise BackupIntegrityError("в архіві немає manifest.json")
+        expected = {
+            file_name: (entry.get("sha256"), entry.get("size"))
+            for file_name, entry in manifest["files"].items() if isinstance(entry, dict)
+        }
+        if expected != stored:
+            raise BackupIntegrityError("файли архіву не відповідають його manifest.json")
+
+        entries = {file_name: {"sha256": digest, "size": size} for file_name, (digest, size) in stored.items()}
+        with file_lock(self.lock_path):
+            return self._write_manifest_locked(entries, status="imported", imported_from=str(manifest.get("name", "")))
+
+    def list_backups(self):
+        """Бекапи від найновішого з каталогу: [{name, created_at (datetime), size, stored, status}]."""
+        catalog = self._read_catalog()
+        if catalog is None:
+            with file_lock(self.lock_path):
+                catalog = self._catalog_locked()
+        return [
+            {
+                'name': backup["name"],
+                'created_at': datetime.fromisoformat(backup["created_at"]),
+                'size': backup["size"],
+                'stored': backup["stored"],
+                'status': backup["status"],
+            }
+            for backup in reversed(self._sorted_backups(catalog))
+        ]
+
+
+class BackupWorker:
+    """Фоновий потік бекапів з об'єднанням запитів і статусом задач.
+
+    Перший запит ставить задачу в чергу, і вона виконується через coalesce_seconds;
+    усі запити, що надійшли до її старту, приєднуються до неї (один бекап замість багатьох).
+    Запит, що прийшов під час виконання, створює наступну задачу — стан після нього теж
+    потрапить у бекап. run — функція, що виконує бекап і повертає його ім'я (або кидає виняток).
+    """
+
+    FINISHED = ('done', 'failed')
+
+    def __init__(self, run, coalesce_seconds=5.0, history_size=50):
+        self.run = run
+        self.coalesce_seconds = coalesce_seconds
+        self.history_size = history_size
+        self._cond = threading.Condition()
+        self._jobs = OrderedDict()  # id → статус задачі (останні history_size)
+        self._pending = None
+        self._due = None
+        self._running = None
+        self._stopping = False
+        self._thread = None
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, reason, delay=None):
+        """Ставить бекап у чергу (або приєднує до вже запланованого). Повертає id задачі.
+
+        delay=0 — виконати якнайшвидше (наприклад, ручний бекап чи бекап перед відновленням).
+        """
+        with self._cond:
+            if threading.current_thread() is self._thread and self._running is not None:
+                # Запит зсередини бекапу (хук збереження під час експорту задач):
+                # поточний бекап і так зніме цей стан
+                return self._running['id']
+            now = time.monotonic()
+            job = self._pending
+            if job is None:
+                job = {
+                    'id': uuid.uuid4().hex[:12],
+                    'state': 'queued',
+                    'reasons': [],
+                    'requests': 0,
+                    'submitted_at': datetime.now().isoformat(timespec='seconds'),
+                    'started_at': None,
+                    'finished_at': None,
+                    'backup': None,
+                    'error': None,
+                }
+                self._pending = job
+                self._due = now + (self.coalesce_seconds if delay is None else delay)
+                self._jobs[job['id']] = job
+                while len(self._jobs) > self.history_size:
+                    self._jobs.popitem(last=False)
+            elif delay is not None:
+                self._due = min(self._due, now + delay)
+            job['requests'] += 1
+            if reason not in job['reasons']:
+                job['reasons'].append(reason)
+            self._start_locked()
+            self._cond.notify_all()
+            return job['id']
+
+    def wait(self, job_id, timeout=None):
+        """Чекає завершення задачі; повертає її статус (None — задача невідома)."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._cond.wait_for(lambda: job['state'] in self.FINISHED, timeout)
+            return dict(job)
+
+    def status(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def jobs(self):
+        """Статуси останніх задач, від найновішої."""
+        with self._cond:
+            return [dict(job) for job in reversed(self._jobs.values())]
+
+    def _start_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, name="backup-worker", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None or (not self._stopping and time.monotonic() < self._due):
+                    if self._pending is None and self._stopping:
+                        return
+                    timeout = None if self._pending is None else max(0.0, self._due - time.monotonic())
+                    self._cond.wait(timeout)
+                job, self._pending = self._pending, None
+                job['state'] = 'running'
+                job['started_at'] = datetime.now().isoformat(timespec='seconds')
+                self._running = job
+
+            try:
+                backup, error = self.run(), None
+            except Exception as e:
+                backup, error = None, str(e)
+                print(f"Помилка фонового бекапу: {e}")
+
+            with self._cond:
+                job['state'] = 'failed' if error else 'done'
+                job['backup'] = backup
+                job['error'] = error
+                job['finished_at'] = datetime.now().isoformat(timespec='seconds')
+                self._running = None
+                if error:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                self._cond.notify_all()
+
+    def stop(self, timeout=30):
+        """Зупиняє потік, спершу виконавши вже запланований бекап (щоб не втратити останні зміни)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'coalesce_seconds': self.coalesce_seconds,
+                'queued': self._pending is not None,
+                'running': self._running is not None,
+                'completed': self.completed,
+                'failed': self.failed,
+                'last_job': dict(next(reversed(self._jobs.values()))) if self._jobs else None,
+            }
@@ -0,0 +1,73 @@
+"""Бенчмарк побудови каталогу товарів: старий цикл iterrows проти колонкового build_goods_catalog.
+
+Запуск: python benchmark_goods_catalog.py [кількість рядків ...]
+(за замовчуванням 1000 10000 100000). Дані синтетичні, Excel не читається — вимірюється
+лише побудова словника з DataFrame; результати обох реалізацій звіряються.
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from goods_catalog import build_goods_catalog
+
+
+def build_with_iterrows(df):
+    """Попередня реалізація з load_goods() (без print) — як еталон для порівняння."""
+    category_column, product_column = 'Категорія', 'Назва товару'
+    weight_column, pallet_coef_column = 'Вага (кг)', 'Коефіцієнт паллети'
+    df = df.dropna(subset=[product_column])
+    df[category_column] = df[category_column].fillna("Інше")
+    categorized_goods = {}
+    for _, row in df.iterrows():
+        category = str(row[category_column]).strip()
+        product = str(row[product_column]).strip()
+        weight = float(row[weight_column]) if weight_column and pd.notna(row[weight_column]) else 1.0
+        pallet_coef = float(row[pallet_coef_column]) if pallet_coef_column and pd.notna(row[pallet_coef_column]) else 1.0
+        if category not in categorized_goods:
+            categorized_goods[category] = []
+        categorized_goods[category].append({"name": product, "weight": weight, "pallet_coef": pallet_coef})
+    return categorized_goods
+
+
+def make_frame(rows, seed=42):
+    """Аркуш як у goods.xlsx: ~1% порожніх категорій і назв, ~5% порожніх ваг."""
+    rng = np.random.default_rng(seed)
+    categories = np.array([f"Категорія {i}" for i in range(max(1, rows // 250))], dtype=object)
+    df = pd.DataFrame({
+        'Категорія': categories[rng.integers(0, len(categories), rows)],
+        'Назва товару': [f" Товар {i} " for i in range(rows)],
+        'Вага (кг)': rng.uniform(0.1, 50, rows).round(3),
+        'Коефіцієнт паллети': rng.uniform(0.5, 2, rows).round(2),
+    })
+    df.loc[rng.random(rows) < 0.01, 'Категорія'] = None
+    df.loc[rng.random(rows) < 0.01, 'Назва товару'] = None
+    df.loc[rng.random(rows) < 0.05, 'Вага (кг)'] = None
+    return df
+
+
+def best_of(fn, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        frame = df.copy()
+        started = time.perf_counter()
+        result = fn(frame)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(sizes):
+    print(f"{'рядків':>8} {'iterrows, мс':>14} {'колонково, мс':>14} {'прискорення':>12}")
+    for rows in sizes:
+        df = make_frame(rows)
+        repeat = 3 if rows <= 10000 else 1
+        old_time, old_result = best_of(build_with_iterrows, df, repeat)
+        new_time, new_result = best_of(build_goods_catalog, df, repeat)
+        if old_result != new_result:
+            raise SystemExit(f"Результати не збігаються для {rows} рядків")
+        print(f"{rows:>8} {old_time * 1000:>14.1f} {new_time * 1000:>14.1f} {old_time / new_time:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,135 @@
+"""Брокер подій для Server-Sent Events (/api/stream).
+
+Кожна подія отримує послідовний id і лягає в кільцевий буфер, тож клієнт, що
+перепідключився з Last-Event-ID, отримує все пропущене. Кожен підписник має обмежену
+чергу: повільний клієнт не гальмує публікацію — при переповненні його відключаємо,
+а EventSource сам перепідключиться з останнім отриманим id і дочитає буфер.
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class Subscription:
+    """Підписка одного клієнта: черга нових подій + те, що треба дослати після перепідключення."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.backlog = []     # пропущені події з буфера (replay за Last-Event-ID)
+        self.reset = False    # Last-Event-ID чужий або вже витіснений з буфера
+        self.lagging = False  # черга переповнилась — стрім треба закрити
+
+
+class EventBroker:
+    """Публікує події всім підписникам процесу і пам'ятає останні buffer_size з них.
+
+    Епоха унікальна для процесу: id події з іншого воркера чи до перезапуску не
+    порівнюється з нашими номерами, а дає клієнту подію ``reset``.
+    """
+
+    def __init__(self, buffer_size=1000, subscriber_queue_size=256):
+        self._epoch = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._buffer = deque(maxlen=buffer_size)  # (id, seq, подія, JSON-рядок)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.subscriber_queue_size = subscriber_queue_size
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event, data):
+        """Надсилає подію всім підписникам; ніколи не блокується на повільних клієнтах."""
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._seq += 1
+            item = (f"{self._epoch}-{self._seq}", self._seq, event, payload)
+            self._buffer.append(item)
+            self.published += 1
+            for subscription in list(self._subscribers):
+                try:
+                    subscription.queue.put_nowait(item)
+                except queue.Full:
+                    subscription.lagging = True
+                    self._subscribers.discard(subscription)
+                    self.dropped += 1
+
+    def _replay_from(self, last_event_id):
+        """Події після last_event_id або None, якщо їх уже не відновити з буфера."""
+        epoch, _, number = last_event_id.rpartition("-")
+        if epoch != self._epoch or not number.isdigit():
+            return None
+        seq = int(number)
+        if seq > self._seq:
+            return None
+        oldest = self._buffer[0][1] if self._buffer else self._seq + 1
+        if seq + 1 < oldest:
+            return None  # частину подій вже витіснено з кільцевого буфера
+        return [item for item in self._buffer if item[1] > seq]
+
+    def subscribe(self, last_event_id=None):
+        """Реєструє підписника; реєстрація і вибірка пропущеного — атомарно відносно publish()."""
+        subscription = Subscription(self.subscriber_queue_size)
+        with self._lock:
+            if last_event_id:
+                backlog = self._replay_from(last_event_id)
+                if backlog is None:
+                    subscription.reset = True
+                else:
+                    subscription.backlog = backlog
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @staticmethod
+    def _format(item):
+        event_id, _, event, payload = item
+        return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+    def stream(self, subscription, keepalive=15.0, poll_interval=2.0, max_duration=300.0, on_idle=None):
+        """Генератор тексту SSE для однієї підписки.
+
+        Коментар-keepalive кожні ``keepalive`` секунд не дає проксі закрити з'єднання;
+        ``on_idle`` викликається щонайменше раз на ``poll_interval`` (наприклад, щоб помітити
+        зміни інших воркерів). Через ``max_duration`` стрім закривається, щоб не тримати потік
+        сервера вічно — клієнт перепідключиться з Last-Event-ID без втрати подій.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            if subscription.reset:
+                yield self._format((f"{self._epoch}-{self._seq}", self._seq, "reset", "{}"))
+            for item in subscription.backlog:
+                yield self._format(item)
+
+            deadline = time.monotonic() + max_duration
+            last_write = time.monotonic()
+            while time.monotonic() < deadline:
+                try:
+                    item = subscription.queue.get(timeout=poll_interval)
+                except queue.Empty:
+                    if subscription.lagging:
+                        break  # все, що встигло в чергу, віддано — далі лише через перепідключення
+                    if on_idle is not None:
+                        on_idle()
+                    if time.monotonic() - last_write >= keepalive:
+                        last_write = time.monotonic()
+                        yield ": keep-alive\n\n"
+                    continue
+                last_write = time.monotonic()
+                yield self._format(item)
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'buffered': len(self._buffer),
+                'published': self.published,
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,657 @@
+"""Кеш розібраного каталогу товарів і складів з goods.xlsx.
+
+Розбір Excel через openpyxl — найповільніша операція запиту, а файл змінюється рідко
+(лише через адмінку). Тому аркуш читається один раз у незмінний ``CatalogSnapshot``:
+дерево товарів, список складів, їхній готовий JSON і сам прочитаний аркуш (щоб збереження
+не перечитувало файл). Знімок зберігається на рівні процесу разом із сигнатурою файлу
+(inode, mtime, розмір) і віддається з пам'яті, поки сигнатура та сама. Перебудований знімок
+підміняється одним присвоєнням — запит, що вже взяв старий знімок, бачить узгоджені товари
+й склади. Зміна файлу іншим воркером чи вручну помічається за сигнатурою, а після власного
+збереження кеш скидається явно.
+
+Щоб і перший запит після старту не платив за розбір, розібрані дані зберігаються у
+бінарний файл-супутник (версіонований pickle) з позначкою джерела: SHA-256, mtime і розмір
+goods.xlsx. При старті та при зміні файлу спершу пробуємо супутник; якщо він застарів,
+Excel розбирається як завжди, а новий супутник записується у фоновому потоці.
+
+Редагування товарів з адмінки йде через ``GoodsRepository``: товари в пам'яті проіндексовані
+за (категорія, casefold назви), тож додавання, зміна й видалення — O(1), а goods.xlsx
+переписується у фоні (write-behind), один раз на серію правок. Через нього ж застосовується
+різниця потокового імпорту (див. goods_importer). Незаписані правки ведуться журналом: якщо
+файл тим часом переписав інший воркер, вони програються поверх його версії.
+
+Сам каталог будується з DataFrame по колонках (fillna, приведення до float, групування
+за категорією) — без Python-циклу по рядках, що важливо для каталогів на десятки тисяч SKU.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from task_store import file_lock
+
+CATEGORY_COLUMN = 'Категорія'
+PRODUCT_COLUMN = 'Назва товару'
+WEIGHT_COLUMN = 'Вага (кг)'
+PALLET_COEF_COLUMN = 'Коефіцієнт паллети'
+WAREHOUSE_COLUMN = 'Склади'
+DEFAULT_CATEGORY = "Інше"
+
+# Версія формату супутника: змінюється разом зі структурою даних, старий файл тоді ігнорується
+SIDECAR_FORMAT = 2
+
+
+def _numeric_column(df, column, default=1.0):
+    """Колонка як float; відсутні та нечислові значення — default."""
+    if column not in df.columns:
+        return np.full(len(df), default, dtype=float)
+    return pd.to_numeric(df[column], errors="coerce").fillna(default).to_numpy(dtype=float)
+
+
+def build_goods_catalog(df):
+    """{категорія: [{name, weight, pallet_coef}]} з DataFrame аркуша goods.xlsx.
+
+    Порядок категорій і товарів — як у файлі. Рядки без назви товару пропускаються,
+    порожня категорія стає "Інше", відсутні вага чи коефіцієнт — 1.0.
+    """
+    if CATEGORY_COLUMN not in df.columns or PRODUCT_COLUMN not in df.columns:
+        return {}
+    df = df[df[PRODUCT_COLUMN].notna()]
+    if df.empty:
+        return {}
+
+    categories = df[CATEGORY_COLUMN].fillna(DEFAULT_CATEGORY).astype(str).str.strip()
+    # Колонки готуються векторно; з рядків лише складаються вихідні словники
+    # (zip по .tolist() — у кілька разів швидше за DataFrame.to_dict("records"))
+    items = np.empty(len(df), dtype=object)
+    items[:] = [
+        {"name": name, "weight": weight, "pallet_coef": pallet_coef}
+        for name, weight, pallet_coef in zip(
+            df[PRODUCT_COLUMN].astype(str).str.strip().tolist(),
+            _numeric_column(df, WEIGHT_COLUMN).tolist(),
+            _numeric_column(df, PALLET_COEF_COLUMN).tolist(),
+        )
+    ]
+
+    # Групування: коди категорій у порядку першої появи, стабільне сортування зберігає
+    # порядок товарів усередині категорії, межі груп — з кількостей
+    codes, names = pd.factorize(categories, sort=False)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes, minlength=len(names)))[:-1]
+    return {
+        category: group.tolist()
+        for category, group in zip(names.tolist(), np.split(items[order], bounds))
+    }
+
+
+def build_warehouse_list(df):
+    """Непорожні значення колонки 'Склади' у порядку файлу."""
+    if WAREHOUSE_COLUMN not in df.columns:
+        return []
+    warehouses = df[WAREHOUSE_COLUMN].dropna()
+    return warehouses[warehouses.astype(str).str.strip() != ''].tolist()
+
+
+class CatalogSnapshot:
+    """Незмінний знімок goods.xlsx: товари, склади, їхній JSON і прочитаний аркуш.
+
+    Атрибути не перепризначаються; goods і frame спільні для всіх запитів, тож змінювати
+    їх на місці не можна (для редагування — копії, див. load_goods у app.py).
+    """
+
+    __slots__ = ('goods', 'warehouses', 'goods_json', 'warehouses_json', 'frame', 'signature')
+
+    def __init__(self, goods, warehouses, frame, signature, goods_json=None, warehouses_json=None):
+        values = {
+            'goods': goods,
+            'warehouses': tuple(warehouses),
+            'goods_json': goods_json if goods_json is not None else _encode(goods),
+            'warehouses_json': warehouses_json if warehouses_json is not None else _encode(list(warehouses)),
+            'frame': frame,
+            'signature': signature,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogSnapshot незмінний")
+
+    @classmethod
+    def from_frame(cls, df, signature):
+        """Знімок з одного прочитаного аркуша."""
+        return cls(build_goods_catalog(df), build_warehouse_list(df), df, signature)
+
+    @classmethod
+    def empty(cls, signature=None):
+        return cls({}, (), pd.DataFrame(), signature)
+
+    def to_state(self):
+        """Поля для супутника (pickle) — без класу, щоб формат не залежав від коду."""
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'signature'}
+
+
+def _encode(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def file_signature(path):
+    """(inode, mtime_ns, розмір) файлу або None, якщо його немає."""
+    try:
+        st = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _file_lock(path):
+    """Міжпроцесне блокування записів goods.xlsx (або нічого, якщо шлях не задано)."""
+    return file_lock(path) if path is not None else nullcontext()
+
+
+def write_excel_atomic(df, path):
+    """Пише DataFrame у .xlsx поруч із path, робить fsync і атомарно підміняє ним path.
+
+    Кеш каталогу й інші воркери ніколи не бачать наполовину записаний файл, а нова
+    сигнатура (інший inode) гарантовано помічається за file_signature.
+    """
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.stem}.", suffix=path.suffix, dir=str(path.parent))
+    os.close(fd)
+    try:
+        df.to_excel(tmp_name, index=False)
+        with open(tmp_name, "rb+") as f:
+            os.fsync(f.fileno())
+        try:
+            # mkstemp створює файл з правами 0600 — лишаємо права старого goods.xlsx
+            os.chmod(tmp_name, path.stat().st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CatalogCache:
+    """Знімок reader(path) → CatalogSnapshot, перебудовується лише при зміні файлу path.
+
+    Якщо задано sidecar_path, знімок зберігається ще й туди (див. опис модуля).
+    """
+
+    def __init__(self, path, reader, sidecar_path=None):
+        self.path = Path(path)
+        self.reader = reader
+        self.sidecar_path = Path(sidecar_path) if sidecar_path else None
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._sidecar_checked = None  # сигнатура, для якої супутник уже перевірено
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._refresh_again = False
+        self.hits = 0
+        self.misses = 0
+        self.sidecar_loads = 0
+        self.sidecar_writes = 0
+
+    def get(self):
+        """Поточний знімок каталогу."""
+        signature = file_signature(self.path)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.signature == signature:
+            self.hits += 1
+            return snapshot
+
+        # Розбір під блокуванням: одночасні запити після зміни файлу чекають один розбір
+        with self._lock:
+            signature = file_signature(self.path)
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.signature == signature:
+                self.hits += 1
+                return snapshot
+            if self._sidecar_checked != signature:
+                self._sidecar_checked = signature
+                snapshot = self._load_sidecar(signature)
+                if snapshot is not None:
+                    self._snapshot = snapshot
+                    self.hits += 1
+                    return snapshot
+            # Сигнатура знята до читання: якщо файл зміниться під час розбору,
+            # наступний запит побачить нову сигнатуру і розбере файл знову
+            snapshot = self.reader(self.path, signature)
+            self._snapshot = snapshot
+            self.misses += 1
+        # Супутник застарів (інакше ми б сюди не дійшли) — переписуємо його у фоні;
+        # розбір у самому фоновому потоці вже закінчиться записом супутника
+        if threading.current_thread() is not self._refresh_thread:
+            self.refresh_async()
+        return snapshot
+
+    def invalidate(self):
+        """Скидає кеш (після збереження файлу цим процесом) і перебудовує знімок у фоні."""
+        with self._lock:
+            self._snapshot = None
+            self._sidecar_checked = None
+        self.refresh_async()
+
+    # ------------------------------------------------------------------
+    # Файл-супутник
+    # ------------------------------------------------------------------
+    def _load_sidecar(self, signature):
+        """Знімок із супутника, якщо він зроблений з поточної версії файлу, інакше None."""
+        if self.sidecar_path is None or signature is None:
+            return None
+        try:
+            with self.sidecar_path.open("rb") as f:
+                stored = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Пошкоджений кеш каталогу {self.sidecar_path.name}, буде перебудовано: {e}")
+            return None
+        if not isinstance(stored, dict) or stored.get("format") != SIDECAR_FORMAT:
+            return None
+
+        source = stored["source"]
+        _, mtime_ns, size = signature
+        if (source["mtime_ns"], source["size"]) != (mtime_ns, size):
+            # Файл міг бути скопійований чи «торкнутий» без зміни вмісту — звіряємо хеш
+            if source["size"] != size or source["sha256"] != file_sha256(self.path):
+                return None
+        if file_signature(self.path) != signature:
+            return None
+
+        self.sidecar_loads += 1
+        return CatalogSnapshot(signature=signature, **stored["snapshot"])
+
+    def write_sidecar(self):
+        """Записує супутник для поточної версії файлу (атомарно)."""
+        if self.sidecar_path is None:
+            return False
+        signature = file_signature(self.path)
+        if signature is None:
+            return False
+        sha256 = file_sha256(self.path)
+        snapshot = self.get()
+        # Файл змінився під час розбору — цей знімок уже нікому не потрібен
+        if snapshot.signature != signature or file_signature(self.path) != signature:
+            return False
+
+        _, mtime_ns, size = signature
+        stored = {
+            "format": SIDECAR_FORMAT,
+            "source": {"sha256": sha256, "mtime_ns": mtime_ns, "size": size},
+            "snapshot": snapshot.to_state(),
+        }
+        self.sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{self.sidecar_path.name}.", dir=str(self.sidecar_path.parent))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, self.sidecar_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+        self.sidecar_writes += 1
+        return True
+
+    def refresh_async(self):
+        """Перебудовує знімок і супутник у фоновому потоці; повторні запити — ще один прохід."""
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                self._refresh_again = True
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, name="goods-catalog", daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                if self.sidecar_path is None:
+                    self.get()
+                else:
+                    self.write_sidecar()
+            except Exception as e:
+                print(f"Помилка оновлення кешу каталогу: {e}")
+            with self._refresh_lock:
+                if not self._refresh_again:
+                    self._refresh_thread = None
+                    return
+                self._refresh_again = False
+
+    def warm_up(self):
+        """При старті: знімок з дійсного супутника, інакше розбір і новий супутник у фоні."""
+        signature = file_signature(self.path)
+        with self._lock:
+            self._sidecar_checked = signature
+            snapshot = self._load_sidecar(signature)
+            if snapshot is not None:
+                self._snapshot = snapshot
+                return True
+        self.refresh_async()
+        return False
+
+    def stats(self):
+        total = self.hits + self.misses
+        snapshot = self._snapshot
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else None,
+            'categories': len(snapshot.goods) if snapshot is not None else None,
+            'warehouses': len(snapshot.warehouses) if snapshot is not None else None,
+            'sidecar_loads': self.sidecar_loads,
+            'sidecar_writes': self.sidecar_writes,
+        }
+
+
+class GoodsConflictError(ValueError):
+    """Товар з такою назвою вже існує в категорії."""
+
+
+class GoodsNotFoundError(LookupError):
+    """Товару з такою назвою в категорії немає."""
+
+
+class GoodsRepository:
+    """Товари для редагування: індекс (категорія, casefold назви) + відкладений запис у Excel.
+
+    Поки незаписаних змін немає, репозиторій іде за знімком cache (зміни файлу іншим воркером
+    чи імпортом підхоплюються за сигнатурою). Кожна зміна позначає стан «брудним», потрапляє
+    в журнал незаписаних операцій і планує writer(дерево товарів) через flush_delay секунд;
+    правки, що встигли до запису, потрапляють у той самий запис. Якщо під час запису надійшли
+    нові правки, планується ще один.
+
+    Якщо файл тим часом змінив інший воркер, індекс перебудовується з нового знімка і журнал
+    програється поверх нього (операція, що вже не має сенсу — товар видалено чи назва зайнята, —
+    пропускається). Перевірка й запис виконуються під файловим блокуванням lock_path, тож
+    відкладені записи кількох воркерів не перетирають один одного. Інші записи того самого
+    файлу (колонка складів) йдуть через ``write_file`` — під тим самим блокуванням.
+    """
+
+    def __init__(self, cache, writer, flush_delay=1.0, lock_path=None):
+        self.cache = cache
+        self.writer = writer
+        self.flush_delay = flush_delay
+        self.lock_path = lock_path
+        # категорія → {casefold назви: [товар, ...]} — у файлі можуть бути дублікати назв,
+        # вони зберігаються, а операції діють на перший (як і раніше)
+        self._index = {}
+        self._base = None        # сигнатура файлу, з якого (або в який) зібрано індекс
+        self._loaded = False
+        self._dirty = False
+        self._writing = False    # власний запис файлу ще триває — не перебудовуємось за ним
+        self._pending = []       # незаписані операції для програвання поверх чужих змін
+        self._version = 0
+        self._tree = None        # (версія, дерево, JSON)
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self.flushes = 0
+        self.flush_errors = 0
+        self.rebases = 0
+        self.dropped_ops = 0
+
+    @staticmethod
+    def _key(name):
+        return name.casefold()
+
+    def _sync_locked(self):
+        """Перебудовує індекс зі знімка, якщо файл змінився; незаписані операції програються знову."""
+        if self._writing:
+            return
+        # Дешева перевірка stat: після власного запису індекс уже відповідає файлу,
+        # і перечитувати великий goods.xlsx лише заради порівняння не треба
+        if self._loaded and file_signature(self.cache.path) == self._base:
+            return
+        snapshot = self.cache.get()
+        if self._loaded and snapshot.signature == self._base:
+            return
+        index = {}
+        for category, items in snapshot.goods.items():
+            bucket = index.setdefault(category, {})
+            for item in items:
+                bucket.setdefault(self._key(item["name"]), []).append(dict(item))
+        self._index = index
+        self._base = snapshot.signature
+        self._loaded = True
+        self._version += 1
+        if self._pending:
+            self.rebases += 1
+            for op in self._pending:
+                try:
+                    self._apply_locked(op)
+                except (GoodsConflictError, GoodsNotFoundError) as e:
+                    self.dropped_ops += 1
+                    print(f"Правку товару {op[0]} пропущено: файл змінено іншим процесом ({e})")
+
+    def _tree_locked(self):
+        if self._tree is None or self._tree[0] != self._version:
+            tree = {
+                category: [item for items in bucket.values() for item in items]
+                for category, bucket in self._index.items()
+            }
+            self._tree = (self._version, tree, _encode(tree))
+        return self._tree
+
+    def goods_json(self):
+        """(ETag, JSON дерева товарів) з урахуванням ще не записаних правок."""
+        with self._lock:
+            self._sync_locked()
+            version, _, body = self._tree_locked()
+            if not self._dirty and self._base is not None:
+                ino, mtime_ns, size = self._base
+                return f"goods-{ino:x}-{mtime_ns:x}-{size:x}", body
+            return f"goods-local-{id(self):x}-{version}", body
+
+    def add(self, category, name, weight, pallet_coef):
+        self._edit(("add", category, name, weight, pallet_coef))
+
+    def update(self, old_category, old_name, category, name, weight, pallet_coef):
+        self._edit(("update", old_category, old_name, category, name, weight, pallet_coef))
+
+    def delete(self, category, name):
+        self._edit(("delete", category, name))
+
+    def _edit(self, op):
+        with self._lock:
+            self._sync_locked()
+            self._apply_locked(op)
+            self._pending.append(op)
+            self._changed_locked()
+
+    def _apply_locked(self, op):
+        """Застосовує операцію журналу до індексу; кидає GoodsConflictError/GoodsNotFoundError."""
+        kind = op[0]
+        if kind == "add":
+            _, category, name, weight, pallet_coef = op
+            if self._key(name) in self._index.get(category, {}):
+                raise GoodsConflictError(name)
+            item = {"name": name, "weight": weight, "pallet_coef": pallet_coef}
+            self._index.setdefault(category, {})[self._key(name)] = [item]
+        elif kind == "update":
+            _, old_category, old_name, category, name, weight, pallet_coef = op
+            old_items = self._index.get(old_category, {}).get(self._key(old_name))
+            if not old_items:
+                raise GoodsNotFoundError(old_name)
+            same_key = (old_category, self._key(old_name)) == (category, self._key(name))
+            if not same_key and self._key(name) in self._index.get(category, {}):
+                raise GoodsConflictError(name)
+            item = {"name": name, "weight": weight, "pallet_coef": pallet_coef}
+            if same_key:
+                old_items[0] = item
+            else:
+                self._remove_locked(old_category, old_name)
+                self._index.setdefault(category, {})[self._key(name)] = [item]
+        elif kind == "delete":
+            _, category, name = op
+            if not self._index.get(category, {}).get(self._key(name)):
+                raise GoodsNotFoundError(name)
+            self._remove_locked(category, name)
+        else:  # "import": різниця імпорту; вже видалені іншим процесом товари пропускаються
+            _, added, updated, removed = op
+            for category, name in removed:
+                bucket = self._index.get(category, {})
+                if bucket.pop(self._key(name), None) is not None and not bucket:
+                    del self._index[category]
+            for category, name, weight, pallet_coef in list(updated) + list(added):
+                item = {"name": name, "weight": weight, "pallet_coef": pallet_coef}
+                self._index.setdefault(category, {})[self._key(name)] = [item]
+
+    def items(self):
+        """(версія, [(категорія, назва, вага, коефіцієнт, кількість записів з цим ключем)])."""
+        with self._lock:
+            self._sync_locked()
+            return self._version, [
+                (category, items[0]["name"], items[0]["weight"], items[0]["pallet_coef"], len(items))
+                for category, bucket in self._index.items()
+                for items in bucket.values()
+            ]
+
+    def apply_changes(self, version, added=(), updated=(), removed=()):
+        """Застосовує різницю імпорту одним записом.
+
+        version — з items(), за якими рахувалась різниця; якщо відтоді каталог змінився,
+        різниця вже неточна і кидається GoodsConflictError. Оновлений ключ зливає дублікати.
+        """
+        with self._lock:
+            self._sync_locked()
+            if version != self._version:
+                raise GoodsConflictError("каталог змінився під час імпорту")
+            if not (added or updated or removed):
+                return False
+            op = ("import", list(added), list(updated), list(removed))
+            self._apply_locked(op)
+            self._pending.append(op)
+            self._changed_locked()
+            return True
+
+    def _remove_locked(self, category, name):
+        bucket = self._index[category]
+        items = bucket[self._key(name)]
+        items.pop(0)
+        if not items:
+            del bucket[self._key(name)]
+        # Порожню категорію видаляємо
+        if not bucket:
+            del self._index[category]
+
+    def _changed_locked(self):
+        self._version += 1
+        self._dirty = True
+        self._schedule_locked()
+
+    def _schedule_locked(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Записує незаписані правки зараз. Повертає False, якщо запис не вдався."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return True
+            with _file_lock(self.lock_path):
+                return self._flush_locked()
+
+    def write_file(self, write):
+        """Виконує інший запис goods.xlsx (наприклад, складів) під блокуванням відкладених записів.
+
+        Спершу записуються незаписані правки товарів, тож write() бачить у файлі (і в
+        cache.get()) актуальні товари, а жоден воркер не запише файл між цим і write().
+        Повертає False, якщо правки товарів записати не вдалося; помилки write() прокидаються.
+        """
+        with self._flush_lock:
+            with _file_lock(self.lock_path):
+                with self._lock:
+                    dirty = self._dirty
+                if dirty and not self._flush_locked():
+                    return False
+                with self._lock:
+                    self._sync_locked()
+                    self._writing = True
+                try:
+                    result = write()
+                finally:
+                    with self._lock:
+                        self._writing = False
+                        # Товари у файлі ті самі, що в індексі (правки, що надійшли під час
+                        # write(), лишаються в журналі) — індекс не перебудовуємо
+                        self._base = file_signature(self.cache.path)
+                return result
+
+    def _flush_locked(self):
+        with self._lock:
+            # Під файловим блокуванням: якщо інший воркер встиг записати файл, спершу
+            # програємо свої правки поверх його версії, а не перетираємо її
+            self._sync_locked()
+            version = self._version
+            written = len(self._pending)
+            # Копія: writer працює без блокування, а правки тим часом тривають
+            tree = {category: [dict(item) for item in items] for category, items in self._tree_locked()[1].items()}
+            self._writing = True
+
+        ok = False
+        try:
+            ok = bool(self.writer(tree))
+        except Exception as e:
+            print(f"Помилка відкладеного запису товарів: {e}")
+
+        with self._lock:
+            self._writing = False
+            if ok:
+                self.flushes += 1
+                # Файл тепер відповідає дереву версії version — індекс не перебудовуємо
+                self._base = file_signature(self.cache.path)
+                del self._pending[:written]
+                if self._version == version:
+                    self._dirty = False
+                else:
+                    self._schedule_locked()
+            else:
+                self.flush_errors += 1
+                self._schedule_locked()  # повторна спроба через flush_delay
+        return ok
+
+    def stats(self):
+        with self._lock:
+            return {
+                'dirty': self._dirty,
+                'version': self._version,
+                'pending_ops': len(self._pending),
+                'categories': len(self._index),
+                'flushes': self.flushes,
+                'flush_errors': self.flush_errors,
+                'rebases': self.rebases,
+                'dropped_ops': self.dropped_ops,
+                'flush_delay': self.flush_delay,
+            }
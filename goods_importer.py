@@ -0,0 +1,248 @@
+"""Потоковий імпорт товарів з Excel (.xlsx) чи CSV.
+
+Завантажений аркуш не читається цілком: .xlsx розбирається openpyxl у режимі read-only
+(рядки по одному з XML, без моделі всієї книги), CSV — pandas частинами. Рядки
+збираються в пакети по ``CHUNK_ROWS`` і перевіряються векторно: порожні назви,
+некоректні вага й коефіцієнт паллети, дублікати (категорія, назва без урахування регістру)
+усередині файлу. Помилки повідомляються з номером рядка аркуша.
+
+Кожен пакет одразу порівнюється з поточним каталогом, і в пам'яті лишаються тільки зміни
+(нові й змінені товари) та ключі побачених товарів — не сам файл. Після розбору різниця
+застосовується через ``GoodsRepository``: незмінні товари не чіпаються, а goods.xlsx
+переписується у фоні, як і після правок з адмінки.
+"""
+import csv
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from goods_catalog import (
+    CATEGORY_COLUMN, DEFAULT_CATEGORY, PALLET_COEF_COLUMN, PRODUCT_COLUMN, WEIGHT_COLUMN,
+)
+
+IMPORT_COLUMNS = (CATEGORY_COLUMN, PRODUCT_COLUMN, WEIGHT_COLUMN, PALLET_COEF_COLUMN)
+IMPORT_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Рядків у пакеті: пам'ять на розбір обмежена пакетом, а не розміром файлу
+CHUNK_ROWS = 5000
+# Роздільник категорії й назви в ключі товару (NUL рядки pandas не зберігають)
+KEY_SEPARATOR = '\x1f'
+# Скільки помилок рядків повертати у звіті (загальна кількість рахується завжди)
+MAX_REPORTED_ERRORS = 100
+
+
+class GoodsImportError(ValueError):
+    """Файл не можна імпортувати взагалі (формат, заголовок, відсутні колонки)."""
+
+
+def _header_positions(header):
+    names = [str(value).strip() if value is not None else '' for value in header]
+    missing = [column for column in IMPORT_COLUMNS if column not in names]
+    if missing:
+        raise GoodsImportError(f'Відсутні колонки: {", ".join(missing)}')
+    return [names.index(column) for column in IMPORT_COLUMNS]
+
+
+def _xlsx_chunks(stream, chunk_rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise GoodsImportError('Файл порожній')
+        positions = _header_positions(header)
+        batch = []
+        first_row = 2  # рядок 1 — заголовок
+        for row in rows:
+            batch.append([row[i] if i < len(row) else None for i in positions])
+            if len(batch) >= chunk_rows:
+                yield first_row, pd.DataFrame(batch, columns=IMPORT_COLUMNS)
+                first_row += len(batch)
+                batch = []
+        if batch:
+            yield first_row, pd.DataFrame(batch, columns=IMPORT_COLUMNS)
+    finally:
+        workbook.close()
+
+
+def _csv_chunks(stream, chunk_rows):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    sample = text.readline()
+    text.seek(0)
+    # Експорт з Excel в українській локалі розділяє поля крапкою з комою
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+    except csv.Error:
+        delimiter = ','
+    reader = pd.read_csv(
+        text, sep=delimiter, dtype=object, chunksize=chunk_rows,
+        skipinitialspace=True, keep_default_na=False,
+        # Порожні рядки лишаємо (feed пропускає їх сам), інакше номери рядків зсуваються
+        skip_blank_lines=False,
+    )
+    first_row = 2
+    for chunk in reader:
+        chunk.columns = [str(column).strip() for column in chunk.columns]
+        if first_row == 2:
+            _header_positions(chunk.columns)
+        yield first_row, chunk[list(IMPORT_COLUMNS)].reset_index(drop=True)
+        first_row += len(chunk)
+
+
+def _xls_chunks(stream, chunk_rows):
+    # Старий двійковий формат не має потокового читача — читаємо цілком, як і раніше
+    df = pd.read_excel(stream, dtype=object)
+    df.columns = [str(column).strip() for column in df.columns]
+    _header_positions(df.columns)
+    df = df[list(IMPORT_COLUMNS)]
+    for start in range(0, len(df), chunk_rows):
+        yield start + 2, df.iloc[start:start + chunk_rows].reset_index(drop=True)
+
+
+def iter_import_chunks(stream, filename, chunk_rows=CHUNK_ROWS):
+    """(номер першого рядка аркуша, DataFrame пакета з колонками IMPORT_COLUMNS)."""
+    suffix = Path(filename).suffix.lower()
+    if suffix == '.xlsx':
+        return _xlsx_chunks(stream, chunk_rows)
+    if suffix == '.csv':
+        return _csv_chunks(stream, chunk_rows)
+    if suffix == '.xls':
+        return _xls_chunks(stream, chunk_rows)
+    raise GoodsImportError('Підтримуються тільки файли .xlsx, .xls та .csv')
+
+
+def _text(series):
+    return series.where(series.notna(), '').astype(str).str.strip()
+
+
+def _number(text):
+    # Десяткова кома ("1,5") — типова для українських таблиць
+    return pd.to_numeric(text.str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype=float)
+
+
+class GoodsImport:
+    """Накопичує різницю між імпортованим файлом і поточним каталогом.
+
+    current — список (категорія, назва, вага, коефіцієнт, кількість записів з таким ключем)
+    з ``GoodsRepository.items()``. replace=True: товари, яких немає у файлі, видаляються
+    (файл — повний каталог); інакше файл лише додає й оновлює товари.
+    """
+
+    def __init__(self, current, replace=True):
+        self.replace = replace
+        categories, names, weights, coefs, counts = (list(column) for column in zip(*current)) if current else ([],) * 5
+        self._categories = np.array(categories, dtype=object)
+        self._names = np.array(names, dtype=object)
+        self._weights = np.array(weights, dtype=float)
+        self._coefs = np.array(coefs, dtype=float)
+        self._counts = np.array(counts, dtype=np.int64)
+        # Індекс ключів будується один раз; пакети шукаються в ньому через get_indexer
+        self._keys = pd.Index(
+            [category + KEY_SEPARATOR + name.casefold() for category, name in zip(categories, names)], dtype=object
+        )
+        # Для відомих товарів — рядок файлу, де товар трапився (0 — ще не трапився);
+        # рядки тексту зберігаються лише для нових товарів
+        self._first_row = np.zeros(len(self._keys), dtype=np.int64)
+        self._new_rows = {}
+        self.added = []          # (категорія, назва, вага, коефіцієнт)
+        self.updated = []
+        self.rows = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+
+    def _report_errors(self, rows, messages):
+        self.error_count += len(rows)
+        room = max(MAX_REPORTED_ERRORS - len(self.errors), 0)
+        for row, message in zip(rows[:room].tolist(), messages[:room].tolist()):
+            self.errors.append({'row': row, 'error': message})
+
+    def feed(self, first_row, chunk):
+        """Перевіряє пакет рядків і додає його зміни до різниці."""
+        row_numbers = np.arange(first_row, first_row + len(chunk))
+        category = _text(chunk[CATEGORY_COLUMN])
+        name = _text(chunk[PRODUCT_COLUMN])
+        weight_text = _text(chunk[WEIGHT_COLUMN])
+        coef_text = _text(chunk[PALLET_COEF_COLUMN])
+
+        # Повністю порожні рядки (кінець аркуша, рядки лише зі складами) пропускаються мовчки
+        blank = ((category == '') & (name == '') & (weight_text == '') & (coef_text == '')).to_numpy()
+        # Порожні вага й коефіцієнт — 1.0, як при читанні каталогу (build_goods_catalog);
+        # помилкою є лише нечислове чи недопустиме значення
+        weight = np.where((weight_text == '').to_numpy(), 1.0, _number(weight_text))
+        coef = np.where((coef_text == '').to_numpy(), 1.0, _number(coef_text))
+        category = category.mask(category == '', DEFAULT_CATEGORY)
+        keys = (category + KEY_SEPARATOR + name.str.casefold()).to_numpy(dtype=object)
+
+        messages = np.full(len(chunk), '', dtype=object)
+        checks = (
+            ((name == '').to_numpy(), 'Порожня назва товару'),
+            (~np.isfinite(weight), 'Некоректна вага'),
+            (weight < 0, 'Вага не може бути від\'ємною'),
+            (~np.isfinite(coef) | (coef <= 0), 'Некоректний коефіцієнт паллети'),
+        )
+        for mask, message in checks:
+            messages[mask & ~blank & (messages == '')] = message
+
+        # Дублікати: у межах пакета (перший рядок групи) і з попередніми пакетами
+        valid = np.flatnonzero(~blank & (messages == ''))
+        valid_keys = keys[valid]
+        valid_rows = row_numbers[valid]
+        positions = self._keys.get_indexer(valid_keys)
+        known = positions >= 0
+        earlier = np.zeros(len(valid), dtype=np.int64)
+        earlier[known] = self._first_row[positions[known]]
+        new_rows = self._new_rows
+        earlier[~known] = [new_rows.get(key, 0) for key in valid_keys[~known].tolist()]
+        in_chunk = pd.Series(valid_rows).groupby(pd.Series(valid_keys)).transform('first').to_numpy()
+        first_rows = np.where(earlier > 0, earlier, in_chunk)
+        duplicate = first_rows != valid_rows
+        messages[valid[duplicate]] = [
+            f'Дублікат товару (вперше в рядку {row})' for row in first_rows[duplicate].tolist()
+        ]
+
+        failed = ~blank & (messages != '')
+        self._report_errors(row_numbers[failed], messages[failed])
+        self.rows += int((~blank).sum())
+
+        ok = valid[~duplicate]
+        positions = positions[~duplicate]
+        known = known[~duplicate]
+        self._first_row[positions[known]] = row_numbers[ok][known]
+        new_rows.update(zip(keys[ok][~known].tolist(), row_numbers[ok][~known].tolist()))
+
+        # Порівняння з каталогом за позиціями ключів — колонки порівнюються векторно
+        incoming = (category.to_numpy(dtype=object)[ok], name.to_numpy(dtype=object)[ok], weight[ok], coef[ok])
+        current = positions[known]
+        changed = np.zeros(len(ok), dtype=bool)
+        changed[known] = (
+            (incoming[1][known] != self._names[current])
+            | (incoming[2][known] != self._weights[current])
+            | (incoming[3][known] != self._coefs[current])
+            | (self._counts[current] > 1)  # дублікати з поточного файлу зливаються в один запис
+        )
+        self.added.extend(zip(*(column[~known].tolist() for column in incoming)))
+        self.updated.extend(zip(*(column[changed].tolist() for column in incoming)))
+        self.unchanged += int((known & ~changed).sum())
+
+    def removed(self):
+        """(категорія, назва) товарів каталогу, яких немає у файлі (лише для replace)."""
+        if not self.replace:
+            return []
+        missing = self._first_row == 0
+        return list(zip(self._categories[missing].tolist(), self._names[missing].tolist()))
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'added': len(self.added),
+            'updated': len(self.updated),
+            'unchanged': self.unchanged,
+            'removed': int((self._first_row == 0).sum()) if self.replace else 0,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
@@ -220,19 +220,29 @@ function logEvent(eventInfo, skipServerSave = false) {
   }
 }
 
+// Идентификатор вкладки: сервер не сохраняет его, а лишь возвращает в SSE-событии,
+// чтобы вкладка не добавила собственную запись в лог второй раз
+const logClientId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 // Функция для сохранения события на сервере
 function saveEventToServer(eventInfo) {
   // Отправляем данные на сервер
   fetch("/api/log_event", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify(eventInfo),
+    body: JSON.stringify({ ...eventInfo, clientId: logClientId }),
   })
     .then((response) => response.json())
     .then((data) => console.log("Лог сохранен на сервере:", data))
     .catch((err) => console.error("Ошибка сохранения лога:", err));
 }
 
+// Запись лога от другого пользователя/вкладки, пришедшая по SSE (/api/stream)
+function handleRemoteLogEvent(message) {
+  if (!message || message.origin === logClientId) return;
+  logEvent(message.entry, true); // уже сохранена на сервере
+}
+
 // Функция для переключения видимости лога
 function setupLogToggle() {
   const toggleButton = document.getElementById("changes-log-toggle");
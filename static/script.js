@@ -273,6 +273,46 @@
   // Helper function to show/hide order tooltip - MODIFIED FOR INTERACTIVE EDITING
   // -----------------------------------------------------------------------
 
+  // Останній стан кожного прямокутника, підтверджений сервером, — база для PATCH-дифів
+  const savedTaskState = new Map();
+
+  function isPlainObject(value) {
+    return value !== null && typeof value === "object" && !Array.isArray(value);
+  }
+
+  function containsNull(value) {
+    if (value === null) return true;
+    if (typeof value !== "object") return false;
+    return Object.values(value).some(containsNull);
+  }
+
+  // JSON Merge Patch (RFC 7396) від збереженого стану до поточного: лише змінені поля.
+  // Верхній рівень, як і PUT, не видаляє поля; вкладені об'єкти PUT замінює цілком,
+  // тому для них прибрані ключі передаємо як null. Повертає null, якщо зміну не можна
+  // виразити патчем (значення null означало б видалення) — тоді зберігаємо через PUT.
+  function buildMergePatch(prev, next, topLevel = true) {
+    const patch = {};
+    if (!topLevel) {
+      for (const key of Object.keys(prev)) {
+        if (next[key] === undefined) patch[key] = null;
+      }
+    }
+    for (const [key, value] of Object.entries(next)) {
+      // Поля з "_" — тимчасові для вкладки, сервер їх не зберігає
+      if (value === undefined || (topLevel && key.startsWith("_"))) continue;
+      const old = prev[key];
+      if (isPlainObject(value) && isPlainObject(old)) {
+        const nested = buildMergePatch(old, value, false);
+        if (nested === null) return null;
+        if (Object.keys(nested).length > 0) patch[key] = nested;
+      } else if (JSON.stringify(value) !== JSON.stringify(old)) {
+        if (containsNull(value)) return null;
+        patch[key] = value;
+      }
+    }
+    return patch;
+  }
+
   // Global function to save task order and update its tooltip
   function globalSaveTaskOrder(
     taskData,
@@ -298,12 +338,29 @@
       );
     }
 
+    // Якщо відомий стан на сервері — надсилаємо лише змінені поля (PATCH), інакше весь об'єкт
+    const sentState = JSON.stringify(taskData);
+    const savedState = savedTaskState.get(taskData.id);
+    const patch = savedState ? buildMergePatch(savedState, taskData) : null;
+    // Базу оновлюємо ще до відповіді: SSE-відлуння власного збереження може прийти раніше
+    savedTaskState.set(taskData.id, JSON.parse(sentState));
+    const saveRequest = patch
+      ? fetch(`/api/tasks/${encodeURIComponent(taskData.id)}`, {
+          method: "PATCH",
+          headers: { "Content-Type": "application/merge-patch+json" },
+          body: JSON.stringify(patch),
+        })
+      : fetch("/api/tasks", {
+          method: "PUT",
+          headers: { "Content-Type": "application/json" },
+          body: sentState,
+        });
+
     // MODIFIED: Added previousOrderSnapshot
-    fetch("/api/tasks", {
-      method: "PUT",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(taskData),
-    }).then(() => {
+    saveRequest.then((response) => {
+      if (!response.ok) {
+        savedTaskState.delete(taskData.id); // наступне збереження піде повним PUT
+      }
       if (baseDiv) {
         console.log(
           "globalSaveTaskOrder - после сохранения, данные задачи:",
@@ -2116,13 +2173,16 @@
     });
 
     // Сохраняем через API
+    const sentState = JSON.stringify(taskData);
+    savedTaskState.set(taskData.id, JSON.parse(sentState));
     fetch("/api/tasks", {
       method: "PUT",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(taskData),
+      body: sentState,
     })
       .then((response) => {
         if (!response.ok) {
+          savedTaskState.delete(taskData.id);
           throw new Error(`Ошибка сохранения: ${response.statusText}`);
         }
         console.log(
@@ -2395,12 +2455,17 @@
         }
 
         // Сохраняем изменения на сервере
+        const sentState = JSON.stringify(taskData);
+        savedTaskState.set(taskData.id, JSON.parse(sentState));
         fetch("/api/tasks", {
           method: "PUT",
           headers: { "Content-Type": "application/json" },
-          body: JSON.stringify(taskData),
+          body: sentState,
         })
-          .then(() => {
+          .then((response) => {
+            if (!response.ok) {
+              savedTaskState.delete(taskData.id);
+            }
             console.log(
               `Цвет статуса склада ${warehouse} обновлен на ${nextColor}`
             );
@@ -2783,6 +2848,7 @@
         // delete orderTooltips[taskData.id]; // If you have a global map
       }
 
+      savedTaskState.delete(taskData.id);
       fetch("/api/tasks", {
         method: "DELETE",
         headers: { "Content-Type": "application/json" },
@@ -2948,14 +3014,17 @@
         }
       }
 
+      const sentState = JSON.stringify(taskData);
+      savedTaskState.set(taskData.id, JSON.parse(sentState));
       return fetch("/api/tasks", {
         // MODIFIED: Return the fetch promise
         method: isUpdate ? "PUT" : "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(taskData),
+        body: sentState,
       })
         .then((response) => {
           if (!response.ok) {
+            savedTaskState.delete(taskData.id);
             throw new Error(
               `Failed to save task ${taskData.id}: ${response.statusText}`
             );
@@ -2992,24 +3061,131 @@
   }
 
   // -----------------------------------------------------------------------
-  // 3⃣  Завантажуємо tasks.json при старті
+  // 3⃣  Завантажуємо tasks.json при старті (лише прямокутники видимого вікна днів)
   // -----------------------------------------------------------------------
-  fetch("/api/tasks")
-    .then((r) => r.json())
-    .then((data) =>
-      Object.values(data).forEach((t) => {
-        const r = calendar.querySelectorAll(".row")[t.row];
-        const baseDiv = createTask(r, t.row, t); // cfg → відновити без POST
-
-        // Показываем вкладки складов сразу при загрузке, если они есть
-        if (
-          t.warehouseDistribution &&
-          Object.keys(t.warehouseDistribution).length > 0
-        ) {
-          showCompactWarehouseView(t, baseDiv);
+  const windowFrom = days[0].toISOString().slice(0, 10);
+  const windowTo = days[days.length - 1].toISOString().slice(0, 10);
+  let tasksRevision = null; // ревізія сховища, до якої синхронізована дошка
+
+  function renderLoadedTask(t) {
+    savedTaskState.set(t.id, JSON.parse(JSON.stringify(t))); // стан на сервері — база для PATCH
+    const r = calendar.querySelectorAll(".row")[t.row];
+    const baseDiv = createTask(r, t.row, t); // cfg → відновити без POST
+
+    // Показываем вкладки складов сразу при загрузке, если они есть
+    if (
+      t.warehouseDistribution &&
+      Object.keys(t.warehouseDistribution).length > 0
+    ) {
+      showCompactWarehouseView(t, baseDiv);
+    }
+  }
+
+  fetch(`/api/tasks?from=${windowFrom}&to=${windowTo}`)
+    .then((r) => {
+      tasksRevision = r.headers.get("X-Tasks-Revision");
+      return r.json();
+    })
+    .then((data) => {
+      Object.values(data).forEach(renderLoadedTask);
+      subscribeToLiveUpdates();
+    });
+
+  // -----------------------------------------------------------------------
+  // 3⃣.1  Живі оновлення (SSE): правки інших планувальників без перезавантаження
+  // -----------------------------------------------------------------------
+  function removeRenderedTask(id) {
+    const el = calendar.querySelector(`[data-id="${CSS.escape(String(id))}"]`);
+    if (el) el.remove();
+    const tooltip = document.getElementById(`order-tooltip-${id}`);
+    if (tooltip) tooltip.remove();
+  }
+
+  // Чи перетинає прямокутник видиме вікно днів (так само, як рахує сервер для ?from/&to)
+  function isInVisibleWindow(t) {
+    const start = new Date(t.start);
+    if (isNaN(start)) return false;
+    const span = Math.max(parseFloat(t.days) || 0, 1) + Math.max(parseFloat(t.delta) || 0, 0);
+    const end = new Date(start.getTime() + span * MS_PER_DAY);
+    return end > days[0] && start < new Date(days[days.length - 1].getTime() + MS_PER_DAY);
+  }
+
+  // Поле в тому вигляді, як його зберігає сервер (task_model.py): ваги й коефіцієнти лише
+  // для товарів, що є в stored, статуси без типового "white"
+  function sameStoredField(key, sent, stored) {
+    if (key === "itemWeights" || key === "itemPalletCoefs" || key === "orderStatusColors") {
+      const a = sent || {};
+      const b = stored || {};
+      const storedMatch = Object.keys(b).every(
+        (item) => JSON.stringify(a[item]) === JSON.stringify(b[item])
+      );
+      if (key !== "orderStatusColors") return storedMatch;
+      return storedMatch && Object.keys(a).every((item) => item in b || a[item] === "white");
+    }
+    return JSON.stringify(sent) === JSON.stringify(stored);
+  }
+
+  // Сервер зливає PUT/PATCH з тим, що вже зберігав, тож у нього можуть бути зайві поля,
+  // а тимчасові поля з "_" він відкидає — власною вважаємо зміну, де всі інші надіслані
+  // нами поля збігаються
+  function matchesSavedState(t) {
+    const known = savedTaskState.get(t.id);
+    if (!known) return false;
+    return Object.keys(known).every(
+      (key) => key.startsWith("_") || sameStoredField(key, known[key], t[key])
+    );
+  }
+
+  function applyRemoteTaskChanges(tasks, deleted) {
+    deleted.forEach((id) => {
+      savedTaskState.delete(id);
+      removeRenderedTask(id);
+    });
+    Object.values(tasks).forEach((t) => {
+      if (matchesSavedState(t)) return; // відлуння власного збереження
+      removeRenderedTask(t.id);
+      if (isInVisibleWindow(t)) {
+        renderLoadedTask(t);
+      } else {
+        savedTaskState.delete(t.id);
+      }
+    });
+  }
+
+  // Повна розсинхронізація (reset): дочитуємо зміни з моменту нашої ревізії
+  function resyncTasks() {
+    const url = tasksRevision
+      ? `/api/tasks?since=${encodeURIComponent(tasksRevision)}`
+      : "/api/tasks?since=";
+    fetch(url)
+      .then((r) => r.json())
+      .then((delta) => {
+        let deleted = delta.deleted;
+        if (delta.full) {
+          // Повний стан: прибираємо все, чого в ньому вже немає
+          deleted = [...savedTaskState.keys()].filter((id) => !(id in delta.tasks));
         }
+        applyRemoteTaskChanges(delta.tasks, deleted);
+        tasksRevision = delta.revision;
       })
-    );
+      .catch((err) => console.error("Помилка синхронізації задач:", err));
+  }
+
+  function subscribeToLiveUpdates() {
+    if (typeof EventSource === "undefined") return;
+    const source = new EventSource("/api/stream");
+    source.addEventListener("tasks", (e) => {
+      const data = JSON.parse(e.data);
+      applyRemoteTaskChanges(data.tasks, data.deleted);
+      tasksRevision = data.revision;
+    });
+    source.addEventListener("reset", resyncTasks);
+    source.addEventListener("log", (e) => {
+      if (typeof handleRemoteLogEvent === "function") {
+        handleRemoteLogEvent(JSON.parse(e.data));
+      }
+    });
+  }
 
   // -----------------------------------------------------------------------
   // 4⃣  Модальне вікно «Замовлення» (з категоріями товарів)
@@ -0,0 +1,174 @@
+"""Холодний архів прямокутників, що вийшли за вікно зберігання.
+
+Прострочені прямокутники не видаляються, а дописуються в помісячні сегменти
+``tasks-YYYY-MM.jsonl.gz`` (місяць — за датою початку). Кожне дописування — окремий
+gzip-член у кінці файлу, тож сегмент ніколи не переписується. Маніфест ``manifest.json``
+тримає для кожного сегмента кількість записів, діапазон [мін. початок, макс. кінець) і
+розмір підтвердженої частини файлу, тому запит за вікном дат відкриває лише сегменти, що
+його перетинають, а хвіст, обірваний збоєм посеред дописування, наступне дописування
+відрізає. Розпаковані місяці кешуються (LRU) до зміни файлу сегмента.
+"""
+import gzip
+import io
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+
+from task_model import COMPACT_JSON
+from task_store import file_lock, task_span_days, task_start_key, write_json_atomic
+
+
+class TaskArchive:
+    """Помісячні gzip-сегменти JSONL + маніфест; безпечно для кількох потоків і воркерів."""
+
+    def __init__(self, directory, cache_months=6):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.directory / "manifest.json"
+        self.lock_path = self.directory / "manifest.json.lock"
+        self.cache_months = cache_months
+        self._cache = OrderedDict()  # місяць → (сигнатура файлу, {id: задача})
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _month_of(task):
+        key = task_start_key(task)
+        if key is None:
+            return None
+        start = date.fromordinal(int(key))
+        return f"{start.year:04d}-{start.month:02d}"
+
+    def _segment_path(self, month):
+        return self.directory / f"tasks-{month}.jsonl.gz"
+
+    def _read_manifest(self):
+        try:
+            with self.manifest_path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "segments": {}}
+
+    def append(self, tasks):
+        """Дописує прямокутники (мапа id → задача) у сегменти їхніх місяців."""
+        by_month = {}
+        for task_id, task in tasks.items():
+            by_month.setdefault(self._month_of(task) or "undated", {})[task_id] = task
+
+        with file_lock(self.lock_path):
+            manifest = self._read_manifest()
+            for month, month_tasks in sorted(by_month.items()):
+                lines = "".join(
+                    json.dumps({"id": task_id, "task": task}, **COMPACT_JSON) + "\n"
+                    for task_id, task in month_tasks.items()
+                )
+                path = self._segment_path(month)
+                segment = manifest["segments"].setdefault(
+                    month, {"file": path.name, "entries": 0, "min_start": None, "max_end": None, "bytes": 0}
+                )
+                # Маніфест старішого формату не знає розміру — тоді хвіст не чіпаємо
+                committed = segment.get("bytes")
+                with path.open("ab") as raw:
+                    size = raw.tell()
+                    if committed is not None and size > committed:
+                        # Дописування, що не дійшло до маніфесту (збій): без обрізання обірваний
+                        # gzip-член зробив би нечитабельним усе, що дописується після нього.
+                        # Ці задачі не видалені зі сховища й потраплять в архів повторно
+                        raw.truncate(committed)
+                        print(f"Архів {path.name}: відкинуто незавершене дописування ({size - committed} байт)")
+                    with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                        gz.write(lines.encode("utf-8"))
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                    segment["bytes"] = raw.tell()
+
+                segment["entries"] += len(month_tasks)
+                for task in month_tasks.values():
+                    key = task_start_key(task)
+                    if key is None:
+                        continue
+                    end = key + task_span_days(task)
+                    if segment["min_start"] is None or key < segment["min_start"]:
+                        segment["min_start"] = key
+                    if segment["max_end"] is None or end > segment["max_end"]:
+                        segment["max_end"] = end
+            manifest["version"] += 1
+            # Маніфест оновлюємо після fsync сегментів: після збою він може лише відставати
+            write_json_atomic(self.manifest_path, manifest, indent=2)
+        return len(tasks)
+
+    def _load_month(self, month, committed=None):
+        """Прямокутники сегмента (пізніший запис того самого id перекриває попередній).
+
+        committed — розмір підтвердженої маніфестом частини файлу: незавершене дописування
+        за нею не читається (його задачі ще в робочому сховищі).
+        """
+        path = self._segment_path(month)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return {}
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size, committed)
+        with self._lock:
+            cached = self._cache.get(month)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(month)
+                self.hits += 1
+                return cached[1]
+
+        tasks = {}
+        try:
+            with path.open("rb") as raw:
+                data = raw.read() if committed is None else raw.read(committed)
+            with gzip.open(io.BytesIO(data), "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    tasks[entry["id"]] = entry["task"]
+        except (EOFError, OSError, zlib.error, ValueError) as e:
+            # Обірване дописування після збою: все прочитане до нього лишається валідним
+            print(f"Архів {path.name}: пропущено пошкоджений кінець сегмента ({e})")
+
+        with self._lock:
+            self.misses += 1
+            self._cache[month] = (signature, tasks)
+            self._cache.move_to_end(month)
+            while len(self._cache) > self.cache_months:
+                self._cache.popitem(last=False)
+        return tasks
+
+    def query_window(self, date_from=None, date_to=None):
+        """Архівні прямокутники, чий інтервал [start, start + span) перетинає дні [date_from, date_to]."""
+        window_start = float(date_from.toordinal()) if date_from else float("-inf")
+        window_end = float(date_to.toordinal() + 1) if date_to else float("inf")
+
+        result = {}
+        for month, segment in sorted(self._read_manifest()["segments"].items()):
+            if segment["min_start"] is None:
+                continue  # сегмент без дат не потрапляє в жодне вікно
+            if segment["min_start"] >= window_end or segment["max_end"] <= window_start:
+                continue
+            for task_id, task in self._load_month(month, segment.get("bytes")).items():
+                key = task_start_key(task)
+                if key is not None and key < window_end and key + task_span_days(task) > window_start:
+                    result[task_id] = task
+        return result
+
+    def version(self):
+        """Лічильник дописувань — змінюється щоразу, коли архів поповнюється (для ETag)."""
+        return self._read_manifest()["version"]
+
+    def stats(self):
+        manifest = self._read_manifest()
+        with self._lock:
+            return {
+                'segments': len(manifest["segments"]),
+                'entries': sum(segment["entries"] for segment in manifest["segments"].values()),
+                'cached_months': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,108 @@
+"""Схема прямокутника Ганта: оголошені поля, відкидання тимчасових полів і компактний JSON.
+
+Сховище тримає задачі звичайними словниками (у такому вигляді їх і віддає jsonify);
+``clean_task`` лише фільтрує й упорядковує поля одним проходом перед записом.
+
+Фронтенд тримає в об'єкті задачі службові поля з префіксом ``_`` (знімки для порівняння,
+лічильники) — вони потрібні лише поточній вкладці, тож на сервері не зберігаються.
+Крім того, фронтенд копіює в кожну задачу ваги й коефіцієнти паллет усього каталогу та
+статус "white" для кожного товару. Зберігаємо лише те, що він справді читає: ваги/коефіцієнти
+товарів із замовлення чи розподілу по складах і статуси, відмінні від типового "white".
+
+Назви товарів і складів повторюються ключами в багатьох полях кожної задачі, тож вони
+інтернуються: у пам'яті процесу кожна назва існує в одному екземплярі, а задачі тримають
+лише посилання на нього.
+"""
+import sys
+
+# Поля, які фронтенд записує в задачу (порядок — як у createTask у script.js)
+TASK_FIELDS = (
+    'id', 'row', 'start', 'days', 'delta', 'comment', 'title',
+    'order', 'initialOrder', 'previousOrder', 'orderChanges',
+    'orderColors', 'orderStatusColors',
+    'warehouseDistribution', 'warehouseStatusColors',
+    'itemWeights', 'itemPalletCoefs', 'totalWeight',
+)
+
+# Мапи «назва товару → значення»
+ITEM_KEYED_FIELDS = (
+    'order', 'initialOrder', 'previousOrder', 'orderChanges',
+    'orderColors', 'orderStatusColors', 'itemWeights', 'itemPalletCoefs',
+)
+# Мапи «назва складу → значення»; у warehouseDistribution значення — знову мапа товарів
+WAREHOUSE_KEYED_FIELDS = ('warehouseStatusColors', 'warehouseDistribution')
+
+# Параметри json.dump для збереження: без відступів і пробілів, кирилиця без \\u-екранування
+COMPACT_JSON = {'ensure_ascii': False, 'separators': (',', ':')}
+
+# Статус товару, який фронтенд підставляє, коли запису немає (див. orderStatusColors у script.js)
+DEFAULT_STATUS_COLOR = 'white'
+
+_FIELD_SET = frozenset(TASK_FIELDS)
+
+
+def _intern_keys(mapping):
+    return {sys.intern(key) if type(key) is str else key: value for key, value in mapping.items()}
+
+
+def is_transient(key):
+    """Тимчасове поле вкладки (``_tempOrderSnapshot``, ``_previousWarehousesCount`` …)."""
+    return isinstance(key, str) and key.startswith('_')
+
+
+def referenced_items(task):
+    """Назви товарів, що фігурують у замовленні, його історії або розподілі по складах."""
+    items = set()
+    for name in ('order', 'initialOrder', 'previousOrder', 'orderChanges'):
+        value = task.get(name)
+        if isinstance(value, dict):
+            items.update(value)
+    distribution = task.get('warehouseDistribution')
+    if isinstance(distribution, dict):
+        for per_warehouse in distribution.values():
+            if isinstance(per_warehouse, dict):
+                items.update(per_warehouse)
+    return items
+
+
+def clean_task(data):
+    """Нормалізує задачу для зберігання; не-об'єкти повертає без змін.
+
+    Повертає новий словник у сталому порядку полів (оголошені, потім невідомі легасі-поля)
+    без тимчасових полів, копій каталогу й типових статусів, з інтернованими назвами.
+    """
+    if not isinstance(data, dict):
+        return data
+    task = {name: data[name] for name in TASK_FIELDS if name in data}
+    for key, value in data.items():
+        if key not in _FIELD_SET and not is_transient(key):
+            task[key] = value
+
+    # Копії каталогу й типові статуси фронтенд відновить сам
+    items = referenced_items(task)
+    for name in ('itemWeights', 'itemPalletCoefs'):
+        value = task.get(name)
+        if isinstance(value, dict):
+            task[name] = {item: v for item, v in value.items() if item in items}
+    status_colors = task.get('orderStatusColors')
+    if isinstance(status_colors, dict):
+        task['orderStatusColors'] = {
+            item: color for item, color in status_colors.items() if color != DEFAULT_STATUS_COLOR
+        }
+
+    for name in ITEM_KEYED_FIELDS + WAREHOUSE_KEYED_FIELDS:
+        value = task.get(name)
+        if isinstance(value, dict):
+            task[name] = _intern_keys(value)
+    distribution = task.get('warehouseDistribution')
+    if isinstance(distribution, dict):
+        task['warehouseDistribution'] = {
+            warehouse: _intern_keys(items) if isinstance(items, dict) else items
+            for warehouse, items in distribution.items()
+        }
+    return task
+
+
+def clean_tasks(tasks):
+    """clean_task для всієї мапи id → задача."""
+    return {task_id: clean_task(task) for task_id, task in tasks.items()}
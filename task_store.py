@@ -0,0 +1,1186 @@
+# task_store.py — 🗂️ кеш прямокутників у пам'яті, щоб не парсити tasks.json на кожен запит
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from task_model import COMPACT_JSON, clean_task, clean_tasks
+
+try:
+    import fcntl  # POSIX: міжпроцесні блокування (кілька воркерів gunicorn)
+except ImportError:  # Windows — лишаються лише блокування в межах процесу
+    fcntl = None
+
+
+def write_json_atomic(path, data, **dump_kwargs):
+    """Пише JSON у тимчасовий файл поруч, робить fsync і атомарно підміняє ним path."""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            dump_kwargs.setdefault("ensure_ascii", False)
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+@contextmanager
+def file_lock(path, shared=False, blocking=True):
+    """Міжпроцесне блокування через fcntl.flock на окремому файлі path.
+
+    Повертає (через yield) True, якщо блокування отримано. Окремий дескриптор на кожен
+    виклик, тож блокування конфліктує і між потоками одного процесу — але не є реентерабельним.
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    path = Path(path)
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _file_stat(path):
+    """(inode, mtime_ns, size) файлу або None; inode ловить атомарну підміну через rename."""
+    try:
+        stat = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+# ---------------------------------------------------------------------------
+# 💾 Бекенди зберігання: TaskStore тримає дані в пам'яті, а бекенд відповідає
+#    лише за те, як зміни потрапляють на диск.
+# ---------------------------------------------------------------------------
+class BaseTaskBackend:
+    """Спільне для бекендів: міжпроцесне блокування записів через файл <path>.lock."""
+
+    name = 'base'
+    path = None
+
+    @property
+    def lock_path(self):
+        return self.path.with_name(self.path.name + ".lock")
+
+    def lock(self, shared=False):
+        """Блокування на час read-modify-write, щоб воркери не перетирали зміни один одного."""
+        return file_lock(self.lock_path, shared=shared)
+
+    def close(self):
+        pass
+
+
+class JsonTaskBackend(BaseTaskBackend):
+    """Класичний режим: весь словник прямокутників в одному tasks.json."""
+
+    name = 'json'
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def signature(self):
+        """Повертає (inode, mtime_ns, size) файлу або None, якщо файлу немає."""
+        return _file_stat(self.path)
+
+    def load(self):
+        if not self.path.exists():
+            return {}
+        with self.path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def commit(self, tasks, upserts, deletes):
+        """JSON не вміє писати частково — атомарно переписуємо весь файл."""
+        write_json_atomic(self.path, tasks, **COMPACT_JSON)
+
+    def export_snapshot(self, target):
+        """Копіює збережений на диску стан у target (формат tasks.json)."""
+        if self.path.exists():
+            shutil.copy2(self.path, target)
+
+    def import_snapshot(self, source):
+        """Замінює збережений стан вмістом файлу формату tasks.json."""
+        with Path(source).open("r", encoding="utf-8") as f:
+            tasks = clean_tasks(json.load(f))
+        with self.lock():
+            write_json_atomic(self.path, tasks, **COMPACT_JSON)
+
+
+class SqliteTaskBackend(BaseTaskBackend):
+    """SQLite у режимі WAL: один рядок на прямокутник, тож PUT торкається лише одного рядка."""
+
+    name = 'sqlite'
+
+    def __init__(self, path, json_path=None):
+        self.path = Path(path)
+        # Одне з'єднання на процес. Ним користуються і потоки запитів, і фоновий запис
+        # TaskStore (group/async) поза блокуванням сховища, тож кожне звернення до з'єднання
+        # бере власне блокування бекенду: читач не потрапить усередину чужої транзакції
+        # і не побачить пачку змін наполовину записаною
+        self._conn_lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id    TEXT PRIMARY KEY,
+                start TEXT,
+                row   INTEGER,
+                data  TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_start ON tasks(start);
+            CREATE INDEX IF NOT EXISTS idx_tasks_row ON tasks(row);
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        if json_path is not None:
+            with self.lock():  # кілька воркерів стартують одночасно — мігрує лише перший
+                self.migrate_from_json(json_path)
+
+    @staticmethod
+    def _row(task_id, task):
+        row = task.get("row")
+        return (
+            task_id,
+            task.get("start"),
+            row if isinstance(row, int) else None,
+            json.dumps(task, **COMPACT_JSON),
+        )
+
+    def signature(self):
+        """data_version змінюється лише коли в базу пише інше з'єднання (інший процес)."""
+        with self._conn_lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self):
+        with self._conn_lock:
+            return {task_id: json.loads(data) for task_id, data in self.conn.execute("SELECT id, data FROM tasks")}
+
+    def commit(self, tasks, upserts, deletes):
+        """Пише лише змінені рядки однією транзакцією."""
+        with self._transaction():
+            self._write_rows(upserts, deletes)
+
+    def _write_rows(self, upserts, deletes):
+        if deletes:
+            self.conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in deletes])
+        if upserts:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tasks (id, start, row, data) VALUES (?, ?, ?, ?)",
+                [self._row(task_id, task) for task_id, task in upserts.items()],
+            )
+
+    @contextmanager
+    def _transaction(self):
+        with self._conn_lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _replace_all(self, tasks):
+        with self._transaction():
+            self.conn.execute("DELETE FROM tasks")
+            self._write_rows(tasks, [])
+
+    def migrate_from_json(self, json_path, force=False):
+        """Одноразова міграція з tasks.json. Повертає кількість перенесених прямокутників."""
+        json_path = Path(json_path)
+        with self._conn_lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+        if (done and not force) or not json_path.exists():
+            return 0
+
+        with json_path.open("r", encoding="utf-8") as f:
+            tasks = clean_tasks(json.load(f))
+        with self._conn_lock:
+            self._replace_all(tasks)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)", (str(json_path),)
+            )
+        print(f"Перенесено {len(tasks)} прямокутників з {json_path} у {self.path}")
+        return len(tasks)
+
+    def export_snapshot(self, target):
+        with Path(target).open("w", encoding="utf-8") as f:
+            json.dump(self.load(), f, **COMPACT_JSON)
+
+    def close(self):
+        with self._conn_lock:
+            self.conn.close()
+
+    def import_snapshot(self, source):
+        with Path(source).open("r", encoding="utf-8") as f:
+            tasks = clean_tasks(json.load(f))
+        with self.lock():
+            self._replace_all(tasks)
+
+
+class JournalTaskBackend(BaseTaskBackend):
+    """Знімок tasks.json + журнал мутацій у JSONL: кожен запис дописує лише один рядок.
+
+    Коли журнал перевищує поріг за кількістю записів або розміром, фоновий
+    компактор згортає його в новий знімок tasks.json.
+    """
+
+    name = 'journal'
+
+    def __init__(self, path, journal_path=None, max_entries=500, max_bytes=1024 * 1024):
+        self.path = Path(path)
+        self.journal_path = Path(journal_path) if journal_path else self.path.with_suffix(".journal.jsonl")
+        # Журнал, який зараз згортається у знімок (читається при відновленні після збою)
+        self.compacting_path = self.journal_path.with_name(self.journal_path.name + ".compacting")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = self._count_entries(self.journal_path)
+        self._compactor = None
+        self._tail_broken = self._ends_without_newline(self.journal_path)
+        # Власні записи не повинні змушувати TaskStore перечитувати файли:
+        # поки стан файлів збігається з останнім нашим записом, сигнатура стабільна
+        self._own_stat = None
+        self.compactions = 0
+
+    @property
+    def compact_lock_path(self):
+        # Компакцію одночасно виконує лише один процес
+        return self.path.with_name(self.path.name + ".compact.lock")
+
+    def _files_stat(self):
+        return (_file_stat(self.path), _file_stat(self.compacting_path), _file_stat(self.journal_path))
+
+    @staticmethod
+    def _count_entries(path):
+        if not path.exists():
+            return 0
+        with path.open("rb") as f:
+            return sum(1 for _ in f)
+
+    def signature(self):
+        stat = self._files_stat()
+        return 'own' if stat == self._own_stat else stat
+
+    @staticmethod
+    def _replay(tasks, journal_path):
+        """Застосовує записи журналу до tasks і повертає їх кількість.
+
+        Обірваний останній рядок (збій під час запису) пропускаємо.
+        """
+        if not journal_path.exists():
+            return 0
+        line_no = 0
+        with journal_path.open("r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Пропущено пошкоджений запис журналу {journal_path}:{line_no}")
+                    continue
+                if entry.get("op") == "put":
+                    tasks[entry["id"]] = entry["task"]
+                elif entry.get("op") == "del":
+                    tasks.pop(entry["id"], None)
+        return line_no
+
+    @staticmethod
+    def _ends_without_newline(path):
+        """Чи обірвано останній рядок журналу (тоді наступний запис треба почати з нового рядка)."""
+        if not path.exists() or path.stat().st_size == 0:
+            return False
+        with path.open("rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def load(self):
+        with self._lock:
+            tasks = {}
+            if self.path.exists():
+                with self.path.open("r", encoding="utf-8") as f:
+                    tasks = json.load(f)
+            self._replay(tasks, self.compacting_path)
+            # Перераховуємо записи: у журнал могли дописувати інші процеси
+            self._entries = self._replay(tasks, self.journal_path)
+            self._tail_broken = self._ends_without_newline(self.journal_path)
+            return tasks
+
+    def commit(self, tasks, upserts, deletes):
+        """Дописує зміни в кінець журналу — O(розмір змін), а не O(всіх прямокутників).
+
+        Викликається під міжпроцесним блокуванням lock() (його бере TaskStore).
+        """
+        lines = [json.dumps({"op": "del", "id": task_id}, **COMPACT_JSON) for task_id in deletes]
+        lines += [
+            json.dumps({"op": "put", "id": task_id, "task": task}, **COMPACT_JSON)
+            for task_id, task in upserts.items()
+        ]
+        if not lines:
+            return
+
+        with self._lock:
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                if self._tail_broken:
+                    f.write("\n")
+                    self._tail_broken = False
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries += len(lines)
+            self._own_stat = self._files_stat()
+
+            if self._needs_compaction():
+                self._compactor = threading.Thread(target=self._compact, name="tasks-journal-compactor", daemon=True)
+                self._compactor.start()
+
+    def _needs_compaction(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return False
+        journal_stat = _file_stat(self.journal_path)
+        journal_size = journal_stat[2] if journal_stat else 0
+        return self._entries >= self.max_entries or journal_size >= self.max_bytes
+
+    def _rotate_journal(self):
+        """Відкладає поточний журнал у .compacting; нові записи підуть у свіжий журнал."""
+        if not self.journal_path.exists():
+            return
+        if self.compacting_path.exists():
+            # Попередня компакція обірвалась — дописуємо поточний журнал у кінець відкладеного
+            with self.compacting_path.open("ab") as dst, self.journal_path.open("rb") as src:
+                shutil.copyfileobj(src, dst)
+            self.journal_path.unlink()
+        else:
+            os.replace(self.journal_path, self.compacting_path)
+        self._entries = 0
+
+    def _compact(self):
+        """Фоновий потік: згортає журнал у новий знімок tasks.json."""
+        try:
+            with file_lock(self.compact_lock_path, blocking=False) as acquired:
+                if not acquired:
+                    return  # журнал вже згортає інший процес
+
+                # Коротка секція під блокуванням записів: фіксуємо стан і відкладаємо журнал
+                with self.lock():
+                    tasks = self.load()
+                    with self._lock:
+                        self._rotate_journal()
+                        self._own_stat = self._files_stat()
+
+                # Повільний запис знімка — без блокування, записи йдуть у свіжий журнал
+                write_json_atomic(self.path, tasks, **COMPACT_JSON)
+
+                with self.lock(), self._lock:
+                    self.compacting_path.unlink(missing_ok=True)
+                    self._own_stat = self._files_stat()
+                    self.compactions += 1
+            print(f"Журнал задач згорнуто у знімок {self.path} ({len(tasks)} прямокутників)")
+        except Exception as e:
+            print(f"Помилка компакції журналу задач: {e}")
+
+    def close(self):
+        """Чекає завершення фонової компакції, щоб не лишити напівзаписаний знімок."""
+        if self._compactor is not None and self._compactor.is_alive():
+            self._compactor.join()
+
+    def export_snapshot(self, target):
+        write_json_atomic(target, self.load(), **COMPACT_JSON)
+
+    def import_snapshot(self, source):
+        with Path(source).open("r", encoding="utf-8") as f:
+            tasks = clean_tasks(json.load(f))
+        # Той самий порядок блокувань, що й у компактора: спершу компакція, потім записи
+        with file_lock(self.compact_lock_path), self.lock(), self._lock:
+            write_json_atomic(self.path, tasks, **COMPACT_JSON)
+            self.journal_path.unlink(missing_ok=True)
+            self.compacting_path.unlink(missing_ok=True)
+            self._entries = 0
+
+
+def create_task_backend(kind, json_path, db_path, **options):
+    """Фабрика бекендів за значенням конфігурації TASKS_BACKEND (json | sqlite | journal)."""
+    kind = (kind or 'json').lower()
+    if kind == 'sqlite':
+        return SqliteTaskBackend(db_path, json_path=json_path)
+    if kind == 'journal':
+        return JournalTaskBackend(
+            json_path,
+            max_entries=options.get('journal_max_entries', 500),
+            max_bytes=options.get('journal_max_bytes', 1024 * 1024),
+        )
+    if kind == 'json':
+        return JsonTaskBackend(json_path)
+    raise ValueError(f"Невідомий бекенд зберігання задач: {kind}")
+
+
+def task_key(task_id):
+    """Ключ прямокутника в сховищі: id завжди рядок, як ключі tasks.json і колонка SQLite.
+
+    Фронтенд присвоює числовий id (Date.now()), а URL і JSON-файл дають рядок — без
+    нормалізації 123 і "123" були б різними записами до наступного перечитування.
+    """
+    return task_id if task_id is None or isinstance(task_id, str) else str(task_id)
+
+
+def task_start_key(task):
+    """Дата початку прямокутника як дробовий номер дня (ordinal + частка доби) або None.
+
+    Дата береться з перших 10 символів ISO-рядка ("2025-05-03T05:56:22.566Z") через
+    date.fromisoformat, а години й хвилини — зрізами рядка: повний datetime.fromisoformat
+    до Python 3.11 не розбирає суфікс "Z" і мілісекунди з фронтенду.
+    """
+    start = task.get("start") if isinstance(task, dict) else None
+    if not start or not isinstance(start, str):
+        return None
+    try:
+        key = float(date.fromisoformat(start[:10]).toordinal())
+    except ValueError:
+        return None
+    if len(start) >= 16 and start[10] == "T":
+        try:
+            key += int(start[11:13]) / 24 + int(start[14:16]) / 1440
+        except ValueError:
+            pass
+    return key
+
+
+def task_span_days(task):
+    """Скільки днів прямокутник займає на діаграмі (як у applyDeltaVisuals у script.js).
+
+    Базова тривалість — days (мінімум 1), подовження delta > 0 додається, а скорочення
+    delta < 0 все одно малюється індикатором, тож не зменшує видиму ширину.
+    """
+    try:
+        days = float(task.get("days") or 0)
+        delta = float(task.get("delta") or 0)
+    except (TypeError, ValueError):
+        return 1.0
+    base = days if days > 0 else 1.0
+    return base + max(delta, 0.0)
+
+
+def merge_patch(target, patch):
+    """JSON Merge Patch (RFC 7396): повертає новий об'єкт, target не змінюється.
+
+    null видаляє ключ, вкладені об'єкти зливаються рекурсивно, все інше (в т.ч. списки)
+    замінюється цілком.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+class TaskBatchError(ValueError):
+    """Пакет змін відхилено повністю; index — номер операції, що не пройшла."""
+
+    def __init__(self, index, message, not_found=False):
+        super().__init__(message)
+        self.index = index
+        self.not_found = not_found
+
+
+class TaskStore:
+    """Тримає прямокутники в пам'яті та перечитує бекенд лише коли дані змінились на диску.
+
+    Режими довговічності (durability):
+      * ``sync``  — кожна зміна записується бекенду до відповіді клієнту;
+      * ``group`` — запит чекає найближчого спільного запису (group commit): одна операція
+        запису на всі зміни, що накопичились за ``flush_interval_ms``;
+      * ``async`` — зміна підтверджується одразу, фоновий потік записує її не пізніше ніж
+        через ``flush_interval_ms`` (при аварійному падінні можна втратити цей проміжок).
+    """
+
+    DURABILITY_MODES = ('sync', 'group', 'async')
+
+    def __init__(self, backend, before_save=None, durability='sync', flush_interval_ms=200,
+                 max_tombstones=10000):
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError(f"Невідомий режим довговічності: {durability}")
+        self.backend = backend
+        self.before_save = before_save  # хук перед записом (наприклад, бекап)
+        self.durability = durability
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._lock = threading.RLock()
+        self._flushed = threading.Condition(self._lock)
+        # Серіалізує записи у бекенд з різних потоків; реентерабельний, бо хук бекапу
+        # всередині flush() сам викликає export_snapshot()
+        self._flush_lock = threading.RLock()
+        self._tasks = {}
+        # Індекс інтервалів: список (початок, seq, id, кінець), відсортований за початком,
+        # + зворотна мапа id → запис. Унікальний seq гарантує, що порівняння кортежів не дійде
+        # до id. Лічильник тривалостей дає точну максимальну тривалість, тож запит вікна
+        # переглядає лише записи з початком у [from - max_span, to).
+        self._by_start = []
+        self._start_entries = {}
+        self._index_seq = 0
+        self._spans = Counter()
+        self._max_span = 0.0
+        # Ревізії для дельта-синхронізації: кожна зміна отримує номер, журнал змін тримає
+        # id → ревізію останньої зміни в порядку зростання (id, якого вже немає в _tasks, —
+        # надгробок). Епоха унікальна для процесу: токен іншого воркера чи старого запуску
+        # не порівнюється з нашими номерами, а дає повну відповідь.
+        self._epoch = uuid.uuid4().hex[:12]
+        self._revision = 0
+        self._changes = {}
+        self._horizon = 0  # токени, старші за горизонт, вже не можна обслужити дельтою
+        self.max_tombstones = max_tombstones
+        self._listeners = []  # викликаються після кожної зміни (наприклад, SSE-трансляція)
+        self._signature = None  # сигнатура бекенду на момент останнього читання/запису
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+        # Стан відкладеного запису (write-behind)
+        self._pending_upserts = {}
+        self._pending_deletes = set()
+        self._flushing = False
+        self._dirty_gen = 0    # номер останньої зміни в пам'яті
+        self._flushed_gen = 0  # номер останньої зміни, що вже на диску
+        self._failed_gen = 0   # номер останньої зміни, яку не вдалося записати
+        self._flush_error = None
+        self._closed = False
+        self.flushes = 0
+        self._flusher = None
+        if durability != 'sync':
+            self._flusher = threading.Thread(target=self._flush_loop, name="tasks-flusher", daemon=True)
+            self._flusher.start()
+
+    # ------------------------------------------------------------------
+    # Внутрішні методи
+    # ------------------------------------------------------------------
+    def _set_task(self, task_id, task):
+        """Єдина точка запису в self._tasks — підтримує індекси в актуальному стані."""
+        self._unindex(task_id)
+        self._tasks[task_id] = task
+        self._stamp(task_id)
+        entry = self._index_entry(task_id, task)
+        if entry is not None:
+            insort(self._by_start, entry)
+            self._start_entries[task_id] = entry
+
+    def _pop_task(self, task_id):
+        """Видаляє прямокутник разом з його записами в індексах. Повертає його або None."""
+        self._unindex(task_id)
+        task = self._tasks.pop(task_id, None)
+        if task is not None:
+            self._stamp(task_id)
+        return task
+
+    def _bump_revision(self):
+        """Відкриває нову ревізію; всі зміни до наступного виклику отримують її номер."""
+        self._revision += 1
+
+    def _stamp(self, task_id):
+        """Переносить id в кінець журналу змін з поточною ревізією."""
+        self._changes.pop(task_id, None)
+        self._changes[task_id] = self._revision
+        # Журнал містить усі живі id + надгробки; обмежуємо кількість надгробків,
+        # зсуваючи горизонт за найстарішим викинутим записом
+        while len(self._changes) > len(self._tasks) + self.max_tombstones:
+            oldest = next(iter(self._changes))
+            self._horizon = self._changes.pop(oldest)
+
+    def _index_entry(self, task_id, task):
+        key = task_start_key(task)
+        if key is None:
+            return None
+        self._index_seq += 1
+        span = task_span_days(task)
+        self._spans[span] += 1
+        if span > self._max_span:
+            self._max_span = span
+        return (key, self._index_seq, task_id, key + span)
+
+    def _unindex(self, task_id):
+        entry = self._start_entries.pop(task_id, None)
+        if entry is None:
+            return
+        pos = bisect_left(self._by_start, entry)
+        if pos < len(self._by_start) and self._by_start[pos] == entry:
+            del self._by_start[pos]
+        span = entry[3] - entry[0]
+        self._spans[span] -= 1
+        if self._spans[span] <= 0:
+            del self._spans[span]
+            if span >= self._max_span:
+                self._max_span = max(self._spans, default=0.0)
+
+    def _changes_after(self, revision):
+        """(змінені прямокутники, id видалених) після revision — журнал переглядається з кінця."""
+        tasks, deleted = {}, []
+        for task_id in reversed(self._changes):
+            if self._changes[task_id] <= revision:
+                break
+            if task_id in self._tasks:
+                tasks[task_id] = self._tasks[task_id]
+            else:
+                deleted.append(task_id)
+        return tasks, deleted
+
+    def _notify(self, since):
+        """Повідомляє слухачів про зміни після ревізії since (під self._lock — порядок ревізій зберігається)."""
+        if not self._listeners:
+            return
+        tasks, deleted = self._changes_after(since)
+        if not tasks and not deleted:
+            return
+        revision = f"{self._epoch}-{self._revision}"
+        for listener in self._listeners:
+            try:
+                listener(revision, tasks, deleted)
+            except Exception as e:
+                print(f"Помилка слухача змін задач: {e}")
+
+    def _reset_tasks(self, tasks):
+        """Повністю замінює вміст і перебудовує індекси (після читання з диску)."""
+        old, self._tasks = self._tasks, dict(tasks)
+        # Зміни, що прийшли з диску (інший воркер, відновлення бекапу), теж отримують ревізію
+        self._bump_revision()
+        for task_id, task in self._tasks.items():
+            previous = old.get(task_id)
+            if previous is not task and previous != task:
+                self._stamp(task_id)
+        for task_id in old:
+            if task_id not in self._tasks:
+                self._stamp(task_id)
+        self._start_entries = {}
+        self._spans = Counter()
+        self._max_span = 0.0
+        for task_id, task in self._tasks.items():
+            entry = self._index_entry(task_id, task)
+            if entry is not None:
+                self._start_entries[task_id] = entry
+        self._by_start = sorted(self._start_entries.values())
+
+    def _has_pending(self):
+        return bool(self._pending_upserts or self._pending_deletes or self._flushing)
+
+    def _ensure_fresh(self):
+        """Перечитує бекенд, якщо дані змінились (наприклад, після відновлення бекапу)."""
+        if self._loaded and self._has_pending():
+            # Незаписані зміни в пам'яті новіші за диск — перечитувати не можна
+            self.hits += 1
+            return
+
+        signature = self.backend.signature()
+        if self._loaded and signature == self._signature:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        since = self._revision
+        self._reset_tasks(clean_tasks(self.backend.load()))
+        self._signature = signature
+        self._loaded = True
+        self._notify(since)
+
+    @contextmanager
+    def _mutation(self):
+        """Секція read-modify-write.
+
+        У sync-режимі тримаємо міжпроцесне блокування бекенду від перевірки свіжості до запису,
+        тож зміна іншого воркера не загубиться. У group/async зміни лише стають у чергу, а
+        блокування бере flush(). Порядок завжди: спершу файл, потім self._lock.
+        """
+        if self.durability == 'sync':
+            with self.backend.lock(), self._lock:
+                self._ensure_fresh()
+                since = self._revision
+                self._bump_revision()
+                yield
+                self._notify(since)
+        else:
+            with self._lock:
+                self._ensure_fresh()
+                since = self._revision
+                self._bump_revision()
+                yield
+                self._notify(since)
+
+    def _persist(self, upserts=None, deletes=None):
+        """Передає зміни бекенду (одразу або через фоновий запис залежно від durability)."""
+        upserts = upserts or {}
+        deletes = deletes or []
+
+        if self.durability == 'sync':
+            if self.before_save:
+                self.before_save(self._tasks)
+            try:
+                self.backend.commit(self._tasks, upserts, deletes)
+            except Exception:
+                # Пам'ять вже змінена, а диск — ні: наступне звернення перечитає бекенд
+                self._loaded = False
+                raise
+            self._signature = self.backend.signature()
+            return
+
+        self._queue_changes(upserts, deletes)
+        self._dirty_gen += 1
+        self._flushed.notify_all()  # будимо фоновий потік
+
+        if self.durability == 'group':
+            gen = self._dirty_gen
+            while self._flushed_gen < gen and self._failed_gen < gen and not self._closed:
+                self._flushed.wait()
+            if self._flushed_gen < gen and self._failed_gen >= gen:
+                # Запис пачки з нашою зміною не вдався: відповідаємо помилкою, як у sync.
+                # Зміна лишається в черзі й буде записана при наступній успішній спробі
+                raise self._flush_error
+
+    def _queue_changes(self, upserts, deletes):
+        """Додає зміни до черги; пізніша зміна того самого id перекриває попередню."""
+        for task_id, task in upserts.items():
+            self._pending_deletes.discard(task_id)
+            self._pending_upserts[task_id] = task
+        for task_id in deletes:
+            self._pending_upserts.pop(task_id, None)
+            self._pending_deletes.add(task_id)
+
+    def _flush_loop(self):
+        """Фоновий потік: чекає змін, витримує інтервал (щоб зібрати пачку) і записує їх разом."""
+        while True:
+            with self._lock:
+                while not (self._pending_upserts or self._pending_deletes) and not self._closed:
+                    self._flushed.wait()
+                if self._closed:
+                    return
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Записує всі накопичені зміни однією операцією бекенду. Повертає кількість змін."""
+        if self.durability == 'sync':
+            return 0  # у sync-режимі черги немає (і не беремо _flush_lock під self._lock)
+        with self._flush_lock:
+            with self._lock:
+                if not (self._pending_upserts or self._pending_deletes):
+                    return 0  # в т.ч. реентерабельний виклик з хука бекапу
+
+            with self.backend.lock():
+                with self._lock:
+                    upserts, deletes = self._pending_upserts, list(self._pending_deletes)
+                    self._pending_upserts, self._pending_deletes = {}, set()
+                    gen = self._dirty_gen
+                    if self.backend.signature() != self._signature:
+                        # Інший воркер записав свої зміни — накладаємо наші поверх свіжого стану
+                        fresh = clean_tasks(self.backend.load())
+                        for task_id in deletes:
+                            fresh.pop(task_id, None)
+                        fresh.update(upserts)
+                        since = self._revision
+                        self._reset_tasks(fresh)
+                        self.misses += 1
+                        self._notify(since)
+                    tasks = dict(self._tasks)
+                    self._flushing = True
+
+                try:
+                    if self.before_save:
+                        self.before_save(tasks)
+                    self.backend.commit(tasks, upserts, deletes)
+                except Exception as e:
+                    print(f"Помилка фонового запису задач: {e}")
+                    with self._lock:
+                        # Повертаємо невдалу пачку в чергу, не перекриваючи новіші зміни
+                        for task_id, task in upserts.items():
+                            if task_id not in self._pending_upserts and task_id not in self._pending_deletes:
+                                self._pending_upserts[task_id] = task
+                        for task_id in deletes:
+                            if task_id not in self._pending_upserts:
+                                self._pending_deletes.add(task_id)
+                        self._flushing = False
+                        self._flush_error = e
+                        self._failed_gen = max(self._failed_gen, gen)
+                        self._flushed.notify_all()
+                    return 0
+
+                with self._lock:
+                    self._signature = self.backend.signature()
+                    self._flushing = False
+                    self._flush_error = None
+                    self._flushed_gen = max(self._flushed_gen, gen)
+                    self.flushes += 1
+                    self._flushed.notify_all()
+                return len(upserts) + len(deletes)
+
+    def close(self):
+        """Зупиняє фоновий потік і примусово записує все, що ще не на диску (при завершенні)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._flushed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
+
+    # ------------------------------------------------------------------
+    # Публічний API
+    # ------------------------------------------------------------------
+    def all(self):
+        """Повертає поверхневу копію всіх прямокутників (безпечно для jsonify)."""
+        with self._lock:
+            self._ensure_fresh()
+            return dict(self._tasks)
+
+    def get(self, task_id):
+        """Повертає прямокутник за id або None."""
+        task_id = task_key(task_id)
+        with self._lock:
+            self._ensure_fresh()
+            return self._tasks.get(task_id)
+
+    def add_listener(self, listener):
+        """Підписує listener(revision, tasks, deleted) на всі зміни, в т.ч. прочитані з диску."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def revision(self):
+        """Поточний токен ревізії (``<епоха>-<номер>``) для подальшого changes_since()."""
+        with self._lock:
+            self._ensure_fresh()
+            return f"{self._epoch}-{self._revision}"
+
+    def _parse_revision(self, token):
+        """Номер ревізії з токена або None, якщо токен не можна обслужити дельтою."""
+        epoch, _, number = (token or "").rpartition("-")
+        if epoch != self._epoch or not number.isdigit():
+            return None
+        number = int(number)
+        if number < self._horizon or number > self._revision:
+            return None
+        return number
+
+    def changes_since(self, token):
+        """Зміни після ревізії token: ``{revision, full, tasks, deleted}``.
+
+        Якщо токен чужий (інший воркер чи перезапуск), зламаний або старший за горизонт
+        надгробків, повертаємо повний стан з ``full=True`` — клієнт має замінити все.
+        Вартість дельти — O(кількість змін), журнал переглядається з кінця.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            current = f"{self._epoch}-{self._revision}"
+            since = self._parse_revision(token)
+            if since is None:
+                return {'revision': current, 'full': True, 'tasks': dict(self._tasks), 'deleted': []}
+
+            tasks, deleted = self._changes_after(since)
+            return {'revision': current, 'full': False, 'tasks': tasks, 'deleted': deleted}
+
+    def query_window(self, date_from=None, date_to=None):
+        """Прямокутники, чий інтервал [start, start + span) перетинає дні [date_from, date_to].
+
+        Межі включні й необов'язкові. Прямокутники без коректної дати початку не потрапляють
+        у жодне вікно. Вартість — O(log n + кількість записів у вікні).
+        """
+        with self._lock:
+            self._ensure_fresh()
+            window_start = float(date_from.toordinal()) if date_from else float("-inf")
+            window_end = float(date_to.toordinal() + 1) if date_to else float("inf")
+
+            lo = 0 if date_from is None else bisect_left(self._by_start, (window_start - self._max_span,))
+            hi = len(self._by_start) if date_to is None else bisect_left(self._by_start, (window_end,))
+            return {
+                entry[2]: self._tasks[entry[2]]
+                for entry in self._by_start[lo:hi]
+                if entry[3] > window_start
+            }
+
+    def put(self, task_id, task):
+        """Створює або повністю замінює прямокутник."""
+        task_id = task_key(task_id)
+        task = clean_task(task)
+        with self._mutation():
+            self._set_task(task_id, task)
+            self._persist(upserts={task_id: task})
+
+    def update(self, task_id, fields):
+        """Оновлює поля існуючого прямокутника. Повертає False, якщо його немає."""
+        task_id = task_key(task_id)
+        with self._mutation():
+            if task_id not in self._tasks:
+                return False
+            # Копіюємо замість update() на місці, щоб знімки з all() не змінювались під час jsonify
+            task = clean_task({**self._tasks[task_id], **fields})
+            self._set_task(task_id, task)
+            self._persist(upserts={task_id: task})
+            return True
+
+    def patch(self, task_id, patch):
+        """Застосовує JSON Merge Patch до прямокутника. Повертає новий стан або None, якщо його немає."""
+        task_id = task_key(task_id)
+        with self._mutation():
+            current = self._tasks.get(task_id)
+            if current is None:
+                return None
+            task = clean_task(merge_patch(current, patch))
+            if task != current:  # порожній чи нічого не змінюючий патч не пишемо
+                self._set_task(task_id, task)
+                self._persist(upserts={task_id: task})
+            return task
+
+    BATCH_OPS = ('create', 'update', 'patch', 'delete')
+
+    def apply_batch(self, ops):
+        """Застосовує впорядкований список операцій за принципом «все або нічого».
+
+        Операції: ``{"op": "create"|"update", "task": {...}}`` (як тіла POST/PUT),
+        ``{"op": "patch", "id": ..., "patch": {...}}`` (JSON Merge Patch) та
+        ``{"op": "delete", "id": ...}``. Спершу всі операції проганяються на чернетці поверх
+        поточного стану; якщо будь-яка невалідна — TaskBatchError і жодних змін. Інакше зміни
+        застосовуються і записуються бекенду одним commit. Повертає результат для кожної операції.
+        """
+        with self._mutation():
+            staged = {}  # id → новий стан або None (видалено) — чернетка поверх self._tasks
+            results = []
+            for index, op in enumerate(ops):
+                if not isinstance(op, dict) or op.get('op') not in self.BATCH_OPS:
+                    raise TaskBatchError(index, f"Невідома операція, очікується одна з {self.BATCH_OPS}")
+                kind = op['op']
+                if kind in ('create', 'update'):
+                    task = op.get('task')
+                    if not isinstance(task, dict) or task.get('id') is None:
+                        raise TaskBatchError(index, "Операція потребує об'єкт task з полем id")
+                    task_id = task['id']
+                else:
+                    task_id = op.get('id')
+                    if task_id is None:
+                        raise TaskBatchError(index, "Операція потребує поле id")
+
+                if not isinstance(task_id, (str, int)):
+                    raise TaskBatchError(index, "id має бути рядком або числом")
+                task_id = task_key(task_id)
+                current = staged[task_id] if task_id in staged else self._tasks.get(task_id)
+                if kind == 'create':
+                    staged[task_id] = clean_task(task)
+                    status = 'created'
+                elif current is None:
+                    if kind == 'delete':
+                        results.append({'id': task_id, 'status': 'missing'})
+                        continue
+                    raise TaskBatchError(index, f"Прямокутник {task_id} не знайдено", not_found=True)
+                elif kind == 'update':
+                    staged[task_id] = clean_task({**current, **task})
+                    status = 'updated'
+                elif kind == 'patch':
+                    if not isinstance(op.get('patch'), dict):
+                        raise TaskBatchError(index, "Операція patch потребує об'єкт patch")
+                    staged[task_id] = clean_task(merge_patch(current, op['patch']))
+                    status = 'patched'
+                else:
+                    staged[task_id] = None
+                    status = 'deleted'
+                results.append({'id': task_id, 'status': status})
+
+            upserts, deletes = {}, []
+            for task_id, task in staged.items():
+                if task is None:
+                    if self._pop_task(task_id) is not None:
+                        deletes.append(task_id)
+                elif self._tasks.get(task_id) != task:
+                    self._set_task(task_id, task)
+                    upserts[task_id] = task
+            if upserts or deletes:
+                self._persist(upserts=upserts, deletes=deletes)
+            return results
+
+    def delete(self, task_id):
+        """Видаляє прямокутник (якщо його немає — нічого не робить)."""
+        self.delete_many([task_id])
+
+    def delete_many(self, task_ids):
+        """Видаляє кілька прямокутників одним записом. Повертає список реально видалених id."""
+        task_ids = [task_key(task_id) for task_id in task_ids]
+        with self._mutation():
+            removed = [task_id for task_id in task_ids if self._pop_task(task_id) is not None]
+            if removed:
+                self._persist(deletes=removed)
+            return removed
+
+    def replace_all(self, tasks):
+        """Повністю замінює вміст сховища (сумісність зі старим save_tasks)."""
+        tasks = {task_key(task_id): task for task_id, task in tasks.items()}
+        with self._mutation():
+            deletes = [task_id for task_id in self._tasks if task_id not in tasks]
+            self._reset_tasks(clean_tasks(tasks))
+            self._persist(upserts=self._tasks, deletes=deletes)
+
+    def expire_before(self, cutoff_date, on_expire=None):
+        """Видаляє прямокутники, що закінчуються раніше cutoff_date. Повертає список їх id.
+
+        Кінець — start плюс видима тривалість (task_span_days): довгий прямокутник, що ще
+        заходить у вікно зберігання, лишається на дошці, як і той, що закінчується рівно на
+        порозі. Завдяки індексу за датою початку переглядаємо лише записи, що почались до
+        порога, а не весь словник. on_expire(tasks) викликається з простроченими
+        прямокутниками до видалення (наприклад, щоб перенести їх в архів); якщо він падає,
+        нічого не видаляється.
+        """
+        cutoff_key = float(cutoff_date.toordinal())
+        with self._mutation():
+            # Записи, що почались не раніше порога, точно лишаються — дивимось лише ліворуч
+            end = bisect_left(self._by_start, (cutoff_key,))
+            expired_ids = [entry[2] for entry in self._by_start[:end] if entry[3] < cutoff_key]
+            if not expired_ids:
+                return []
+            if on_expire is not None:
+                on_expire({task_id: self._tasks[task_id] for task_id in expired_ids})
+            # Одним зрізом, а не по одному видаленню зі списку
+            self._by_start[:end] = [entry for entry in self._by_start[:end] if entry[3] >= cutoff_key]
+            removed = [task_id for task_id in expired_ids if self._pop_task(task_id) is not None]
+            if removed:
+                self._persist(deletes=removed)
+            return removed
+
+    def export_snapshot(self, target):
+        """Зберігає стан з диску у файл формату tasks.json (для бекапів)."""
+        self.flush()  # у режимах group/async спершу дописуємо вже підтверджені зміни
+        with self._lock:
+            self.backend.export_snapshot(target)
+
+    def import_snapshot(self, source):
+        """Відновлює стан з файлу формату tasks.json (наприклад, з бекапу)."""
+        with self._flush_lock:
+            # Бекенд сам бере міжпроцесне блокування — до self._lock, як і всюди
+            self.backend.import_snapshot(source)
+            with self._lock:
+                # Відновлення перекриває все, що ще не встигло записатись
+                self._pending_upserts, self._pending_deletes = {}, set()
+                self._loaded = False
+
+    def stats(self):
+        """Статистика кешу для моніторингу."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': self.backend.name,
+                'tasks': len(self._tasks),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+                'durability': self.durability,
+                'pending_writes': len(self._pending_upserts) + len(self._pending_deletes),
+                'flushes': self.flushes,
+                'revision': f"{self._epoch}-{self._revision}",
+                'tombstones': len(self._changes) - len(self._tasks),
+            }
+
+
+class RetentionScheduler:
+    """Фоновий потік, що раз на interval_seconds прибирає прямокутники, які закінчились
+    понад retention_days днів тому.
+
+    Якщо передано archive (див. task_archive.TaskArchive), прострочені прямокутники спершу
+    переносяться в архів і лише потім видаляються з робочого сховища.
+    """
+
+    def __init__(self, store, retention_days=90, interval_seconds=3600, archive=None):
+        self.store = store
+        self.archive = archive
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self):
+        """Один прохід очищення. Повертає звіт про видалені прямокутники."""
+        cutoff = date.today() - timedelta(days=self.retention_days)
+        started = time.perf_counter()
+        on_expire = self.archive.append if self.archive is not None else None
+        removed = self.store.expire_before(cutoff, on_expire=on_expire)
+        report = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'cutoff': cutoff.isoformat(),
+            'removed': removed,
+            'removed_count': len(removed),
+            'archived': self.archive is not None,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+        self.last_report = report
+        if removed:
+            shown = ", ".join(map(str, removed[:20])) + (" …" if len(removed) > 20 else "")
+            action = "перенесено в архів" if self.archive is not None else "видалено"
+            print(f"Очищення: {action} {len(removed)} задач, що закінчились до {cutoff} ({self.retention_days} днів): {shown}")
+        return report
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Помилка фонового очищення задач: {e}")
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="tasks-retention", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'retention_days': self.retention_days,
+            'interval_seconds': self.interval_seconds,
+            'last_sweep': {k: v for k, v in self.last_report.items() if k != 'removed'} if self.last_report else None,
+        }
+
+
+if __name__ == "__main__":
+    # Ручна міграція: python task_store.py migrate [tasks.json] [tasks.sqlite3]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        base = Path(__file__).parent / "logs"
+        source = Path(sys.argv[2]) if len(sys.argv) > 2 else base / "tasks.json"
+        target = Path(sys.argv[3]) if len(sys.argv) > 3 else base / "tasks.sqlite3"
+        SqliteTaskBackend(target).migrate_from_json(source, force=True)
+    else:
+        print("Використання: python task_store.py migrate [tasks.json] [tasks.sqlite3]")
@@ -0,0 +1,177 @@
+"""Тести HTTP API прямокутників через тестовий клієнт Flask."""
+import importlib.util
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from werkzeug.security import generate_password_hash
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """app.py, завантажений з копії в tmp_path: усі файли даних (BASE_DIR) — тимчасові."""
+    shutil.copy2(REPO_DIR / "app.py", tmp_path / "app.py")
+    shutil.copy2(REPO_DIR / "goods.xlsx", tmp_path / "goods.xlsx")
+    users = {"admin": {"password": generate_password_hash("admin123"), "role": "super_admin"}}
+    (tmp_path / "users.json").write_text(json.dumps(users), encoding="utf-8")
+    monkeypatch.setenv("SECRET_KEY", "test")
+    monkeypatch.setenv("TASKS_ARCHIVE_ENABLED", "false")
+
+    spec = importlib.util.spec_from_file_location("app", tmp_path / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "app", module)
+    spec.loader.exec_module(module)
+    module.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    module.limiter.enabled = False
+    yield module
+    module.retention_scheduler.stop()
+    module.backup_worker.stop()
+    module.task_store.close()
+    module.goods_repository.flush()
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "admin"
+        session["_fresh"] = True
+    return client
+
+
+def test_patch_accepts_numeric_id_matching_url(client, app_module):
+    assert client.post("/api/tasks", json={"id": 5, "name": "a", "start": "2026-10-01", "days": 1}).status_code == 200
+    response = client.patch("/api/tasks/5", json={"id": 5, "name": "b"})
+    assert response.status_code == 200
+    assert app_module.task_store.get("5")["name"] == "b"
+
+
+@pytest.mark.parametrize("patch_id", [6, "6", None])
+def test_patch_rejects_changed_id(client, app_module, patch_id):
+    client.post("/api/tasks", json={"id": 5, "name": "a", "start": "2026-10-01", "days": 1})
+    response = client.patch("/api/tasks/5", json={"id": patch_id, "name": "b"})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Не можна змінювати id прямокутника"
+    assert app_module.task_store.get("5")["name"] == "a"
+
+
+def new_task(task_id, start="2026-10-01", days=1):
+    return {"id": task_id, "row": 0, "start": start, "days": days}
+
+
+def assert_not_modified(client, url, etag):
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_tasks_etag_revalidation(client):
+    client.post("/api/tasks", json=new_task(1))
+    first = client.get("/api/tasks")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert_not_modified(client, "/api/tasks", etag)
+
+    client.post("/api/tasks", json=new_task(2))
+    changed = client.get("/api/tasks", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert sorted(changed.get_json()) == ["1", "2"]
+    assert_not_modified(client, "/api/tasks", changed.headers["ETag"])
+
+
+def test_tasks_etag_depends_on_query(client):
+    client.post("/api/tasks", json=new_task(1, start="2026-10-01"))
+    client.post("/api/tasks", json=new_task(2, start="2026-11-01"))
+    urls = [
+        "/api/tasks",
+        "/api/tasks?from=2026-10-01",
+        "/api/tasks?to=2026-10-31",
+        "/api/tasks?from=2026-10-01&to=2026-10-31",
+        "/api/tasks?from=2026-11-01&to=2026-11-30",
+    ]
+    etags = {}
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200
+        etags[url] = response.headers["ETag"]
+        assert_not_modified(client, url, etags[url])
+    assert len(set(etags.values())) == len(urls)
+    assert list(client.get("/api/tasks?from=2026-11-01&to=2026-11-30").get_json()) == ["2"]
+
+    # ETag вікна з попереднього запиту не підходить іншому вікну
+    response = client.get("/api/tasks?from=2026-11-01&to=2026-11-30", headers={"If-None-Match": etags[urls[3]]})
+    assert response.status_code == 200
+
+
+def test_tasks_since_etag(client):
+    revision = client.get("/api/tasks").headers["X-Tasks-Revision"]
+    client.post("/api/tasks", json=new_task(1))
+    delta = client.get(f"/api/tasks?since={revision}")
+    assert delta.get_json()["full"] is False
+    assert list(delta.get_json()["tasks"]) == ["1"]
+    assert_not_modified(client, f"/api/tasks?since={revision}", delta.headers["ETag"])
+
+    later = delta.headers["X-Tasks-Revision"]
+    assert client.get(f"/api/tasks?since={later}").headers["ETag"] != delta.headers["ETag"]
+    full = client.get("/api/tasks?since=unknown")
+    assert full.get_json()["full"] is True
+    assert full.headers["ETag"] not in (delta.headers["ETag"], client.get("/api/tasks").headers["ETag"])
+
+    client.delete("/api/tasks", json={"id": 1})
+    response = client.get(f"/api/tasks?since={revision}", headers={"If-None-Match": delta.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.get_json()["deleted"] == ["1"]
+
+
+def test_goods_etag_follows_pending_and_written_edits(client, app_module):
+    first = client.get("/api/goods")
+    etag = first.headers["ETag"]
+    assert_not_modified(client, "/api/goods", etag)
+
+    response = client.post("/api/goods_management", json={"category": "Тест", "name": "Новий", "weight": 2})
+    assert response.status_code == 200
+    pending = client.get("/api/goods", headers={"If-None-Match": etag})
+    assert pending.status_code == 200
+    assert pending.headers["ETag"] != etag
+    assert [item["name"] for item in pending.get_json()["Тест"]] == ["Новий"]
+    assert_not_modified(client, "/api/goods", pending.headers["ETag"])
+
+    # Після фонового запису goods.xlsx ETag переходить на сигнатуру файлу
+    app_module.goods_repository.flush()
+    written = client.get("/api/goods", headers={"If-None-Match": pending.headers["ETag"]})
+    assert written.status_code == 200
+    assert written.headers["ETag"] not in (etag, pending.headers["ETag"])
+    assert written.get_json() == pending.get_json()
+    assert_not_modified(client, "/api/goods", written.headers["ETag"])
+
+
+def test_warehouses_etag_changes_after_save(client):
+    first = client.get("/api/warehouses")
+    etag = first.headers["ETag"]
+    assert_not_modified(client, "/api/warehouses", etag)
+
+    assert client.post("/api/warehouses_management", json={"name": "Новий склад"}).status_code == 200
+    changed = client.get("/api/warehouses", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert "Новий склад" in changed.get_json()
+
+
+def test_warehouse_save_keeps_pending_goods_edits(client, app_module):
+    assert client.post("/api/goods_management", json={"category": "Тест", "name": "Новий", "weight": 2}).status_code == 200
+    assert app_module.goods_repository.stats()["dirty"] is True
+
+    assert client.post("/api/warehouses_management", json={"name": "Новий склад"}).status_code == 200
+    assert app_module.goods_repository.stats()["dirty"] is False
+    df = pd.read_excel(app_module.GOODS_FILE)
+    assert "Новий" in set(df["Назва товару"])
+    assert "Новий склад" in set(df["Склади"])
+    assert [item["name"] for item in client.get("/api/goods").get_json()["Тест"]] == ["Новий"]
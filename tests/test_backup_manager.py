@@ -0,0 +1,191 @@
+"""Тести бекапів: дедуплікація, відновлення, архіви tar.gz, цілісність і фонова черга BackupWorker."""
+import gzip
+import io
+import json
+import threading
+
+import pytest
+
+from backup_manager import BackupIntegrityError, BackupManager, BackupWorker
+
+FILES = ("users.json", "goods.xlsx")
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    (tmp_path / "users.json").write_text(json.dumps({"admin": {"role": "super_admin"}}), encoding="utf-8")
+    (tmp_path / "goods.xlsx").write_bytes(b"PK\x03\x04 fake workbook " * 100)
+    return tmp_path
+
+
+def backup_files(workdir):
+    return [(name, workdir / name) for name in FILES]
+
+
+def test_restore_round_trip(workdir, tmp_path):
+    manager = BackupManager(tmp_path / "backups")
+    name = manager.create(backup_files(workdir))
+    original = {file_name: (workdir / file_name).read_bytes() for file_name in FILES}
+    (workdir / "users.json").write_text("{}", encoding="utf-8")
+
+    restore_dir = tmp_path / "restore"
+    restore_dir.mkdir()
+    extracted = manager.extract(name, restore_dir)
+    assert {file_name: path.read_bytes() for file_name, path in extracted.items()} == original
+
+
+def test_unchanged_content_does_not_create_a_new_backup(workdir, tmp_path):
+    manager = BackupManager(tmp_path / "backups")
+    first = manager.create(backup_files(workdir))
+    assert manager.create(backup_files(workdir)) == first
+    (workdir / "users.json").write_text("{}", encoding="utf-8")
+    second = manager.create(backup_files(workdir))
+    assert second != first
+    assert [backup["name"] for backup in manager.list_backups()] == [second, first]
+    # Незмінений goods.xlsx зберігається одним блобом на обидва бекапи
+    assert len(list((tmp_path / "backups" / "blobs").rglob("*.gz"))) == 3
+
+
+def test_corrupt_blob_is_refused_and_marked(workdir, tmp_path):
+    manager = BackupManager(tmp_path / "backups")
+    name = manager.create(backup_files(workdir))
+    for blob in (tmp_path / "backups" / "blobs").rglob("*.gz"):
+        with gzip.open(blob, "rb") as f:
+            data = f.read()
+        if data.startswith(b"{"):
+            with gzip.open(blob, "wb") as f:
+                f.write(b'{"admin": tampered')
+    restore_dir = tmp_path / "restore"
+    restore_dir.mkdir()
+    with pytest.raises(BackupIntegrityError):
+        manager.extract(name, restore_dir)
+    assert manager.list_backups()[0]["status"] == "corrupt"
+
+
+def test_archive_export_and_import(workdir, tmp_path):
+    source = BackupManager(tmp_path / "backups")
+    name = source.create(backup_files(workdir))
+    archive = b"".join(source.stream_archive(name))
+
+    target = BackupManager(tmp_path / "other")
+    imported = target.import_archive(io.BytesIO(archive), allowed_files=FILES)
+    restore_dir = tmp_path / "restore"
+    restore_dir.mkdir()
+    extracted = target.extract(imported, restore_dir)
+    assert {file_name: path.read_bytes() for file_name, path in extracted.items()} == {
+        file_name: (workdir / file_name).read_bytes() for file_name in FILES
+    }
+    assert target.list_backups()[0]["status"] == "imported"
+
+
+def test_archive_with_unexpected_file_is_rejected(workdir, tmp_path):
+    source = BackupManager(tmp_path / "backups")
+    name = source.create(backup_files(workdir))
+    archive = b"".join(source.stream_archive(name))
+    with pytest.raises(BackupIntegrityError):
+        BackupManager(tmp_path / "other").import_archive(io.BytesIO(archive), allowed_files=("users.json",))
+    with pytest.raises(BackupIntegrityError):
+        BackupManager(tmp_path / "other").import_archive(io.BytesIO(archive[:200]), allowed_files=FILES)
+
+
+def test_cleanup_keeps_newest_backups(workdir, tmp_path):
+    manager = BackupManager(tmp_path / "backups", keep=2, blob_grace_seconds=0)
+    names = []
+    for number in range(4):
+        (workdir / "users.json").write_text(json.dumps({"n": number}), encoding="utf-8")
+        names.append(manager.create(backup_files(workdir)))
+    manager.cleanup()
+    assert [backup["name"] for backup in manager.list_backups()] == names[:-3:-1]
+
+
+class FakeBackup:
+    """run для BackupWorker: рахує виклики; може падати або чекати на подію."""
+
+    def __init__(self, failures=0, gate=None):
+        self.calls = 0
+        self.failures = failures
+        self.gate = gate
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.calls <= self.failures:
+            raise OSError("disk full")
+        return f"backup_{self.calls}"
+
+
+def test_worker_coalesces_requests_into_one_backup():
+    run = FakeBackup()
+    worker = BackupWorker(run, coalesce_seconds=0.2)
+    try:
+        ids = {worker.submit(reason) for reason in ("tasks", "users", "tasks")}
+        assert len(ids) == 1
+        job_id = ids.pop()
+        assert worker.status(job_id)["state"] == "queued"
+        job = worker.wait(job_id, timeout=5)
+        assert job["state"] == "done"
+        assert job["backup"] == "backup_1"
+        assert (job["requests"], job["reasons"]) == (3, ["tasks", "users"])
+        assert run.calls == 1
+    finally:
+        worker.stop()
+
+
+def test_request_during_backup_gets_next_job():
+    gate = threading.Event()
+    run = FakeBackup(gate=gate)
+    worker = BackupWorker(run, coalesce_seconds=0)
+    try:
+        first = worker.submit("tasks")
+        assert run.started.wait(5)
+        second = worker.submit("tasks")
+        assert second != first
+        gate.set()
+        assert worker.wait(first, timeout=5)["state"] == "done"
+        assert worker.wait(second, timeout=5)["backup"] == "backup_2"
+        assert [job["id"] for job in worker.jobs()] == [second, first]
+    finally:
+        worker.stop()
+
+
+def test_immediate_request_shortens_the_delay():
+    run = FakeBackup()
+    worker = BackupWorker(run, coalesce_seconds=60)
+    try:
+        job_id = worker.submit("tasks")
+        assert worker.submit("manual", delay=0) == job_id
+        assert worker.wait(job_id, timeout=5)["state"] == "done"
+    finally:
+        worker.stop()
+
+
+def test_failed_backup_is_reported_and_worker_keeps_running():
+    run = FakeBackup(failures=1)
+    worker = BackupWorker(run, coalesce_seconds=0)
+    try:
+        failed = worker.wait(worker.submit("tasks"), timeout=5)
+        assert failed["state"] == "failed"
+        assert failed["error"] == "disk full"
+        assert failed["backup"] is None
+        thread = worker._thread
+        assert thread.is_alive()
+
+        done = worker.wait(worker.submit("tasks"), timeout=5)
+        assert done["state"] == "done"
+        assert worker._thread is thread
+        assert (worker.stats()["failed"], worker.stats()["completed"]) == (1, 1)
+    finally:
+        worker.stop()
+
+
+def test_stop_runs_the_scheduled_backup():
+    run = FakeBackup()
+    worker = BackupWorker(run, coalesce_seconds=60)
+    job_id = worker.submit("tasks")
+    worker.stop(timeout=5)
+    assert worker.status(job_id)["state"] == "done"
+    assert worker.status("unknown") is None
+    assert worker.wait("unknown") is None
@@ -0,0 +1,122 @@
+"""Тести брокера SSE: replay за Last-Event-ID, reset, повільні підписники й відписка."""
+import json
+
+import pytest
+
+from event_stream import EventBroker
+
+
+def parse(chunk):
+    """Подія SSE як (id, назва, дані) або None для службових рядків (retry, keep-alive)."""
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n") if not line.startswith((":", "retry")))
+    if not fields:
+        return None
+    return fields["id"], fields["event"], json.loads(fields["data"])
+
+
+def read(broker, subscription, count):
+    """Перші count подій стріму (службові рядки пропускаються), після чого стрім закривається."""
+    stream = broker.stream(subscription, poll_interval=0.01, max_duration=5)
+    events = []
+    try:
+        for chunk in stream:
+            event = parse(chunk)
+            if event is not None:
+                events.append(event)
+            if len(events) == count:
+                break
+    finally:
+        stream.close()
+    return events
+
+
+def publish(broker, *numbers):
+    for number in numbers:
+        broker.publish("tasks", {"n": number})
+    return [item[0] for item in broker._buffer]
+
+
+def test_replay_from_last_event_id_in_buffer():
+    broker = EventBroker(buffer_size=10)
+    ids = publish(broker, 1, 2, 3)
+    subscription = broker.subscribe(ids[0])
+    assert subscription.reset is False
+    broker.publish("log", {"n": 4})
+
+    events = read(broker, subscription, 3)
+    assert [(event, data) for _, event, data in events] == [("tasks", {"n": 2}), ("tasks", {"n": 3}), ("log", {"n": 4})]
+    assert [event_id for event_id, _, _ in events[:2]] == ids[1:]
+
+
+def test_up_to_date_client_gets_nothing_replayed():
+    broker = EventBroker()
+    ids = publish(broker, 1, 2)
+    subscription = broker.subscribe(ids[-1])
+    assert subscription.reset is False
+    assert subscription.backlog == []
+
+
+@pytest.mark.parametrize("last_event_id", ["evicted", "other-epoch-1", "future", "garbage"])
+def test_unrecoverable_last_event_id_gets_reset(last_event_id):
+    broker = EventBroker(buffer_size=2)
+    ids = publish(broker, 1, 2, 3, 4)
+    epoch = ids[0].rsplit("-", 1)[0]
+    last_event_id = {
+        "evicted": f"{epoch}-1",  # події 2 вже немає в буфері
+        "other-epoch-1": "0123456789ab-3",
+        "future": f"{epoch}-99",
+        "garbage": "не-id",
+    }[last_event_id]
+
+    subscription = broker.subscribe(last_event_id)
+    assert subscription.reset is True
+    assert subscription.backlog == []
+    (event_id, event, data), = read(broker, subscription, 1)
+    assert (event_id, event, data) == (ids[-1], "reset", {})
+
+
+def test_oldest_buffered_event_can_still_be_replayed():
+    broker = EventBroker(buffer_size=2)
+    ids = publish(broker, 1, 2, 3)
+    epoch = ids[0].rsplit("-", 1)[0]
+    subscription = broker.subscribe(f"{epoch}-1")
+    assert subscription.reset is False
+    assert [item[0] for item in subscription.backlog] == ids
+
+
+def test_lagging_subscriber_is_dropped_and_can_resume():
+    broker = EventBroker(buffer_size=10, subscriber_queue_size=2)
+    slow = broker.subscribe()
+    fast = broker.subscribe()
+    publish(broker, 1, 2)
+    read(broker, fast, 2)  # закритий стрім відписує fast
+    publish(broker, 3)
+
+    assert slow.lagging is True
+    assert broker.stats()["dropped"] == 1
+    assert broker.stats()["subscribers"] == 0
+    # Стрім повільного клієнта віддає те, що встигло в чергу, і закривається сам
+    stream = broker.stream(slow, poll_interval=0.01, max_duration=5)
+    events = [event for event in map(parse, stream) if event is not None]
+    assert [data for _, _, data in events] == [{"n": 1}, {"n": 2}]
+
+    # EventSource перепідключається з останнім отриманим id і дочитує буфер
+    resumed = broker.subscribe(events[-1][0])
+    assert [data for _, _, data in read(broker, resumed, 1)] == [{"n": 3}]
+
+
+def test_no_events_after_unsubscribe():
+    broker = EventBroker()
+    subscription = broker.subscribe()
+    broker.unsubscribe(subscription)
+    publish(broker, 1)
+    assert subscription.queue.empty()
+
+    # Закриття стріму (клієнт відключився) теж відписує
+    subscription = broker.subscribe()
+    stream = broker.stream(subscription, poll_interval=0.01)
+    assert next(stream).startswith("retry:")
+    stream.close()
+    publish(broker, 2)
+    assert subscription.queue.empty()
+    assert broker.stats()["subscribers"] == 0
@@ -0,0 +1,120 @@
+"""Тести CatalogCache: знімок у пам'яті й файл-супутник між перезапусками."""
+import os
+import pickle
+
+import pandas as pd
+import pytest
+
+import goods_catalog
+from goods_catalog import (
+    CATEGORY_COLUMN, PALLET_COEF_COLUMN, PRODUCT_COLUMN, WEIGHT_COLUMN, CatalogCache, CatalogSnapshot,
+)
+
+
+def write_goods(path, rows):
+    pd.DataFrame(rows, columns=[CATEGORY_COLUMN, PRODUCT_COLUMN, WEIGHT_COLUMN, PALLET_COEF_COLUMN]).to_excel(path, index=False)
+
+
+class CountingReader:
+    """reader для CatalogCache, що рахує розбори goods.xlsx."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path, signature):
+        self.calls += 1
+        return CatalogSnapshot.from_frame(pd.read_excel(path), signature)
+
+
+def settle(cache):
+    """Чекає, поки фоновий потік перебудує знімок і супутник."""
+    thread = cache._refresh_thread
+    if thread is not None:
+        thread.join(timeout=30)
+
+
+@pytest.fixture
+def goods_file(tmp_path):
+    path = tmp_path / "goods.xlsx"
+    write_goods(path, [("Соки", "Яблуко", 1.0, 1.0), ("Соки", "Груша", 2.0, 1.0)])
+    return path
+
+
+def new_cache(goods_file, tmp_path):
+    reader = CountingReader()
+    return CatalogCache(goods_file, reader, sidecar_path=tmp_path / "cache" / "goods.pickle"), reader
+
+
+def test_snapshot_is_reused_until_file_changes(goods_file, tmp_path):
+    cache = CatalogCache(goods_file, CountingReader())
+    first = cache.get()
+    settle(cache)
+    assert cache.get() is first
+    assert cache.reader.calls == 1
+
+    write_goods(goods_file, [("Соки", "Вишня", 3.0, 1.0)])
+    assert [item["name"] for item in cache.get().goods["Соки"]] == ["Вишня"]
+    settle(cache)
+    assert cache.reader.calls == 2
+
+
+def test_fresh_process_loads_sidecar_without_parsing(goods_file, tmp_path):
+    cache, _ = new_cache(goods_file, tmp_path)
+    assert cache.warm_up() is False
+    settle(cache)
+    assert cache.stats()["sidecar_writes"] == 1
+
+    restarted, reader = new_cache(goods_file, tmp_path)
+    assert restarted.warm_up() is True
+    assert restarted.get().goods == cache.get().goods
+    assert reader.calls == 0
+    assert restarted.stats()["sidecar_loads"] == 1
+
+
+def test_changed_file_invalidates_sidecar(goods_file, tmp_path):
+    cache, _ = new_cache(goods_file, tmp_path)
+    assert cache.write_sidecar()
+
+    write_goods(goods_file, [("Соки", "Вишня", 3.0, 1.0)])
+    restarted, reader = new_cache(goods_file, tmp_path)
+    assert restarted.warm_up() is False
+    settle(restarted)
+    assert [item["name"] for item in restarted.get().goods["Соки"]] == ["Вишня"]
+    assert reader.calls == 1
+    assert restarted.stats()["sidecar_loads"] == 0
+
+
+def test_touched_file_with_same_content_keeps_sidecar(goods_file, tmp_path):
+    cache, _ = new_cache(goods_file, tmp_path)
+    assert cache.write_sidecar()
+
+    stat = goods_file.stat()
+    os.utime(goods_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    restarted, reader = new_cache(goods_file, tmp_path)
+    assert restarted.warm_up() is True
+    assert reader.calls == 0
+
+
+def test_sidecar_of_other_format_is_ignored(goods_file, tmp_path, monkeypatch):
+    cache, _ = new_cache(goods_file, tmp_path)
+    assert cache.write_sidecar()
+
+    monkeypatch.setattr(goods_catalog, "SIDECAR_FORMAT", goods_catalog.SIDECAR_FORMAT + 1)
+    restarted, reader = new_cache(goods_file, tmp_path)
+    assert restarted.warm_up() is False
+    settle(restarted)
+    assert reader.calls == 1
+    with cache.sidecar_path.open("rb") as f:
+        assert pickle.load(f)["format"] == goods_catalog.SIDECAR_FORMAT
+
+
+def test_corrupt_sidecar_is_rebuilt(goods_file, tmp_path):
+    cache, _ = new_cache(goods_file, tmp_path)
+    cache.sidecar_path.parent.mkdir()
+    cache.sidecar_path.write_bytes(b"not a pickle")
+
+    assert cache.warm_up() is False
+    settle(cache)
+    restarted, reader = new_cache(goods_file, tmp_path)
+    assert restarted.warm_up() is True
+    assert reader.calls == 0
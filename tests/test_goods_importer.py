@@ -0,0 +1,75 @@
+"""Тести потокового імпорту товарів: перевірка рядків, дублікати, номери рядків і різниця."""
+import io
+
+import pandas as pd
+
+from goods_importer import IMPORT_COLUMNS, GoodsImport, iter_import_chunks
+
+HEADER = ",".join(IMPORT_COLUMNS)
+
+
+def run_csv(text, current=(), replace=True, chunk_rows=5000):
+    importer = GoodsImport(list(current), replace=replace)
+    stream = io.BytesIO(text.encode("utf-8"))
+    for first_row, chunk in iter_import_chunks(stream, "goods.csv", chunk_rows=chunk_rows):
+        importer.feed(first_row, chunk)
+    return importer
+
+
+def test_duplicate_reported_with_physical_line_numbers_after_blank_line():
+    importer = run_csv(f"{HEADER}\nA,y,1,\n\nA,z,2,\nA,z,3,\n")
+    assert importer.errors == [{"row": 5, "error": "Дублікат товару (вперше в рядку 4)"}]
+
+
+def test_empty_weight_and_coefficient_default_to_one():
+    importer = run_csv(f"{HEADER}\nA,y,,\nA,z,\"2,5\",\n")
+    assert importer.error_count == 0
+    assert importer.added == [("A", "y", 1.0, 1.0), ("A", "z", 2.5, 1.0)]
+
+
+def test_invalid_values_are_reported_per_row():
+    importer = run_csv(f"{HEADER}\nA,a,abc,1\nA,b,-1,1\nA,,1,1\nA,c,1,0\n,,,\nA,d,1,1\n")
+    assert importer.errors == [
+        {"row": 2, "error": "Некоректна вага"},
+        {"row": 3, "error": "Вага не може бути від'ємною"},
+        {"row": 4, "error": "Порожня назва товару"},
+        {"row": 5, "error": "Некоректний коефіцієнт паллети"},
+    ]
+    assert importer.rows == 5
+    assert importer.added == [("A", "d", 1.0, 1.0)]
+
+
+CURRENT = [
+    ("A", "Same", 1.0, 1.0, 1),
+    ("A", "Heavier", 1.0, 1.0, 1),
+    ("A", "Case", 1.0, 1.0, 1),
+    ("A", "Twice", 1.0, 1.0, 2),
+    ("B", "Gone", 1.0, 1.0, 1),
+]
+CATALOG_FILE = f"{HEADER}\nA,Same,1,1\nA,Heavier,2,1\nA,case,1,1\nA,Twice,1,1\nA,New,3,2\n"
+
+
+def test_diff_against_current_catalog():
+    importer = run_csv(CATALOG_FILE, CURRENT)
+    assert importer.added == [("A", "New", 3.0, 2.0)]
+    # Зміна регістру назви й злиття дубліката з каталогу — теж оновлення
+    assert importer.updated == [("A", "Heavier", 2.0, 1.0), ("A", "case", 1.0, 1.0), ("A", "Twice", 1.0, 1.0)]
+    assert importer.removed() == [("B", "Gone")]
+    report = importer.report()
+    assert (report["rows"], report["added"], report["updated"], report["unchanged"], report["removed"]) == (5, 1, 3, 1, 1)
+
+
+def test_merge_mode_keeps_goods_missing_from_file():
+    importer = run_csv(CATALOG_FILE, CURRENT, replace=False)
+    assert importer.removed() == []
+    assert importer.report()["removed"] == 0
+
+
+def test_duplicates_across_chunks():
+    importer = run_csv(f"{HEADER}\nA,Same,1,1\nA,x,1,1\nA,y,1,1\nA,same,2,1\nA,X,1,1\n", CURRENT, chunk_rows=2)
+    assert importer.errors == [
+        {"row": 5, "error": "Дублікат товару (вперше в рядку 2)"},
+        {"row": 6, "error": "Дублікат товару (вперше в рядку 3)"},
+    ]
+    assert importer.added == [("A", "x", 1.0, 1.0), ("A", "y", 1.0, 1.0)]
+    assert importer.unchanged == 1
@@ -0,0 +1,179 @@
+"""Тести GoodsRepository: індекс, відкладений запис і правки кількох воркерів."""
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from goods_catalog import (
+    CATEGORY_COLUMN, PALLET_COEF_COLUMN, PRODUCT_COLUMN, WAREHOUSE_COLUMN, WEIGHT_COLUMN,
+    CatalogCache, CatalogSnapshot, GoodsConflictError, GoodsNotFoundError, GoodsRepository, write_excel_atomic,
+)
+
+
+def write_goods(path, goods):
+    rows = [
+        {CATEGORY_COLUMN: category, PRODUCT_COLUMN: item["name"],
+         WEIGHT_COLUMN: item["weight"], PALLET_COEF_COLUMN: item.get("pallet_coef", 1.0)}
+        for category, items in goods.items()
+        for item in items
+    ]
+    pd.DataFrame(rows, columns=[CATEGORY_COLUMN, PRODUCT_COLUMN, WEIGHT_COLUMN, PALLET_COEF_COLUMN]).to_excel(path, index=False)
+    return True
+
+
+def read_goods(path, signature):
+    return CatalogSnapshot.from_frame(pd.read_excel(path), signature)
+
+
+def names(repository, category):
+    return [item["name"] for item in repository._tree_locked()[1].get(category, [])]
+
+
+@pytest.fixture
+def goods_file(tmp_path):
+    path = tmp_path / "goods.xlsx"
+    write_goods(path, {"Соки": [{"name": "Яблуко", "weight": 1.0}, {"name": "Груша", "weight": 2.0}]})
+    return path
+
+
+def worker(goods_file, tmp_path, writes=None):
+    """Репозиторій окремого воркера: власний кеш, спільний файл і блокування."""
+    def writer(tree):
+        if writes is not None:
+            writes.append(tree)
+        return write_goods(goods_file, tree)
+    cache = CatalogCache(goods_file, read_goods)
+    return GoodsRepository(cache, writer, flush_delay=60, lock_path=tmp_path / "goods.xlsx.lock")
+
+
+def test_edits_are_coalesced_into_one_write(goods_file, tmp_path):
+    writes = []
+    repository = worker(goods_file, tmp_path, writes)
+    repository.add("Соки", "Вишня", 3.0, 1.0)
+    repository.update("Соки", "Яблуко", "Соки", "Яблуко", 1.5, 1.0)
+    repository.delete("Соки", "Груша")
+    assert writes == []
+    assert repository.flush()
+    assert len(writes) == 1
+
+    snapshot = read_goods(goods_file, None)
+    assert snapshot.goods["Соки"] == [
+        {"name": "Яблуко", "weight": 1.5, "pallet_coef": 1.0},
+        {"name": "Вишня", "weight": 3.0, "pallet_coef": 1.0},
+    ]
+    assert repository.stats()["dirty"] is False
+
+
+def test_duplicate_and_missing_items_are_rejected(goods_file, tmp_path):
+    repository = worker(goods_file, tmp_path)
+    with pytest.raises(GoodsConflictError):
+        repository.add("Соки", "яблуко", 1.0, 1.0)
+    with pytest.raises(GoodsConflictError):
+        repository.update("Соки", "Груша", "Соки", "ЯБЛУКО", 1.0, 1.0)
+    with pytest.raises(GoodsNotFoundError):
+        repository.update("Соки", "Слива", "Соки", "Слива", 1.0, 1.0)
+    with pytest.raises(GoodsNotFoundError):
+        repository.delete("Соки", "Слива")
+    assert repository.stats()["dirty"] is False
+
+
+def test_pending_edits_are_replayed_over_another_workers_write(goods_file, tmp_path):
+    worker_a = worker(goods_file, tmp_path)
+    worker_b = worker(goods_file, tmp_path)
+    worker_a.add("Соки", "Вишня", 3.0, 1.0)
+
+    worker_b.add("Соки", "Слива", 4.0, 1.0)
+    worker_b.delete("Соки", "Груша")
+    assert worker_b.flush()
+    # Інший mtime навіть на файлових системах з грубою роздільністю часу
+    stat = goods_file.stat()
+    os.utime(goods_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert worker_a.flush()
+    snapshot = read_goods(goods_file, None)
+    assert [item["name"] for item in snapshot.goods["Соки"]] == ["Яблуко", "Слива", "Вишня"]
+    assert worker_a.stats()["rebases"] == 1
+
+
+def test_replayed_edit_of_removed_item_is_dropped(goods_file, tmp_path):
+    worker_a = worker(goods_file, tmp_path)
+    worker_b = worker(goods_file, tmp_path)
+    worker_a.update("Соки", "Груша", "Соки", "Груша", 9.0, 1.0)
+    worker_b.delete("Соки", "Груша")
+    assert worker_b.flush()
+    stat = goods_file.stat()
+    os.utime(goods_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert worker_a.flush()
+    assert names(worker_a, "Соки") == ["Яблуко"]
+    assert worker_a.stats()["dropped_ops"] == 1
+
+
+def write_warehouses(goods_file, warehouses, seen=None):
+    """write для write_file: як save_warehouses — товари з поточного файлу плюс колонка складів."""
+    def write():
+        df = pd.read_excel(goods_file)
+        if seen is not None:
+            seen.extend(df[PRODUCT_COLUMN])
+        df[WAREHOUSE_COLUMN] = (warehouses + [""] * len(df))[:len(df)]
+        write_excel_atomic(df, goods_file)
+        return True
+    return write
+
+
+def test_write_file_writes_pending_edits_first(goods_file, tmp_path):
+    repository = worker(goods_file, tmp_path)
+    repository.add("Соки", "Вишня", 3.0, 1.0)
+    seen = []
+    assert repository.write_file(write_warehouses(goods_file, ["Київ"], seen))
+    assert seen == ["Яблуко", "Груша", "Вишня"]
+
+    df = pd.read_excel(goods_file)
+    assert list(df[PRODUCT_COLUMN]) == ["Яблуко", "Груша", "Вишня"]
+    assert df[WAREHOUSE_COLUMN].iloc[0] == "Київ"
+    stats = repository.stats()
+    assert (stats["dirty"], stats["pending_ops"], stats["rebases"]) == (False, 0, 0)
+    # Індекс відповідає файлу після запису складів — наступна правка його не перебудовує
+    repository.add("Соки", "Слива", 4.0, 1.0)
+    assert names(repository, "Соки") == ["Яблуко", "Груша", "Вишня", "Слива"]
+
+
+def test_other_worker_flush_waits_for_write_file(goods_file, tmp_path):
+    worker_a = worker(goods_file, tmp_path)
+    worker_b = worker(goods_file, tmp_path)
+    worker_b.add("Соки", "Слива", 4.0, 1.0)
+    flushed = threading.Event()
+    flusher = threading.Thread(target=lambda: worker_b.flush() and flushed.set(), daemon=True)
+    write = write_warehouses(goods_file, ["Київ"])
+
+    def write_while_b_flushes():
+        flusher.start()
+        assert not flushed.wait(0.3), "інший воркер записав goods.xlsx посеред запису складів"
+        return write()
+
+    assert worker_a.write_file(write_while_b_flushes)
+    flusher.join(timeout=10)
+    assert flushed.is_set()
+    # Правка B програна поверх файлу зі складами, а не записана поверх старої версії
+    assert worker_b.stats()["rebases"] == 1
+    assert list(pd.read_excel(goods_file)[PRODUCT_COLUMN]) == ["Яблуко", "Груша", "Слива"]
+
+
+def test_failed_goods_flush_skips_write_file(goods_file, tmp_path):
+    repository = GoodsRepository(CatalogCache(goods_file, read_goods), lambda tree: False, flush_delay=60)
+    repository.add("Соки", "Вишня", 3.0, 1.0)
+    called = []
+    assert repository.write_file(lambda: called.append(True)) is False
+    assert called == []
+    assert repository.stats()["dirty"] is True
+
+
+def test_write_excel_atomic_replaces_file_and_keeps_mode(goods_file):
+    os.chmod(goods_file, 0o640)
+    inode = goods_file.stat().st_ino
+    write_excel_atomic(pd.DataFrame({PRODUCT_COLUMN: ["Вишня"]}), goods_file)
+    assert goods_file.stat().st_ino != inode
+    assert goods_file.stat().st_mode & 0o777 == 0o640
+    assert list(pd.read_excel(goods_file)[PRODUCT_COLUMN]) == ["Вишня"]
+    assert [path.name for path in goods_file.parent.iterdir() if path.name.startswith(".")] == []
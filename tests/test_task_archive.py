@@ -0,0 +1,112 @@
+"""Тести холодного архіву: помісячні gzip-сегменти, маніфест і відновлення після збою."""
+import gzip
+import json
+from datetime import date
+
+import pytest
+
+from task_archive import TaskArchive
+
+
+def task(task_id, start, days=1, **fields):
+    return {"id": task_id, "row": 0, "start": start, "days": days, **fields}
+
+
+def test_round_trip_across_monthly_segments(tmp_path):
+    archive = TaskArchive(tmp_path)
+    tasks = {
+        "a": task("a", "2025-04-03"),
+        "b": task("b", "2025-04-28T10:00:00.000Z", days=2),
+        "c": task("c", "2025-05-15"),
+        "x": task("x", None),
+    }
+    assert archive.append(tasks) == 4
+    assert sorted(path.name for path in tmp_path.glob("*.gz")) == [
+        "tasks-2025-04.jsonl.gz", "tasks-2025-05.jsonl.gz", "tasks-undated.jsonl.gz",
+    ]
+    with gzip.open(tmp_path / "tasks-2025-05.jsonl.gz", "rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [{"id": "c", "task": tasks["c"]}]
+
+    reopened = TaskArchive(tmp_path)
+    assert reopened.query_window() == {task_id: tasks[task_id] for task_id in ("a", "b", "c")}
+    assert reopened.query_window(date(2025, 4, 29), date(2025, 5, 1)) == {"b": tasks["b"]}
+    assert reopened.stats()["entries"] == 4
+    assert reopened.stats()["segments"] == 3
+
+
+def test_window_opens_only_overlapping_segments(tmp_path):
+    archive = TaskArchive(tmp_path)
+    archive.append({
+        "march": task("march", "2025-03-10"),
+        "april": task("april", "2025-04-10"),
+        # Почався у квітні, але тягнеться до травня — квітневий сегмент перетинає травневе вікно
+        "april-long": task("april-long", "2025-04-25", days=10),
+        "june": task("june", "2025-06-10"),
+    })
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["segments"]["2025-04"]["max_end"] == date(2025, 5, 5).toordinal()
+
+    fresh = TaskArchive(tmp_path)
+    assert list(fresh.query_window(date(2025, 5, 1), date(2025, 5, 31))) == ["april-long"]
+    assert list(fresh._cache) == ["2025-04"]
+
+    fresh = TaskArchive(tmp_path)
+    assert list(fresh.query_window(date(2025, 5, 10), date(2025, 5, 31))) == []
+    assert list(fresh._cache) == []
+
+
+def test_later_append_of_same_id_wins(tmp_path):
+    archive = TaskArchive(tmp_path)
+    archive.append({"a": task("a", "2025-04-03", comment="перша версія")})
+    assert archive.query_window()["a"]["comment"] == "перша версія"
+    version = archive.version()
+
+    archive.append({"a": task("a", "2025-04-03", comment="друга версія")})
+    assert archive.version() == version + 1
+    # Кеш місяця скидається за сигнатурою файлу
+    assert archive.query_window()["a"]["comment"] == "друга версія"
+    assert TaskArchive(tmp_path).query_window()["a"]["comment"] == "друга версія"
+
+
+@pytest.mark.parametrize("kept_bytes", [1, 15, 40, -8])
+def test_torn_final_member_is_tolerated(tmp_path, kept_bytes):
+    archive = TaskArchive(tmp_path)
+    archive.append({"a": task("a", "2025-04-03")})
+    segment = tmp_path / "tasks-2025-04.jsonl.gz"
+    manifest = (tmp_path / "manifest.json").read_bytes()
+    committed = len(segment.read_bytes())
+    archive.append({"b": task("b", "2025-04-04")})
+
+    # Збій посеред дописування: від другого gzip-члена лишився лише шматок, а маніфест
+    # (його пишуть останнім) ще описує стан після першого
+    data = segment.read_bytes()
+    segment.write_bytes(data[:committed + kept_bytes] if kept_bytes > 0 else data[:kept_bytes])
+    (tmp_path / "manifest.json").write_bytes(manifest)
+    assert list(TaskArchive(tmp_path).query_window()) == ["a"]
+
+    # Наступне дописування відрізає обірваний хвіст і лишається читабельним
+    archive.append({"c": task("c", "2025-04-05")})
+    assert sorted(TaskArchive(tmp_path).query_window()) == ["a", "c"]
+    assert json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))["segments"]["2025-04"]["bytes"] == (
+        segment.stat().st_size
+    )
+
+
+def test_garbage_after_last_member_is_tolerated(tmp_path):
+    archive = TaskArchive(tmp_path)
+    archive.append({"a": task("a", "2025-04-03")})
+    with (tmp_path / "tasks-2025-04.jsonl.gz").open("ab") as f:
+        f.write(b"\x1f\x8b\x08\x00 torn")
+    assert list(TaskArchive(tmp_path).query_window()) == ["a"]
+
+
+def test_manifest_without_sizes_is_still_readable(tmp_path):
+    archive = TaskArchive(tmp_path)
+    archive.append({"a": task("a", "2025-04-03")})
+    manifest_path = tmp_path / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    del manifest["segments"]["2025-04"]["bytes"]
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    archive.append({"b": task("b", "2025-04-04")})
+    assert sorted(TaskArchive(tmp_path).query_window()) == ["a", "b"]
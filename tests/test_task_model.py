@@ -0,0 +1,22 @@
+"""Тести нормалізації задачі перед записом."""
+from task_model import clean_task
+
+
+def test_clean_task_drops_transient_and_derived_fields():
+    task = clean_task({
+        "zLegacy": 1,
+        "_tempOrderSnapshot": {"a": 1},
+        "order": {"a": 2},
+        "id": 7,
+        "itemWeights": {"a": 1.5, "b": 2.0},
+        "orderStatusColors": {"a": "white", "b": "red"},
+        "warehouseDistribution": {"Склад": {"c": 1}},
+    })
+    assert list(task) == ["id", "order", "orderStatusColors", "warehouseDistribution", "itemWeights", "zLegacy"]
+    assert task["itemWeights"] == {"a": 1.5}
+    assert task["orderStatusColors"] == {"b": "red"}
+
+
+def test_clean_task_leaves_non_objects_alone():
+    assert clean_task(None) is None
+    assert clean_task([1]) == [1]
@@ -0,0 +1,510 @@
+"""Тести TaskStore: режими довговічності, бекенди, пакети змін і дельта-синхронізація."""
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from task_store import (
+    JournalTaskBackend, JsonTaskBackend, RetentionScheduler, SqliteTaskBackend, TaskBatchError, TaskStore, create_task_backend,
+    merge_patch, task_span_days, task_start_key,
+)
+
+
+class FailingBackend(JsonTaskBackend):
+    """JSON-бекенд, запис якого завжди падає (диск заповнений, немає прав …)."""
+
+    def commit(self, tasks, upserts, deletes):
+        raise OSError("disk full")
+
+
+def task(task_id, start="2025-05-03T08:00:00.000Z", **fields):
+    return {"id": task_id, "row": 0, "start": start, "days": 1, **fields}
+
+
+def test_group_mode_write_fails_instead_of_hanging(tmp_path):
+    store = TaskStore(FailingBackend(tmp_path / "tasks.json"), durability="group", flush_interval_ms=10)
+    outcome = {}
+
+    def write():
+        try:
+            store.put("a", task("a"))
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    thread.join(timeout=3)
+    try:
+        assert not thread.is_alive(), "запис у group-режимі завис після помилки бекенду"
+        assert isinstance(outcome.get("error"), OSError)
+    finally:
+        store.close()
+
+
+def test_group_mode_write_returns_after_commit(tmp_path):
+    backend = JsonTaskBackend(tmp_path / "tasks.json")
+    store = TaskStore(backend, durability="group", flush_interval_ms=10)
+    try:
+        store.put("a", task("a"))
+        assert backend.load() == {"a": task("a")}
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite", "journal"])
+def test_numeric_ids_are_stored_as_strings(tmp_path, kind):
+    backend = create_task_backend(kind, tmp_path / "tasks.json", tmp_path / "tasks.sqlite3")
+    store = TaskStore(backend)
+    store.put(123, task(123))
+    store.put("123", task(123, days=2))
+    assert list(store.all()) == ["123"]
+    assert store.patch("123", {"comment": "ok"})["comment"] == "ok"
+    assert store.update(123, {"days": 3})
+    store.close()
+
+    reloaded = TaskStore(create_task_backend(kind, tmp_path / "tasks.json", tmp_path / "tasks.sqlite3"))
+    assert reloaded.get(123) == {**task(123), "days": 3, "comment": "ok"}
+    reloaded.delete(123)
+    assert reloaded.all() == {}
+    reloaded.close()
+
+
+def test_batch_is_rolled_back_when_any_operation_fails(tmp_path):
+    backend = JsonTaskBackend(tmp_path / "tasks.json")
+    store = TaskStore(backend)
+    store.put("a", task("a"))
+    with pytest.raises(TaskBatchError) as excinfo:
+        store.apply_batch([
+            {"op": "create", "task": task("b")},
+            {"op": "delete", "id": "a"},
+            {"op": "patch", "id": "missing", "patch": {"days": 2}},
+        ])
+    assert excinfo.value.index == 2
+    assert excinfo.value.not_found
+    assert store.all() == {"a": task("a")}
+    assert backend.load() == {"a": task("a")}
+
+
+def test_batch_applies_all_operations_with_one_commit(tmp_path):
+    commits = []
+
+    class CountingBackend(JsonTaskBackend):
+        def commit(self, tasks, upserts, deletes):
+            commits.append((dict(upserts), list(deletes)))
+            super().commit(tasks, upserts, deletes)
+
+    store = TaskStore(CountingBackend(tmp_path / "tasks.json"))
+    store.put("1", task(1))
+    commits.clear()
+    results = store.apply_batch([
+        {"op": "create", "task": task(2)},
+        {"op": "patch", "id": 1, "patch": {"comment": "x"}},
+        {"op": "delete", "id": 3},
+    ])
+    assert [r["status"] for r in results] == ["created", "patched", "missing"]
+    assert sorted(store.all()) == ["1", "2"]
+    assert store.get("1")["comment"] == "x"
+    assert len(commits) == 1
+
+
+def make_backend(kind, tmp_path):
+    return create_task_backend(kind, tmp_path / "tasks.json", tmp_path / "tasks.sqlite3")
+
+
+@pytest.mark.parametrize("durability", ["sync", "group", "async"])
+@pytest.mark.parametrize("kind", ["json", "sqlite", "journal"])
+def test_changes_survive_reopening_the_store(tmp_path, kind, durability):
+    store = TaskStore(make_backend(kind, tmp_path), durability=durability, flush_interval_ms=10)
+    store.put("a", task("a"))
+    store.put("b", task("b"))
+    store.update("a", {"days": 4})
+    store.delete("b")
+    store.close()  # async: close() дописує чергу
+
+    reopened = TaskStore(make_backend(kind, tmp_path))
+    assert reopened.all() == {"a": {**task("a"), "days": 4}}
+    reopened.close()
+
+
+def test_journal_backend_compacts_into_snapshot(tmp_path):
+    backend = JournalTaskBackend(tmp_path / "tasks.json", max_entries=5)
+    store = TaskStore(backend)
+    for number in range(20):
+        store.put(str(number), task(number))
+    store.close()
+    assert backend.compactions >= 1
+
+    reopened = TaskStore(JournalTaskBackend(tmp_path / "tasks.json"))
+    assert sorted(reopened.all(), key=int) == [str(number) for number in range(20)]
+    reopened.close()
+
+
+def test_store_picks_up_another_process_write(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    other = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    store.put("a", task("a"))
+    other.put("b", task("b"))
+    assert sorted(store.all()) == ["a", "b"]
+
+
+def test_changes_since_returns_delta_with_tombstones(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    store.put("a", task("a"))
+    store.put("b", task("b"))
+    token = store.revision()
+
+    store.update("a", {"days": 2})
+    store.delete("b")
+    delta = store.changes_since(token)
+    assert delta["full"] is False
+    assert delta["tasks"] == {"a": {**task("a"), "days": 2}}
+    assert delta["deleted"] == ["b"]
+    assert store.changes_since(delta["revision"]) == {
+        "revision": delta["revision"], "full": False, "tasks": {}, "deleted": [],
+    }
+
+
+@pytest.mark.parametrize("token", [None, "", "garbage", "otherepoch-1"])
+def test_unknown_revision_token_gets_full_state(tmp_path, token):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    store.put("a", task("a"))
+    delta = store.changes_since(token)
+    assert delta["full"] is True
+    assert delta["tasks"] == {"a": task("a")}
+
+
+def test_token_older_than_tombstone_horizon_gets_full_state(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"), max_tombstones=2)
+    store.put("keep", task("keep"))
+    token = store.revision()
+    for number in range(5):
+        store.put(str(number), task(number))
+        store.delete(str(number))
+    delta = store.changes_since(token)
+    assert delta["full"] is True
+    assert delta["tasks"] == {"keep": task("keep")}
+
+
+def test_merge_patch_follows_rfc_7396():
+    target = {"a": 1, "b": {"c": 2, "d": 3}, "e": [1, 2]}
+    patch = {"a": None, "b": {"c": None, "f": 4}, "e": [3], "g": {"h": None}}
+    assert merge_patch(target, patch) == {"b": {"d": 3, "f": 4}, "e": [3], "g": {}}
+    assert target == {"a": 1, "b": {"c": 2, "d": 3}, "e": [1, 2]}
+    assert merge_patch(target, [1]) == [1]
+
+
+def test_patch_updates_only_given_fields(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    store.put("a", task("a", order={"x": 1, "y": 2}))
+    assert store.patch("a", {"order": {"x": None, "z": 3}}) == task("a", order={"y": 2, "z": 3})
+    assert store.patch("missing", {"days": 2}) is None
+
+
+def brute_window(store, date_from, date_to):
+    """Еталон для query_window: повний перебір з тією ж семантикою [start, start + span)."""
+    lo = date_from.toordinal() if date_from else float("-inf")
+    hi = date_to.toordinal() + 1 if date_to else float("inf")
+    result = {}
+    for task_id, item in store.all().items():
+        key = task_start_key(item)
+        if key is not None and key < hi and key + task_span_days(item) > lo:
+            result[task_id] = item
+    return result
+
+
+def check_index(store):
+    """Індекс за датою початку і лічильник тривалостей відповідають вмісту сховища."""
+    tasks = store.all()
+    expected = {task_id: task_start_key(item) for task_id, item in tasks.items() if task_start_key(item) is not None}
+    assert store._by_start == sorted(store._by_start)
+    assert {entry[2]: entry[0] for entry in store._by_start} == expected
+    assert len(store._by_start) == len(expected)
+    spans = [task_span_days(tasks[task_id]) for task_id in expected]
+    assert sorted(store._spans.elements()) == sorted(spans)
+    assert store._max_span == max(spans, default=0.0)
+
+
+WINDOWS = [
+    (None, None),
+    (date(2025, 5, 3), date(2025, 5, 3)),
+    (date(2025, 5, 4), None),
+    (None, date(2025, 5, 2)),
+    (date(2025, 5, 1), date(2025, 5, 10)),
+    (date(2025, 5, 6), date(2025, 5, 8)),
+    (date(2025, 6, 1), date(2025, 6, 30)),
+]
+
+
+def check_windows(store):
+    check_index(store)
+    for date_from, date_to in WINDOWS:
+        assert store.query_window(date_from, date_to) == brute_window(store, date_from, date_to), (date_from, date_to)
+
+
+def test_query_window_edges(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    # [02.05, 03.05) — закінчується рівно там, де починається вікно з 03.05
+    store.put("ends-on-from", task("ends-on-from", start="2025-05-02", days=1))
+    # Починається пізно ввечері останнього дня вікна — перетинає його
+    store.put("starts-on-to", task("starts-on-to", start="2025-05-05T23:00:00.000Z", days=1))
+    store.put("starts-after-to", task("starts-after-to", start="2025-05-06"))
+    store.put("covers", task("covers", start="2025-04-01", days=60))
+    store.put("extended", task("extended", start="2025-04-30", days=1, delta=3))
+
+    assert sorted(store.query_window(date(2025, 5, 3), date(2025, 5, 5))) == ["covers", "extended", "starts-on-to"]
+    assert sorted(store.query_window(date(2025, 5, 2), date(2025, 5, 2))) == ["covers", "ends-on-from", "extended"]
+    # Відкриті межі
+    assert sorted(store.query_window(None, date(2025, 5, 1))) == ["covers", "extended"]
+    assert sorted(store.query_window(date(2025, 5, 6), None)) == ["covers", "starts-after-to", "starts-on-to"]
+    assert store.query_window(date(2025, 5, 7), None).keys() == {"covers"}
+    assert len(store.query_window()) == 5
+    check_windows(store)
+
+
+def test_query_window_skips_tasks_without_valid_start(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    store.put("ok", task("ok"))
+    store.put("none", task("none", start=None))
+    store.put("empty", task("empty", start=""))
+    store.put("bad", task("bad", start="вчора"))
+    store.put("number", task("number", start=20250503))
+    store.put("bad-days", task("bad-days", days="багато", delta="x"))
+    assert sorted(store.query_window()) == ["bad-days", "ok"]
+    check_windows(store)
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite", "journal"])
+def test_window_index_follows_every_mutation(tmp_path, kind):
+    store = TaskStore(create_task_backend(kind, tmp_path / "tasks.json", tmp_path / "tasks.sqlite3"))
+    for number in range(1, 10):
+        store.put(f"t{number}", task(f"t{number}", start=f"2025-05-0{number}", days=number % 3 + 1))
+    store.put("long", task("long", start="2025-04-20", days=30))
+    check_windows(store)
+
+    # Найдовший прямокутник зникає — _max_span має зменшитись
+    store.update("long", {"days": 2, "start": "2025-06-10"})
+    check_windows(store)
+    assert store._max_span == 3.0
+    store.patch("t1", {"start": "2025-06-01T12:00:00.000Z", "delta": 5})
+    check_windows(store)
+    store.patch("t2", {"start": None})
+    check_windows(store)
+    store.patch("t2", {"start": "2025-05-07"})
+    check_windows(store)
+    store.delete("t1")
+    check_windows(store)
+    store.delete_many(["t3", "t4", "missing"])
+    check_windows(store)
+    store.apply_batch([
+        {"op": "update", "task": {"id": "t5", "days": 10}},
+        {"op": "delete", "id": "t6"},
+        {"op": "create", "task": task("t10", start="2025-05-05")},
+    ])
+    check_windows(store)
+    store.replace_all({"x": task("x", start="2025-05-04", days=4), "y": task("y", start="bad")})
+    check_windows(store)
+    assert store._max_span == 4.0
+
+    # Повне перечитування з диску будує той самий індекс
+    reopened = TaskStore(create_task_backend(kind, tmp_path / "tasks.json", tmp_path / "tasks.sqlite3"))
+    check_windows(reopened)
+    assert [entry[2] for entry in reopened._by_start] == [entry[2] for entry in store._by_start]
+
+
+CUTOFF = date(2025, 5, 10)
+
+
+def retention_store(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    store.put("old", task("old", start="2025-05-01", days=2))
+    # [09.05, 10.05) — закінчується рівно на порозі
+    store.put("ends-on-cutoff", task("ends-on-cutoff", start="2025-05-09", days=1))
+    store.put("ends-before", task("ends-before", start="2025-05-08T12:00:00.000Z", days=1))
+    store.put("long", task("long", start="2025-04-01", days=60))
+    store.put("extended", task("extended", start="2025-05-05", days=1, delta=10))
+    store.put("fresh", task("fresh", start="2025-05-10"))
+    store.put("undated", task("undated", start=None))
+    return store
+
+
+def test_expire_before_keeps_tasks_reaching_the_cutoff(tmp_path):
+    store = retention_store(tmp_path)
+    assert sorted(store.expire_before(CUTOFF)) == ["ends-before", "old"]
+    assert sorted(store.all()) == ["ends-on-cutoff", "extended", "fresh", "long", "undated"]
+    check_windows(store)
+    assert sorted(TaskStore(JsonTaskBackend(tmp_path / "tasks.json")).all()) == sorted(store.all())
+    assert store.expire_before(CUTOFF) == []
+
+
+def test_failed_archive_leaves_tasks_in_store(tmp_path):
+    store = retention_store(tmp_path)
+    token = store.revision()
+    before = store.all()
+
+    def broken_archive(tasks):
+        assert sorted(tasks) == ["ends-before", "old"]
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        store.expire_before(CUTOFF, on_expire=broken_archive)
+    assert store.all() == before
+    assert TaskStore(JsonTaskBackend(tmp_path / "tasks.json")).all() == before
+    check_windows(store)
+    assert store.changes_since(token)["deleted"] == []
+
+
+def test_expired_ids_become_tombstones(tmp_path):
+    store = retention_store(tmp_path)
+    token = store.revision()
+    archived = {}
+    store.expire_before(CUTOFF, on_expire=archived.update)
+    assert sorted(archived) == ["ends-before", "old"]
+
+    changes = store.changes_since(token)
+    assert changes["full"] is False
+    assert changes["tasks"] == {}
+    assert sorted(changes["deleted"]) == ["ends-before", "old"]
+
+
+class CountingScheduler(RetentionScheduler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sweeps = threading.Semaphore(0)
+        self.count = 0
+
+    def sweep(self):
+        report = super().sweep()
+        self.count += 1
+        self.sweeps.release()
+        return report
+
+
+def test_scheduler_sweeps_every_interval_until_stopped(tmp_path):
+    store = TaskStore(JsonTaskBackend(tmp_path / "tasks.json"))
+    store.put("ancient", task("ancient", start="2000-01-01"))
+    store.put("today", task("today", start=date.today().isoformat()))
+    scheduler = CountingScheduler(store, retention_days=90, interval_seconds=0.05)
+
+    assert scheduler.start() is scheduler
+    thread = scheduler._thread
+    assert scheduler.start()._thread is thread  # повторний start не плодить потоків
+    for _ in range(3):
+        assert scheduler.sweeps.acquire(timeout=5)
+    scheduler.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    stopped_at = scheduler.count
+    assert stopped_at >= 3
+    assert list(store.all()) == ["today"]
+    assert scheduler.stats()["last_sweep"]["cutoff"] == (date.today() - timedelta(days=90)).isoformat()
+
+    # Після stop нових проходів немає; start запускає планувальник знову
+    assert not scheduler.sweeps.acquire(timeout=0.2)
+    assert scheduler.count == stopped_at
+    scheduler.start()
+    assert scheduler._thread is not thread
+    assert scheduler.sweeps.acquire(timeout=5)
+    scheduler.stop()
+
+
+def test_scheduler_waits_for_the_interval(tmp_path):
+    scheduler = CountingScheduler(TaskStore(JsonTaskBackend(tmp_path / "tasks.json")), interval_seconds=60)
+    scheduler.start()
+    try:
+        # Перший прохід — одразу при старті, наступний — лише через interval_seconds
+        assert scheduler.sweeps.acquire(timeout=5)
+        assert not scheduler.sweeps.acquire(timeout=0.3)
+    finally:
+        scheduler.stop()
+        scheduler._thread.join(timeout=5)
+    assert scheduler.count == 1
+
+
+def test_sqlite_group_mode_under_concurrent_writers_and_readers(tmp_path):
+    backend = create_task_backend("sqlite", tmp_path / "tasks.json", tmp_path / "tasks.sqlite3")
+    store = TaskStore(backend, durability="group", flush_interval_ms=1)
+    errors = []
+    done = threading.Event()
+
+    def guarded(target):
+        def run():
+            try:
+                target()
+            except Exception as e:  # noqa: BLE001 — будь-яка помилка з'єднання провалює тест
+                errors.append(e)
+        return threading.Thread(target=run, daemon=True)
+
+    def writer(number):
+        def run():
+            for index in range(40):
+                store.put(f"w{number}-{index}", task(f"w{number}-{index}"))
+                if index % 5 == 0:
+                    store.patch(f"w{number}-{index}", {"comment": "x"})
+        return run
+
+    def reader():
+        while not done.is_set():
+            store.all()
+            store.changes_since(None)
+
+    def exporter():
+        # Бекап читає базу через те саме з'єднання, поки фоновий потік пише
+        while not done.is_set():
+            store.export_snapshot(tmp_path / "export.json")
+
+    writers = [guarded(writer(number)) for number in range(4)]
+    readers = [guarded(reader) for _ in range(3)] + [guarded(exporter)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join(timeout=60)
+    done.set()
+    for thread in readers:
+        thread.join(timeout=10)
+    try:
+        assert errors == []
+        assert not any(thread.is_alive() for thread in writers + readers)
+        final = store.all()
+        assert len(final) == 160
+    finally:
+        store.close()
+    reopened = TaskStore(create_task_backend("sqlite", tmp_path / "tasks.json", tmp_path / "tasks.sqlite3"))
+    assert reopened.all() == final
+
+
+class PausingSqliteBackend(SqliteTaskBackend):
+    """SQLite-бекенд, що зупиняє commit між видаленнями і вставками рядків."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.paused = threading.Event()
+        self.resume = threading.Event()
+
+    def _write_rows(self, upserts, deletes):
+        super()._write_rows({}, deletes)
+        self.paused.set()
+        self.resume.wait(5)
+        super()._write_rows(upserts, [])
+
+
+def test_sqlite_readers_never_see_half_written_batch(tmp_path):
+    backend = PausingSqliteBackend(tmp_path / "tasks.sqlite3")
+    backend.resume.set()
+    backend.commit({}, {"a": task("a")}, [])
+    backend.paused.clear()
+    backend.resume.clear()
+
+    # Фоновий запис (як _flush_loop) замінює "a" на "b" однією транзакцією
+    flusher = threading.Thread(target=backend.commit, args=({}, {"b": task("b")}, ["a"]), daemon=True)
+    flusher.start()
+    assert backend.paused.wait(5)
+    seen = {}
+    reader = threading.Thread(target=lambda: seen.update(tasks=backend.load()), daemon=True)
+    reader.start()
+    reader.join(timeout=0.3)
+    backend.resume.set()
+    flusher.join(timeout=5)
+    reader.join(timeout=5)
+    # Читач чекає на з'єднання, а не бачить проміжний стан без обох прямокутників
+    assert list(seen["tasks"]) == ["b"]
+    backend.close()